@@ -0,0 +1 @@
+# Scripts de medición y verificación de desempeño de la API
@@ -0,0 +1,196 @@
+# Benchmark reproducible de la API: rendimiento (ops/s) y latencias (p50, p95, p99) de cada método de cada recurso
+# (list, get, post, put y delete de canciones, albumes y usuarios) con catálogos de varios tamaños
+# Cada tamaño se genera con benchmarks/catalogo.py en una db SQLite temporal y se mide con el cliente de pruebas de flask, sin cache de respuestas
+# Los resultados se guardan en JSON y se comparan contra una línea base guardada, una operación cuyo p50 empeora más de --tolerancia es una regresión
+# Uso, desde la raíz del repositorio: python -m benchmarks.api [--tamanos chico,mediano] [--repeticiones 200] [--salida resultados.json]
+# Para actualizar la línea base (en la misma máquina donde se va a comparar): python -m benchmarks.api --guardar-base
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from flaskr import create_app
+from flaskr.models import db
+
+from .catalogo import TAMANOS, poblar
+
+# Línea base que se compara por defecto
+BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_api.json')
+
+# Tamaño de página de las listas
+LIMITE = 100
+
+# Rutas de cada recurso: (lista, detalle)
+RECURSOS = {
+    'canciones': ('/canciones', '/cancion/{}'),
+    'albumes': ('/albumes', '/album/{}'),
+    'usuarios': ('/usuarios', '/usuario/{}'),
+}
+
+
+def _cuerpo_nuevo(recurso, azar, numero): # Cuerpo de un POST, los nombres llevan el número para no chocar con las restricciones de unicidad
+    if recurso == 'canciones':
+        return {'titulo': 'nueva {}'.format(numero), 'minutos': azar.randint(1, 9), 'segundos': azar.randint(0, 59), 'interprete': 'benchmark'}
+    if recurso == 'albumes':
+        return {'titulo': 'nuevo {}'.format(numero), 'anio': azar.randint(1960, 2025), 'descripcion': 'benchmark', 'medio': 'CD'}
+    return {'nombre_usuario': 'nuevo {}'.format(numero), 'contrasena': 'benchmark'}
+
+
+def _cuerpo_cambio(recurso, azar, numero): # Cuerpo de un PUT, cambia una columna que no es única
+    if recurso == 'canciones':
+        return {'minutos': azar.randint(1, 9), 'segundos': azar.randint(0, 59)}
+    if recurso == 'albumes':
+        return {'descripcion': 'editada {}'.format(numero)}
+    return {'contrasena': 'editada {}'.format(numero)}
+
+
+def operaciones(recurso, total, repeticiones, azar): # Lista de (nombre, [(método, ruta, cuerpo)]) del recurso, los delete van aparte
+    lista, detalle = RECURSOS[recurso]
+    mitad = max(1, total // 2) # get y put usan la primera mitad de los ids, delete la segunda, así ningún get encuentra una fila borrada
+    return [
+        ('GET ' + lista, [('GET', '{}?limit={}&cursor={}'.format(lista, LIMITE, azar.randrange(total)), None) for _ in range(repeticiones)]),
+        ('GET ' + detalle.format('<id>'), [('GET', detalle.format(azar.randint(1, mitad)), None) for _ in range(repeticiones)]),
+        ('PUT ' + detalle.format('<id>'), [('PUT', detalle.format(azar.randint(1, mitad)), _cuerpo_cambio(recurso, azar, i)) for i in range(repeticiones)]),
+        ('POST ' + lista, [('POST', lista, _cuerpo_nuevo(recurso, azar, i)) for i in range(repeticiones)]),
+    ]
+
+
+def borrados(recurso, total, repeticiones, azar): # (nombre, [(método, ruta, None)]) con ids distintos de la segunda mitad, como máximo uno por fila
+    detalle = RECURSOS[recurso][1]
+    ids = azar.sample(range(total // 2 + 1, total + 1), min(repeticiones, total - total // 2))
+    return 'DELETE ' + detalle.format('<id>'), [('DELETE', detalle.format(id), None) for id in ids]
+
+
+def percentil(ordenados, fraccion): # Percentil por rango más cercano de una lista ordenada
+    return ordenados[max(0, min(len(ordenados) - 1, int(round(fraccion * len(ordenados))) - 1))]
+
+
+def medir(cliente, requests): # Corre las requests en orden, regresa las estadísticas en milisegundos y los códigos inesperados
+    tiempos, errores = [], []
+    for metodo, ruta, cuerpo in requests:
+        inicio = time.perf_counter()
+        respuesta = cliente.open(ruta, method=metodo, json=cuerpo)
+        respuesta.get_data()
+        tiempos.append(time.perf_counter() - inicio)
+        if respuesta.status_code >= 300:
+            errores.append('{} {} -> {}'.format(metodo, ruta, respuesta.status_code))
+    ordenados = sorted(tiempos)
+    return {
+        'n': len(tiempos),
+        'ops_s': round(len(tiempos) / sum(tiempos), 1),
+        'p50_ms': round(percentil(ordenados, 0.50) * 1000, 3),
+        'p95_ms': round(percentil(ordenados, 0.95) * 1000, 3),
+        'p99_ms': round(percentil(ordenados, 0.99) * 1000, 3),
+    }, errores
+
+
+def correr(tamano, repeticiones, calentamiento, semilla): # Genera el catálogo del tamaño en una db temporal y mide todas las operaciones
+    azar = random.Random(semilla)
+    with tempfile.TemporaryDirectory() as directorio:
+        app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(directorio, 'catalogo.db'), CACHE_BACKEND='nulo')
+        with app.app_context():
+            db.create_all(bind_key=None)
+            inicio = time.perf_counter()
+            conteo = poblar(semilla=semilla, **TAMANOS[tamano])
+            generacion = time.perf_counter() - inicio
+            db.session.remove()
+
+            cliente = app.test_client()
+            planes = [plan for recurso in RECURSOS for plan in operaciones(recurso, conteo[recurso], repeticiones, azar)]
+            # Los delete van al final y en este orden: borrar un usuario borra sus albumes
+            planes += [borrados(recurso, conteo[recurso], repeticiones, azar) for recurso in RECURSOS]
+            for nombre, requests in planes: # Calentamiento con las lecturas, llena los caches de sqlite y de los serializadores
+                if nombre.startswith('GET'):
+                    medir(cliente, requests[:calentamiento])
+
+            resultados, errores = {}, []
+            for nombre, requests in planes:
+                resultados[nombre], fallidas = medir(cliente, requests)
+                errores += fallidas
+            db.session.remove()
+            db.engine.dispose()
+    return {'catalogo': dict(TAMANOS[tamano], generacion_s=round(generacion, 2)), 'operaciones': resultados, 'errores': errores}
+
+
+def comparar(resultados, base, tolerancia, minimo): # Lista de regresiones: operaciones cuyo p50 supera el de la base por más de la tolerancia y por más de minimo ms
+    regresiones = []
+    for tamano, resultado in resultados.items():
+        operaciones_base = base.get('resultados', {}).get(tamano, {}).get('operaciones', {})
+        for nombre, medicion in resultado['operaciones'].items():
+            referencia = operaciones_base.get(nombre)
+            if referencia and medicion['p50_ms'] > max(referencia['p50_ms'] * (1 + tolerancia), referencia['p50_ms'] + minimo):
+                regresiones.append('{} {}: p50 {:.2f} ms, base {:.2f} ms (+{:.0%})'.format(
+                    tamano, nombre, medicion['p50_ms'], referencia['p50_ms'], medicion['p50_ms'] / referencia['p50_ms'] - 1))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mide cada método de cada recurso de la API con catálogos de varios tamaños')
+    parser.add_argument('--tamanos', default='chico,mediano', help='Tamaños de catálogo separados por comas: {}'.format(','.join(TAMANOS)))
+    parser.add_argument('--repeticiones', type=int, default=200, help='Requests medidas por operación')
+    parser.add_argument('--calentamiento', type=int, default=20, help='Requests de calentamiento por lectura')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--salida', help='Archivo JSON donde se guardan los resultados')
+    parser.add_argument('--base', default=BASE, help='Línea base contra la que se comparan los resultados')
+    parser.add_argument('--tolerancia', type=float, default=0.3, help='Aumento del p50 que se considera regresión (0.3 = 30%%)')
+    parser.add_argument('--minimo', type=float, default=0.5, help='Aumento mínimo del p50 en ms para que cuente como regresión, evita falsas alarmas por ruido')
+    parser.add_argument('--guardar-base', action='store_true', help='Guarda los resultados como la nueva línea base')
+    argumentos = parser.parse_args()
+
+    tamanos = argumentos.tamanos.split(',')
+    desconocidos = [tamano for tamano in tamanos if tamano not in TAMANOS]
+    if desconocidos:
+        parser.error('Tamaños desconocidos: {}'.format(', '.join(desconocidos)))
+
+    resultados = {}
+    for tamano in tamanos:
+        resultados[tamano] = correr(tamano, argumentos.repeticiones, argumentos.calentamiento, argumentos.semilla)
+        print('\n{} ({usuarios} usuarios, {albumes_por_usuario} albumes por usuario, {canciones} canciones, {enlaces} enlaces por cancion)'.format(
+            tamano, **TAMANOS[tamano]))
+        print('{:<28} {:>10} {:>10} {:>10} {:>10}'.format('operacion', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for nombre, medicion in resultados[tamano]['operaciones'].items():
+            print('{:<28} {ops_s:>10.1f} {p50_ms:>10.2f} {p95_ms:>10.2f} {p99_ms:>10.2f}'.format(nombre, **medicion))
+        for error in resultados[tamano]['errores'][:10]:
+            print('  ERROR', error)
+
+    documento = {
+        'metadatos': {
+            'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'repeticiones': argumentos.repeticiones,
+            'semilla': argumentos.semilla,
+        },
+        'resultados': resultados,
+    }
+    for ruta in filter(None, [argumentos.salida, argumentos.base if argumentos.guardar_base else None]):
+        with open(ruta, 'w') as archivo:
+            json.dump(documento, archivo, indent=2, ensure_ascii=False)
+            archivo.write('\n')
+
+    regresiones = []
+    if not argumentos.guardar_base and os.path.exists(argumentos.base):
+        with open(argumentos.base) as archivo:
+            base = json.load(archivo)
+        if (base['metadatos']['repeticiones'], base['metadatos']['semilla']) != (argumentos.repeticiones, argumentos.semilla):
+            # Con otras repeticiones o semilla cambian las filas que se tocan (por ejemplo cuántos albumes tiene cada usuario al borrarlo)
+            print('\nAVISO: la base se midió con {} repeticiones y semilla {}, la comparación no es exacta'.format(
+                base['metadatos']['repeticiones'], base['metadatos']['semilla']))
+        regresiones = comparar(resultados, base, argumentos.tolerancia, argumentos.minimo)
+        print('\n{} regresiones contra {} (tolerancia {:.0%})'.format(len(regresiones), os.path.relpath(argumentos.base), argumentos.tolerancia))
+        for regresion in regresiones:
+            print('  REGRESION', regresion)
+    errores = any(resultado['errores'] for resultado in resultados.values())
+    return 1 if regresiones or errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# Mide cuánto tarda importar flaskr.app y construir la app, y falla si supera el presupuesto
+# Cada medición se hace en un intérprete nuevo para incluir el costo real de las importaciones
+# Uso, desde la raíz del repositorio: python -m benchmarks.arranque [--presupuesto 1.0] [--repeticiones 5]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Código que se corre en cada intérprete nuevo, imprime el tiempo de importar y construir la app
+# y verifica que no se haya abierto ninguna conexión a la db
+MEDICION = '''
+import time
+inicio = time.perf_counter()
+import flaskr.app
+duracion = time.perf_counter() - inicio
+from flaskr.models import db
+with flaskr.app.app.app_context():
+    conexiones = sum(motor.pool.checkedin() + motor.pool.checkedout() for motor in db.engines.values())
+print(duracion, conexiones)
+'''
+
+
+def medir(repeticiones):
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    duraciones = []
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(directorio, 'canciones.db'))
+        for _ in range(repeticiones):
+            salida = subprocess.run([sys.executable, '-c', MEDICION], cwd=raiz, env=entorno, capture_output=True, text=True, check=True).stdout
+            duracion, conexiones = salida.split()
+            if int(conexiones):
+                raise SystemExit('Construir la app abrió {} conexiones a la db'.format(conexiones))
+            duraciones.append(float(duracion))
+    return duraciones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mide el tiempo de arranque de la app')
+    parser.add_argument('--presupuesto', type=float, default=float(os.environ.get('PRESUPUESTO_ARRANQUE', 1.0)), help='Segundos máximos para la mediana')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    argumentos = parser.parse_args()
+
+    duraciones = medir(argumentos.repeticiones)
+    mediana = statistics.median(duraciones)
+    print('Arranque: mediana {:.3f} s, minimo {:.3f} s, maximo {:.3f} s (presupuesto {:.3f} s)'.format(mediana, min(duraciones), max(duraciones), argumentos.presupuesto))
+    return 0 if mediana <= argumentos.presupuesto else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
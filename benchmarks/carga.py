@@ -0,0 +1,184 @@
+# Prueba de carga: compara requests por segundo y latencias (p50, p99) del modo WSGI (flaskr.app) y del modo ASGI (flaskr.asgi)
+# bajo una mezcla concurrente de lecturas y escrituras sobre el mismo catálogo
+# Cada modo se levanta como un solo proceso sobre su propia copia de la db, con el perfil 'production' y sin cache de respuestas
+# para que cada request llegue a la db
+# Uso, desde la raíz del repositorio: python -m benchmarks.carga [--canciones 20000] [--concurrencia 32] [--duracion 10] [--escrituras 0.2]
+# Contra servidores que ya están corriendo (con un catálogo de --canciones canciones): python -m benchmarks.carga --url http://localhost:8000
+
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flaskr import create_app
+from flaskr.models import db
+
+from .catalogo import poblar, proporcional
+
+# Comandos de cada modo, {puerto} se reemplaza al levantarlo
+# Sin gunicorn el modo WSGI usa el servidor con hilos de werkzeug, también es un solo proceso con un hilo por request
+SERVIDORES = {
+    'wsgi': ['gunicorn', '--workers', '1', '--threads', '{hilos}', '--bind', '127.0.0.1:{puerto}', 'flaskr.app:app']
+            if importlib.util.find_spec('gunicorn') else
+            [sys.executable, '-c', "from werkzeug.serving import run_simple; from flaskr.app import app; run_simple('127.0.0.1', {puerto}, app, threaded=True)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', '--workers', '1', '--port', '{puerto}', '--log-level', 'warning', '--no-access-log', 'flaskr.asgi:app'],
+}
+
+
+def _puerto_libre():
+    with socket.socket() as conexion:
+        conexion.bind(('127.0.0.1', 0))
+        return conexion.getsockname()[1]
+
+
+def _esperar(url, limite=30): # Espera a que el servidor responda
+    partes = urlsplit(url)
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=1)
+            conexion.request('GET', '/cache')
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit('El servidor {} no respondió'.format(url))
+
+
+def _operacion(azar, canciones, albumes, escrituras): # (método, ruta, cuerpo) de una request de la mezcla
+    if azar.random() < escrituras:
+        opcion = azar.randrange(3)
+        if opcion == 0:
+            return 'PUT', '/cancion/{}'.format(azar.randint(1, canciones)), {'minutos': azar.randint(1, 9), 'segundos': azar.randint(0, 59)}
+        if opcion == 1:
+            return 'PUT', '/album/{}'.format(azar.randint(1, albumes)), {'descripcion': 'descripcion {}'.format(azar.random())}
+        return 'POST', '/canciones', {'titulo': 'nueva {}'.format(azar.random()), 'minutos': 3, 'segundos': 30, 'interprete': 'carga'}
+    opcion = azar.randrange(4)
+    if opcion == 0:
+        return 'GET', '/cancion/{}'.format(azar.randint(1, canciones)), None
+    if opcion == 1:
+        return 'GET', '/album/{}'.format(azar.randint(1, albumes)), None
+    if opcion == 2:
+        return 'GET', '/canciones?limit=50&cursor={}'.format(azar.randint(0, canciones)), None
+    return 'GET', '/albumes?limit=20&anio_min={}'.format(azar.randint(1960, 2025)), None
+
+
+def cargar(url, canciones, concurrencia, duracion, escrituras, semilla=1): # Corre la mezcla con concurrencia clientes durante duracion segundos
+    partes = urlsplit(url)
+    albumes = max(1, canciones // 10)
+    latencias, errores = [], []
+    candado = threading.Lock()
+    fin = time.monotonic() + duracion
+
+    def cliente(numero):
+        azar = random.Random(semilla * 1000 + numero)
+        conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=30) # Keep-alive, una conexión por cliente
+        propias, fallidas = [], 0
+        while time.monotonic() < fin:
+            metodo, ruta, cuerpo = _operacion(azar, canciones, albumes, escrituras)
+            inicio = time.perf_counter()
+            try:
+                conexion.request(metodo, ruta, body=json.dumps(cuerpo) if cuerpo is not None else None, headers={'Content-Type': 'application/json'})
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                if respuesta.status >= 400:
+                    fallidas += 1
+            except (OSError, http.client.HTTPException):
+                fallidas += 1
+                conexion.close()
+                conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=30)
+                continue
+            propias.append(time.perf_counter() - inicio)
+        with candado:
+            latencias.extend(propias)
+            errores.append(fallidas)
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=cliente, args=(numero,)) for numero in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        'requests': len(latencias),
+        'rps': len(latencias) / total,
+        'p50_ms': statistics.median(latencias) * 1000 if latencias else None,
+        'p99_ms': latencias[int(len(latencias) * 0.99) - 1] * 1000 if latencias else None,
+        'errores': sum(errores),
+    }
+
+
+def levantar(modo, ruta_db, hilos, **variables): # Levanta el servidor del modo sobre la db, regresa (proceso, url), variables se agregan al entorno
+    puerto = _puerto_libre()
+    comando = [parte.format(puerto=puerto, hilos=hilos) for parte in SERVIDORES[modo]]
+    entorno = dict(os.environ, FLASK_CONFIG='production', DATABASE_URL='sqlite:///' + ruta_db, CACHE_BACKEND='nulo')
+    entorno.pop('DATABASE_READ_URL', None)
+    entorno.update(variables)
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proceso = subprocess.Popen(comando, cwd=raiz, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) # Sin el log de cada request
+    url = 'http://127.0.0.1:{}'.format(puerto)
+    try:
+        _esperar(url)
+    except SystemExit:
+        proceso.terminate()
+        raise
+    return proceso, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara el modo WSGI y el modo ASGI bajo una carga concurrente de lecturas y escrituras')
+    parser.add_argument('--canciones', type=int, default=20000, help='Tamaño del catálogo')
+    parser.add_argument('--concurrencia', type=int, default=32, help='Clientes simultáneos')
+    parser.add_argument('--duracion', type=float, default=10, help='Segundos de carga por modo')
+    parser.add_argument('--escrituras', type=float, default=0.2, help='Fracción de requests que escriben')
+    parser.add_argument('--modos', default='wsgi,asgi', help='Modos que se comparan')
+    parser.add_argument('--url', action='append', help='Servidor que ya está corriendo, se puede repetir (no se levanta nada)')
+    parser.add_argument('--json', help='Archivo donde se guardan los resultados')
+    argumentos = parser.parse_args()
+
+    resultados = {}
+    if argumentos.url:
+        for url in argumentos.url:
+            resultados[url] = cargar(url, argumentos.canciones, argumentos.concurrencia, argumentos.duracion, argumentos.escrituras)
+    else:
+        with tempfile.TemporaryDirectory() as directorio:
+            original = os.path.join(directorio, 'catalogo.db')
+            app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///' + original, CACHE_BACKEND='nulo')
+            with app.app_context():
+                db.create_all(bind_key=None)
+                poblar(**proporcional(argumentos.canciones))
+                db.engine.dispose()
+            for modo in argumentos.modos.split(','):
+                ruta_db = os.path.join(directorio, modo + '.db')
+                shutil.copyfile(original, ruta_db) # Cada modo empieza con el mismo catálogo
+                proceso, url = levantar(modo, ruta_db, argumentos.concurrencia)
+                try:
+                    resultados[modo] = cargar(url, argumentos.canciones, argumentos.concurrencia, argumentos.duracion, argumentos.escrituras)
+                finally:
+                    proceso.terminate()
+                    proceso.wait()
+
+    print('{:<30} {:>10} {:>10} {:>10} {:>10}'.format('modo', 'req/s', 'p50 ms', 'p99 ms', 'errores'))
+    for nombre, resultado in resultados.items():
+        print('{:<30} {:>10.1f} {:>10.2f} {:>10.2f} {:>10}'.format(nombre, resultado['rps'], resultado['p50_ms'] or 0, resultado['p99_ms'] or 0, resultado['errores']))
+    if argumentos.json:
+        with open(argumentos.json, 'w') as archivo:
+            json.dump({'parametros': vars(argumentos), 'resultados': resultados}, archivo, indent=2)
+    return 1 if any(resultado['errores'] for resultado in resultados.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# Generador determinista de catálogos sintéticos: usuarios, albumes por usuario, canciones y densidad de enlaces album-canción
+# La misma semilla y los mismos parámetros producen siempre la misma db, así los resultados de dos corridas se pueden comparar
+# Uso como script, desde la raíz del repositorio: python -m benchmarks.catalogo catalogo.db [--tamano mediano] [--semilla 1]
+
+import argparse
+import os
+import random
+import sys
+
+from flaskr import create_app
+from flaskr.models import db, Usuario, Medio
+from flaskr.vistas.importacion import importar
+
+# Tamaños predefinidos, enlaces es el promedio de albumes en los que está cada canción
+TAMANOS = {
+    'chico': {'usuarios': 10, 'albumes_por_usuario': 5, 'canciones': 500, 'enlaces': 1.5},
+    'mediano': {'usuarios': 50, 'albumes_por_usuario': 20, 'canciones': 10000, 'enlaces': 2.0},
+    'grande': {'usuarios': 200, 'albumes_por_usuario': 50, 'canciones': 100000, 'enlaces': 2.0},
+}
+
+
+def proporcional(canciones): # Parámetros de un catálogo a partir del número de canciones: un usuario cada 200 canciones y un album cada 10
+    usuarios = max(1, canciones // 200)
+    return {'usuarios': usuarios, 'albumes_por_usuario': max(1, canciones // 10 // usuarios), 'canciones': canciones, 'enlaces': 1.5}
+
+
+def poblar(usuarios, albumes_por_usuario, canciones, enlaces, semilla=1): # Llena la db de la app actual (vacía), regresa cuántas filas de cada tipo creó
+    azar = random.Random(semilla)
+    db.session.execute(db.insert(Usuario), [{'nombre_usuario': 'usuario {}'.format(i), 'contrasena': 'clave {}'.format(i)} for i in range(usuarios)])
+    db.session.commit()
+    albumes = usuarios * albumes_por_usuario
+    importar('albumes', ({'titulo': 'album {}'.format(i), 'anio': azar.randint(1960, 2025), 'descripcion': 'descripcion del album {}'.format(i),
+                          'medio': azar.choice(list(Medio)).name, 'usuario': i // albumes_por_usuario + 1} for i in range(albumes)))
+
+    def albumes_de_cancion(): # Entre 0 y 2 * enlaces albumes por canción, en promedio enlaces
+        cantidad = int(enlaces) + (azar.random() < enlaces - int(enlaces))
+        return azar.sample(range(1, albumes + 1), min(albumes, cantidad))
+
+    reporte = importar('canciones', ({'titulo': 'cancion {}'.format(i), 'minutos': azar.randint(1, 9), 'segundos': azar.randint(0, 59),
+                                      'interprete': 'interprete {}'.format(azar.randrange(max(1, canciones // 20))), 'albums': albumes_de_cancion()}
+                                     for i in range(canciones)))
+    if reporte['errores']:
+        raise RuntimeError('El catálogo generado tiene filas inválidas: {}'.format(reporte['errores'][:3]))
+    return {'usuarios': usuarios, 'albumes': albumes, 'canciones': canciones}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera una db SQLite con un catálogo sintético')
+    parser.add_argument('ruta', help='Archivo de la db, no debe existir')
+    parser.add_argument('--tamano', choices=TAMANOS, default='mediano')
+    parser.add_argument('--semilla', type=int, default=1)
+    argumentos = parser.parse_args()
+
+    if os.path.exists(argumentos.ruta):
+        raise SystemExit('{} ya existe'.format(argumentos.ruta))
+    app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.abspath(argumentos.ruta), CACHE_BACKEND='nulo')
+    with app.app_context():
+        db.create_all(bind_key=None)
+        conteo = poblar(semilla=argumentos.semilla, **TAMANOS[argumentos.tamano])
+        db.engine.dispose()
+    print('Catálogo {}: {usuarios} usuarios, {albumes} albumes, {canciones} canciones'.format(argumentos.tamano, **conteo))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# Verifica que las vistas de listas hagan un número constante de consultas SQL sin importar cuántos objetos haya (problema N+1)
+# Uso, desde la raíz del repositorio: python -m benchmarks.conteo_consultas
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from flaskr import create_app
+from flaskr.models import db, Cancion, Usuario, Album, Medio
+
+# Endpoints de listas que se verifican
+ENDPOINTS = ['/canciones', '/albumes', '/usuarios', '/canciones?formato=ndjson', '/albumes?formato=ndjson', '/usuarios?formato=ndjson']
+
+# Tamaños de catálogo con los que se compara el número de consultas
+TAMANOS = [2, 20]
+
+
+def crear_app(ruta_db): # Crea una app apuntando a una db temporal y sin cache, para que cada request llegue a la db
+    return create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///' + ruta_db, CACHE_BACKEND='nulo')
+
+
+def poblar(n): # n usuarios, cada uno con 2 albumes de 3 canciones
+    for i in range(n):
+        usuario = Usuario(nombre_usuario='usuario {}'.format(i), contrasena='clave')
+        for j in range(2):
+            album = Album(titulo='album {}'.format(j), anio=2000 + j, descripcion='', medio=Medio.CD)
+            album.canciones = [Cancion(titulo='cancion {}'.format(k), minutos=3, segundos=k, interprete='interprete') for k in range(3)]
+            usuario.albums.append(album)
+        db.session.add(usuario)
+    db.session.commit()
+    db.session.remove()
+
+
+@contextmanager
+def contar_consultas(motor): # Cuenta las sentencias SQL que se ejecutan en el motor dentro del bloque
+    conteo = []
+    def al_ejecutar(conn, cursor, sentencia, parametros, contexto, executemany):
+        conteo.append(sentencia)
+    event.listen(motor, 'before_cursor_execute', al_ejecutar)
+    try:
+        yield conteo
+    finally:
+        event.remove(motor, 'before_cursor_execute', al_ejecutar)
+
+
+def consultas_por_endpoint(n):
+    with tempfile.TemporaryDirectory() as directorio:
+        app = crear_app(os.path.join(directorio, 'canciones.db'))
+        with app.app_context():
+            db.create_all(bind_key=None)
+            poblar(n)
+            cliente = app.test_client()
+            resultado = {}
+            for endpoint in ENDPOINTS:
+                with contar_consultas(db.engine) as conteo:
+                    respuesta = cliente.get(endpoint)
+                    respuesta.get_data() # Consume el streaming completo antes de contar
+                assert respuesta.status_code == 200, (endpoint, respuesta.status_code)
+                resultado[endpoint] = len(conteo)
+            db.engine.dispose()
+            return resultado
+
+
+def main():
+    conteos = {n: consultas_por_endpoint(n) for n in TAMANOS}
+    fallas = 0
+    for endpoint in ENDPOINTS:
+        valores = [conteos[n][endpoint] for n in TAMANOS]
+        constante = len(set(valores)) == 1
+        fallas += not constante
+        print('{:<28} {} {}'.format(endpoint, valores, 'OK' if constante else 'N+1'))
+    return 1 if fallas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
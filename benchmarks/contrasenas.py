@@ -0,0 +1,169 @@
+# Benchmark del cifrado de contraseñas: inicios de sesión y usuarios nuevos por segundo con distinto número de procesos en el pool
+# (CONTRASENA_PROCESOS), y la latencia de las lecturas de canciones y albumes mientras tanto
+# Para cada número de procesos se levanta un servidor con el perfil 'production' sobre una copia del mismo catálogo, primero se miden
+# las lecturas solas y luego las mismas lecturas con clientes que inician sesión y crean usuarios al mismo tiempo
+# Con 0 procesos el cifrado corre en el hilo de la request, sirve como referencia
+# Uso, desde la raíz del repositorio: python -m benchmarks.contrasenas [--procesos 0,1,2,4] [--clientes 8] [--lectores 4] [--duracion 5]
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flaskr import create_app
+from flaskr.models import db
+
+from .api import percentil
+from .carga import levantar
+from .catalogo import poblar, proporcional
+
+
+def _lectura(azar, canciones, albumes): # GET de una canción o de un album, no tocan las contraseñas
+    if azar.random() < 0.5:
+        return 'GET', '/cancion/{}'.format(azar.randint(1, canciones)), None
+    return 'GET', '/album/{}'.format(azar.randint(1, albumes)), None
+
+
+def _cifrado(azar, numero, cuenta): # Inicio de sesión o usuario nuevo, los dos cifran una contraseña
+    if cuenta % 2 == 0:
+        return 'POST', '/login', {'nombre_usuario': 'login {}'.format(numero), 'contrasena': 'clave {}'.format(numero)}
+    return 'POST', '/usuarios', {'nombre_usuario': 'nuevo {} {}'.format(numero, cuenta), 'contrasena': 'clave {}'.format(azar.random())}
+
+
+def correr(url, clientes, generar, fin, semilla): # Corre clientes hilos que mandan las requests de generar hasta fin, regresa (latencias, rechazadas, errores)
+    partes = urlsplit(url)
+    latencias, rechazadas, errores = [], [0], []
+    candado = threading.Lock()
+
+    def cliente(numero):
+        azar = random.Random(semilla * 1000 + numero)
+        conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=60)
+        propias, cuenta, saturadas, fallidas = [], 0, 0, []
+        while time.monotonic() < fin:
+            metodo, ruta, cuerpo = generar(azar, numero, cuenta)
+            cuenta += 1
+            inicio = time.perf_counter()
+            try:
+                conexion.request(metodo, ruta, body=json.dumps(cuerpo) if cuerpo is not None else None, headers={'Content-Type': 'application/json'})
+                respuesta = conexion.getresponse()
+                respuesta.read()
+            except (OSError, http.client.HTTPException) as error:
+                fallidas.append('{} {} -> {}'.format(metodo, ruta, error))
+                conexion.close()
+                conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=60)
+                continue
+            if respuesta.status == 503: # El pool está lleno, el cliente espera lo que indica Retry-After y reintenta
+                saturadas += 1
+                time.sleep(float(respuesta.getheader('Retry-After') or 1))
+                continue
+            if respuesta.status >= 400:
+                fallidas.append('{} {} -> {}'.format(metodo, ruta, respuesta.status))
+                continue
+            propias.append(time.perf_counter() - inicio)
+        with candado:
+            latencias.extend(propias)
+            rechazadas[0] += saturadas
+            errores.extend(fallidas)
+
+    hilos = [threading.Thread(target=cliente, args=(numero,)) for numero in range(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return sorted(latencias), rechazadas[0], errores
+
+
+def _resumen(latencias, duracion): # ops/s, p50 y p99 en milisegundos
+    if not latencias:
+        return {'ops_s': 0.0, 'p50_ms': None, 'p99_ms': None}
+    return {'ops_s': round(len(latencias) / duracion, 1), 'p50_ms': round(percentil(latencias, 0.50) * 1000, 2), 'p99_ms': round(percentil(latencias, 0.99) * 1000, 2)}
+
+
+def medir(url, canciones, albumes, clientes, lectores, duracion, semilla): # Lecturas solas y lecturas con cifrado concurrente
+    def lectura(azar, numero, cuenta):
+        return _lectura(azar, canciones, albumes)
+
+    fin = time.monotonic() + duracion
+    solas, _, errores = correr(url, lectores, lectura, fin, semilla)
+
+    resultado_lecturas = {}
+    hilo_lecturas = threading.Thread(target=lambda: resultado_lecturas.update(zip(('latencias', 'rechazadas', 'errores'), correr(url, lectores, lectura, fin, semilla + 1))))
+    fin = time.monotonic() + duracion
+    hilo_lecturas.start()
+    cifrados, rechazadas, errores_cifrado = correr(url, clientes, lambda azar, numero, cuenta: _cifrado(azar, numero, cuenta), fin, semilla + 2)
+    hilo_lecturas.join()
+    return {
+        'cifrado': dict(_resumen(cifrados, duracion), rechazadas=rechazadas),
+        'lecturas_solas': _resumen(solas, duracion),
+        'lecturas_con_cifrado': _resumen(resultado_lecturas['latencias'], duracion),
+    }, errores + errores_cifrado + resultado_lecturas['errores']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inicios de sesión y usuarios nuevos por segundo según los procesos del pool de contraseñas')
+    parser.add_argument('--procesos', default='0,1,{}'.format(os.cpu_count() or 1), help='Valores de CONTRASENA_PROCESOS separados por comas')
+    parser.add_argument('--clientes', type=int, default=8, help='Clientes simultáneos que inician sesión y crean usuarios')
+    parser.add_argument('--lectores', type=int, default=4, help='Clientes simultáneos que leen canciones y albumes')
+    parser.add_argument('--duracion', type=float, default=5, help='Segundos de cada medición')
+    parser.add_argument('--canciones', type=int, default=5000, help='Tamaño del catálogo')
+    parser.add_argument('--modo', default='wsgi', choices=['wsgi', 'asgi'])
+    parser.add_argument('--costo', help='CONTRASENA_COSTO en json, por ejemplo {"n": 32768}')
+    parser.add_argument('--pendientes', type=int, help='CONTRASENA_PENDIENTES, por defecto 4 por proceso')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--json', help='Archivo donde se guardan los resultados')
+    argumentos = parser.parse_args()
+
+    procesos = list(dict.fromkeys(int(valor) for valor in argumentos.procesos.split(','))) # Sin repetidos, en el orden dado
+    variables = {'CONTRASENA_COSTO': argumentos.costo} if argumentos.costo else {}
+    if argumentos.pendientes:
+        variables['CONTRASENA_PENDIENTES'] = str(argumentos.pendientes)
+    resultados, errores = {}, []
+    with tempfile.TemporaryDirectory() as directorio:
+        original = os.path.join(directorio, 'catalogo.db')
+        app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///' + original, CACHE_BACKEND='nulo')
+        with app.app_context():
+            db.create_all(bind_key=None)
+            conteo = poblar(semilla=argumentos.semilla, **proporcional(argumentos.canciones))
+            db.engine.dispose()
+        for cantidad in procesos:
+            ruta_db = os.path.join(directorio, 'procesos_{}.db'.format(cantidad))
+            shutil.copyfile(original, ruta_db) # Cada medición empieza con el mismo catálogo
+            proceso, url = levantar(argumentos.modo, ruta_db, argumentos.clientes + argumentos.lectores, CONTRASENA_PROCESOS=str(cantidad), **variables)
+            try:
+                # Los usuarios con los que inicia sesión cada cliente, también crean los procesos del pool antes de medir
+                partes = urlsplit(url)
+                conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=60)
+                for numero in range(argumentos.clientes):
+                    conexion.request('POST', '/usuarios', body=json.dumps({'nombre_usuario': 'login {}'.format(numero), 'contrasena': 'clave {}'.format(numero)}),
+                                     headers={'Content-Type': 'application/json'})
+                    conexion.getresponse().read()
+                resultados[cantidad], fallidas = medir(url, conteo['canciones'], conteo['albumes'], argumentos.clientes, argumentos.lectores,
+                                                       argumentos.duracion, argumentos.semilla)
+                errores += fallidas
+            finally:
+                proceso.terminate()
+                proceso.wait()
+
+    print('{} CPUs, modo {}, {} clientes de cifrado y {} lectores'.format(os.cpu_count(), argumentos.modo, argumentos.clientes, argumentos.lectores))
+    print('{:>9} {:>10} {:>10} {:>10} {:>10} {:>14} {:>14}'.format('procesos', 'cifrado/s', 'p50 ms', 'rechazos', 'lect. p50', 'lect. p50 carga', 'lect. p99 carga'))
+    for cantidad, resultado in resultados.items():
+        cifrado, solas, con_cifrado = resultado['cifrado'], resultado['lecturas_solas'], resultado['lecturas_con_cifrado']
+        print('{:>9} {:>10.1f} {:>10} {:>10} {:>10} {:>14} {:>14}'.format(
+            cantidad, cifrado['ops_s'], cifrado['p50_ms'], cifrado['rechazadas'], solas['p50_ms'], con_cifrado['p50_ms'], con_cifrado['p99_ms']))
+    for error in errores[:10]:
+        print('  ERROR', error)
+    if argumentos.json:
+        with open(argumentos.json, 'w') as archivo:
+            json.dump({'parametros': vars(argumentos), 'cpus': os.cpu_count(), 'resultados': resultados}, archivo, indent=2)
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# Compara la serialización con marshmallow contra la serialización compilada (SERIALIZACION_COMPILADA)
+# Verifica que las respuestas sean idénticas byte a byte y mide el tiempo de cada camino
+# Uso, desde la raíz del repositorio: python -m benchmarks.serializacion [--canciones 20000] [--repeticiones 5]
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from flaskr import create_app
+from flaskr.models import db
+
+from .catalogo import poblar, proporcional
+
+# Endpoints que se comparan
+ENDPOINTS = ['/canciones', '/albumes', '/usuarios', '/cancion/1', '/album/1', '/usuario/1', '/albumes?fields=titulo,medio', '/canciones?formato=ndjson']
+
+
+def medir(cliente, endpoint, repeticiones): # Mediana en segundos y cuerpo de la respuesta
+    tiempos, cuerpo = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(endpoint)
+        cuerpo = respuesta.get_data()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), cuerpo
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara la serialización con marshmallow y la compilada')
+    parser.add_argument('--canciones', type=int, default=20000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    argumentos = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        uri = 'sqlite:///' + os.path.join(directorio, 'canciones.db')
+        # Sin la página por defecto, las listas JSON serializan el catálogo completo como antes y las mediciones se pueden comparar
+        apps = {compilada: create_app('testing', SQLALCHEMY_DATABASE_URI=uri, CACHE_BACKEND='nulo', SERIALIZACION_COMPILADA=compilada, LIMITE_POR_DEFECTO=None)
+                for compilada in (False, True)}
+        with apps[False].app_context():
+            db.create_all(bind_key=None)
+            poblar(**proporcional(argumentos.canciones))
+
+        diferentes = 0
+        print('{:<32} {:>12} {:>12} {:>8}'.format('endpoint', 'marshmallow', 'compilada', 'mejora'))
+        for endpoint in ENDPOINTS:
+            resultados = {}
+            for compilada, app in apps.items():
+                with app.app_context():
+                    resultados[compilada] = medir(app.test_client(), endpoint, argumentos.repeticiones)
+                    db.session.remove()
+            (lento, cuerpo_lento), (rapido, cuerpo_rapido) = resultados[False], resultados[True]
+            igual = cuerpo_lento == cuerpo_rapido
+            diferentes += not igual
+            print('{:<32} {:>10.1f}ms {:>10.1f}ms {:>7.1f}x{}'.format(endpoint, lento * 1000, rapido * 1000, lento / rapido, '' if igual else '  SALIDA DIFERENTE'))
+        for app in apps.values():
+            with app.app_context():
+                db.engine.dispose()
+    return 1 if diferentes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
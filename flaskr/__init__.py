@@ -1,15 +1,89 @@
 # Se importa flask desde las librerias
 from flask import Flask
 
-# Se crea la instancia de la aplicación, con entradas por defecto
-def create_app(config_name):
+# Se importa Api y la representación json de flask_restful
+from flask_restful import Api
+from flask_restful.representations.json import output_json
+
+# Se importan los perfiles de configuración y la URI de solo lectura de una db SQLite
+from .config import config, solo_lectura
+
+# Se importan la base de datos y la configuración de las conexiones SQLite
+from .models import db, configurar_sqlite
+
+# Se importa el cache de respuestas
+from .cache import cache
+
+# Se importan las métricas de las requests
+from .metricas import metricas
+
+# Se importa la purga del borrado diferido
+from .purga import purga
+
+# Se importa el cifrado de contraseñas
+from .contrasenas import contrasenas
+
+# Se importan las vistas
+from .vistas import VistaCanciones, VistaCancion, VistaAlbumes, VistaAlbum, VistaUsuarios, VistaUsuario, VistaCache, VistaCancionesBulk, VistaAlbumesBulk, VistaBuscar, VistaAlbumCanciones, VistaMetricas, VistaLogin
+
+# Se importan los comandos de la consola (flask init-db, flask selftest)
+from .comandos import comandos
+
+# Se crea la instancia de la aplicación, config_name elige el perfil: 'development', 'testing', 'production' o 'default'
+# Los argumentos extra sobreescriben valores del perfil, por ejemplo create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///otra.db')
+# Crear la app no toca la db: las tablas se crean con 'flask init-db'
+def create_app(config_name, **configuracion):
     app = Flask(__name__)
 
-    # Indicar que se va a usar una base de datos SQLite
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///canciones.db'
+    # Se carga el perfil de configuración, ahí está la db SQLite y sus opciones
+    app.config.from_object(config[config_name])
+    app.config.update(configuracion)
+
+    # La db de lectura se arma con la URI final, si no, create_app('production', SQLALCHEMY_DATABASE_URI=...) leería del archivo del perfil
+    if not app.config.get('SQLALCHEMY_DATABASE_READ_URI') and app.config.get('LECTURA_MISMO_ARCHIVO'):
+        app.config['SQLALCHEMY_DATABASE_READ_URI'] = solo_lectura(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # Si hay una db de solo lectura se registra como el bind 'lectura', las consultas de los GET se mandan ahí
+    if app.config.get('SQLALCHEMY_DATABASE_READ_URI'):
+        app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS', {}), lectura=app.config['SQLALCHEMY_DATABASE_READ_URI'])
+
+    # Se inicializa la base de datos, los motores se crean pero no se abre ninguna conexión
+    db.init_app(app)
+
+    # Se aplican los PRAGMA de SQLite del perfil (WAL, busy_timeout, etc.) a cada conexión nueva
+    configurar_sqlite(app)
+
+    # Se inicializa el cache de respuestas
+    cache.init_app(app)
+
+    # Se inicializan las métricas: tiempo de db, serialización y json por request, cabecera Server-Timing y /metrics
+    metricas.init_app(app)
+
+    # Se inicializa la purga del borrado diferido, solo crea su hilo con el primer DELETE si BORRADO_DIFERIDO está activo
+    purga.init_app(app)
+
+    # Se inicializa el cifrado de contraseñas, su pool de procesos se crea con la primera contraseña que se cifra
+    contrasenas.init_app(app)
+
+    # Se crea inicializa el api
+    api = Api(app) # Se iniciliza la aplicación con la app
+    api.representation('application/json')(metricas.medido('json', output_json)) # El mismo json de flask_restful, midiendo cuánto tarda
+    api.add_resource(VistaCanciones, '/canciones') # VistaCanciones es el recurso, '/canciones' es la url con la que se accede al recurso
+    api.add_resource(VistaCancion, '/cancion/<int:id_cancion>') # Se añade VistaCancion como recurso, la url '/cancion/<int:id_cancion>' es la url de la cancion con id id_cancion, int indica que id_cancion es entero, se usa <> porque es una variable
+    api.add_resource(VistaAlbumes, '/albumes') # VistaAlbumes es el recurso, '/albumes' es la url con la que se accede al recurso
+    api.add_resource(VistaAlbum, '/album/<int:id_album>') # VistaAlbum es el recurso, la url es '/album/<int:id_album>' con id id_cancion, int indica que el id es entero, se usa <> porque se está viendo una variable
+    api.add_resource(VistaAlbumCanciones, '/album/<int:id_album>/canciones') # VistaAlbumCanciones es el recurso, con esta url se consultan, agregan y quitan las canciones del album
+    api.add_resource(VistaUsuarios, '/usuarios') # VistaUsuarios es el recurso, '/usuarios' es la url del recurso
+    api.add_resource(VistaUsuario, '/usuario/<int:id_usuario>') # VistaUsuario es el recurso, se accede a este con la url '/usuario/<int:id_usuario>', con id id_usuario, se usa int porque id es un entero, se usa <> porque se maneja una variable
+    api.add_resource(VistaLogin, '/login') # VistaLogin es el recurso, '/login' verifica el nombre de usuario y la contraseña
+    api.add_resource(VistaCancionesBulk, '/canciones/bulk') # VistaCancionesBulk es el recurso, '/canciones/bulk' recibe muchas canciones en una sola request
+    api.add_resource(VistaAlbumesBulk, '/albumes/bulk') # VistaAlbumesBulk es el recurso, '/albumes/bulk' recibe muchos albumes en una sola request
+    api.add_resource(VistaBuscar, '/buscar') # VistaBuscar es el recurso, '/buscar?q=texto' busca canciones y albumes por texto
+    api.add_resource(VistaCache, '/cache') # VistaCache es el recurso, '/cache' regresa los aciertos y fallos del cache
+    api.add_resource(VistaMetricas, '/metrics') # VistaMetricas es el recurso, '/metrics' regresa las métricas en formato de Prometheus
 
-    # Desactivar momentaneamente ciertos warnings que se presentarían en la base de datos 
-    # mientras la app está en etapa de desarrollo
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Se registran los comandos de la consola
+    for comando in comandos:
+        app.cli.add_command(comando)
 
-    return app
\ No newline at end of file
+    return app
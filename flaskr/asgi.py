@@ -0,0 +1,173 @@
+# Modo ASGI opcional: las mismas rutas y las mismas vistas de la app de flask, atendidas sobre AsyncSession (aiosqlite),
+# así una request que espera a la db no ocupa un hilo
+# Cada vista corre con run_sync() en el greenlet de la AsyncSession, con su sesión síncrona como self.sesion (ver vistas.Recurso):
+# el código de la vista es el mismo que en el modo WSGI y cada consulta se espera en el event loop
+# No da más throughput que el modo WSGI: las vistas son síncronas y corren en el greenlet de la sesión, en la máquina de pruebas
+# benchmarks/carga.py midió unas 200 rps en ASGI contra unas 270 rps en WSGI; sirve para no ocupar un hilo por request
+# Uso: pip install -r requirements-asgi.txt && uvicorn flaskr.asgi:app
+# El modo WSGI de siempre (flaskr.app) no cambia, los dos usan los mismos modelos, la misma db y el mismo cache
+
+# Se importa os para leer el perfil de configuración del entorno
+import os
+
+# Se importa asyncio para atender en un hilo las rutas que no tienen vista asíncrona
+import asyncio
+
+# Se importan las piezas de werkzeug para armar el entorno de la request y detectar los errores HTTP
+from werkzeug.test import EnvironBuilder
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Response
+
+# Se importa la representación json de flask_restful, las vistas asíncronas responden igual que las síncronas
+from flask_restful.representations.json import output_json
+from flask_restful.utils import unpack
+
+# Se importan event, make_url, el motor y las sesiones asíncronas de sqlalchemy, y await_only para esperar dentro del greenlet de la sesión
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.util.concurrency import await_only
+
+# Se importan la fábrica de la app, la base de datos y los PRAGMA de SQLite
+from . import create_app
+from .models import db, sentencias_pragmas, ejecutar_pragmas
+
+# Se importan las métricas, los motores asíncronos también se miden
+from .metricas import metricas
+
+
+def _url_asincrona(url): # URL del motor asíncrono: la misma db SQLite con el driver aiosqlite
+    if url.get_backend_name() != 'sqlite':
+        raise ValueError("El modo ASGI solo deriva la URL de SQLite, para otra db se indica SQLALCHEMY_ASYNC_DATABASE_URI")
+    return url.set(drivername='sqlite+aiosqlite')
+
+
+class AppAsgi:
+    # Aplicación ASGI sobre una app de flask: usa su mapa de rutas, su configuración y sus manejadores de errores
+    # Crearla no abre ninguna conexión, igual que create_app()
+    def __init__(self, app):
+        self.flask = app
+        self.motores = {} # Motores asíncronos, None es la db principal y 'lectura' la de solo lectura
+        with app.app_context():
+            for clave, motor in db.engines.items():
+                if clave is None and app.config.get('SQLALCHEMY_ASYNC_DATABASE_URI'):
+                    url = make_url(app.config['SQLALCHEMY_ASYNC_DATABASE_URI'])
+                else:
+                    url = _url_asincrona(motor.url) # La URL ya resuelta por flask_sqlalchemy (ruta absoluta dentro de instance/)
+                motor_asincrono = create_async_engine(url, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+                if url.get_backend_name() == 'sqlite' and app.config.get('SQLITE_PRAGMAS'): # Los mismos PRAGMA del perfil en cada conexión nueva
+                    event.listen(motor_asincrono.sync_engine, 'connect', ejecutar_pragmas(sentencias_pragmas(app.config['SQLITE_PRAGMAS'], clave)))
+                metricas.instrumentar(motor_asincrono.sync_engine)
+                self.motores[clave] = motor_asincrono
+        self.sesiones = async_sessionmaker(self.motores[None], expire_on_commit=False) # Los objetos se siguen usando después del commit
+        self.sesiones_lectura = async_sessionmaker(self.motores['lectura']) if 'lectura' in self.motores else self.sesiones
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send): # Al apagar el servidor se cierran las conexiones de los motores
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                for motor in self.motores.values():
+                    await motor.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        entorno = self._entorno(scope, await self._leer_cuerpo(receive))
+        try:
+            endpoint, argumentos = self.flask.url_map.bind_to_environ(entorno).match()
+        except HTTPException: # 404, 405 o redirección: se responde igual que flask
+            endpoint = None
+        clase = getattr(self.flask.view_functions.get(endpoint), 'view_class', None)
+        metodo = entorno['REQUEST_METHOD'].lower()
+        if not getattr(clase, 'asincrona', False) or not hasattr(clase, 'get' if metodo == 'head' else metodo):
+            # 404, 405, o una vista con asincrona = False (por ejemplo la importación masiva): la atiende la app de flask en un hilo
+            await self._enviar(send, await asyncio.to_thread(self._wsgi, entorno), entorno)
+            return
+
+        sesiones = self.sesiones_lectura if metodo in ('get', 'head') else self.sesiones # Los GET van a la db de solo lectura si existe
+        with self.flask.request_context(entorno):
+            async with sesiones() as sesion:
+                vista = clase(sesion.sync_session)
+                try:
+                    respuesta = self.flask.preprocess_request() # Los before_request de la app, por ejemplo el inicio de las métricas
+                    if respuesta is None:
+                        resultado = await sesion.run_sync(lambda _: getattr(vista, 'get' if metodo == 'head' else metodo)(**argumentos))
+                        respuesta = resultado if isinstance(resultado, Response) else self._json(resultado)
+                    else:
+                        respuesta = self.flask.make_response(respuesta)
+                except HTTPException as error: # abort() de flask o de flask_restful, flask_restful arma el cuerpo del error
+                    respuesta = self.flask.handle_user_exception(error)
+                except Exception as error: # Cualquier otro error es un 500, igual que en flask (se registra en el log de la app)
+                    respuesta = self.flask.handle_exception(error)
+                respuesta = self.flask.process_response(respuesta) # Los after_request de la app, por ejemplo Server-Timing
+                await self._enviar(send, respuesta, entorno, sesion)
+
+    def _json(self, resultado): # Igual que Api.make_response() de flask_restful: (datos, código, cabeceras) a json
+        with metricas.fase('json'):
+            respuesta = output_json(*unpack(resultado))
+        respuesta.headers['Content-Type'] = 'application/json'
+        return respuesta
+
+    def _wsgi(self, entorno): # Atiende la request con la app de flask, regresa el Response completo
+        with self.flask.request_context(entorno):
+            respuesta = self.flask.full_dispatch_request()
+            respuesta.make_sequence() # Se lee el cuerpo mientras el contexto (y la sesión de la db) sigue abierto
+            return respuesta
+
+    async def _leer_cuerpo(self, receive):
+        partes = []
+        while True:
+            mensaje = await receive()
+            partes.append(mensaje.get('body', b''))
+            if not mensaje.get('more_body'):
+                return b''.join(partes)
+
+    def _entorno(self, scope, cuerpo): # Entorno WSGI equivalente a la request ASGI, con él flask arma request
+        cabeceras = [(nombre.decode('latin-1'), valor.decode('latin-1')) for nombre, valor in scope['headers']]
+        servidor = scope.get('server') or ('localhost', 80)
+        host = next((valor for nombre, valor in cabeceras if nombre.lower() == 'host'), '{}:{}'.format(*servidor))
+        constructor = EnvironBuilder(
+            path=scope['path'],
+            base_url='{}://{}{}'.format(scope.get('scheme', 'http'), host, scope.get('root_path', '')),
+            method=scope['method'],
+            query_string=scope['query_string'].decode('latin-1'),
+            headers=cabeceras,
+            data=cuerpo,
+        )
+        entorno = constructor.get_environ()
+        if scope.get('client'):
+            entorno['REMOTE_ADDR'] = scope['client'][0]
+        return entorno
+
+    async def _enviar(self, send, respuesta, entorno, sesion=None):
+        # Igual que un servidor WSGI: werkzeug quita el cuerpo de HEAD, 204 y 304 y ajusta las cabeceras
+        cabeceras = [(nombre.lower().encode('latin-1'), valor.encode('latin-1')) for nombre, valor in respuesta.get_wsgi_headers(entorno).to_wsgi_list()]
+        await send({'type': 'http.response.start', 'status': respuesta.status_code, 'headers': cabeceras})
+        if sesion is not None and respuesta.is_streamed: # Streaming (?formato=ndjson o csv): el generador consulta la db por lotes
+            if entorno['REQUEST_METHOD'] != 'HEAD':
+                # Todo el generador corre en un solo greenlet de la sesión, así sus consultas se esperan en el event loop
+                # y el contexto que abre stream_with_context se cierra en el mismo greenlet en el que se abrió
+                def enviar_partes(_):
+                    for parte in respuesta.iter_encoded():
+                        await_only(send({'type': 'http.response.body', 'body': parte, 'more_body': True}))
+                await sesion.run_sync(enviar_partes)
+            await send({'type': 'http.response.body', 'body': b''})
+        else:
+            await send({'type': 'http.response.body', 'body': b''.join(respuesta.get_app_iter(entorno))})
+        respuesta.close() # Corre los call_on_close, por ejemplo el registro de las métricas de un streaming
+
+
+def create_app_asgi(config_name, **configuracion): # Igual que create_app(), pero regresa la aplicación ASGI
+    return AppAsgi(create_app(config_name, **configuracion))
+
+
+# Se crea la aplicación ASGI con el perfil de FLASK_CONFIG, igual que app.py
+app = create_app_asgi(os.environ.get('FLASK_CONFIG', 'default'))
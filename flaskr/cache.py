@@ -0,0 +1,172 @@
+# Cache de respuestas serializadas para los recursos de canciones, albumes y usuarios
+
+# Se importa time para manejar el tiempo de vida (TTL) de las entradas
+import time
+
+# Se importa threading para proteger el cache en memoria cuando hay varios hilos atendiendo requests
+import threading
+
+# Se importa OrderedDict, que mantiene el orden de uso para sacar la entrada menos usada (LRU)
+from collections import OrderedDict
+
+# Se importa import_string para poder configurar un backend externo con una ruta tipo 'paquete.modulo.Clase'
+from werkzeug.utils import import_string
+
+
+### Backends del cache
+
+# Interfaz que debe implementar cualquier backend (en memoria, redis, memcached, etc.)
+# Los valores que se guardan son tuplas de cadenas, un backend compartido es responsable de convertirlas a bytes
+class BackendCache:
+    def get(self, clave): # Regresa el valor guardado o None si no existe o ya expiró
+        raise NotImplementedError
+
+    def set(self, clave, valor, ttl=None): # Guarda el valor, ttl en segundos, None usa el ttl por defecto del backend
+        raise NotImplementedError
+
+    def delete(self, *claves): # Borra las claves indicadas, las que no existan se ignoran
+        raise NotImplementedError
+
+    def incr(self, clave): # Incrementa un contador entero (sin expiración) y regresa el valor nuevo
+        raise NotImplementedError
+
+    def contador(self, clave): # Regresa el valor actual de un contador, 0 si no existe
+        raise NotImplementedError
+
+    def clear(self): # Borra todo el contenido
+        raise NotImplementedError
+
+
+# Backend que no guarda nada, sirve para desactivar el cache sin cambiar las vistas
+class CacheNulo(BackendCache):
+    def get(self, clave):
+        return None
+
+    def set(self, clave, valor, ttl=None):
+        pass
+
+    def delete(self, *claves):
+        pass
+
+    def incr(self, clave):
+        return 0
+
+    def contador(self, clave):
+        return 0
+
+    def clear(self):
+        pass
+
+
+# Backend en memoria del proceso, LRU con tiempo de vida
+# Solo para un proceso: cada worker de gunicorn tendría su propia copia y los cambios de uno no invalidarían las de los otros,
+# con varios workers se usa un backend compartido o 'nulo' (el perfil 'production' usa 'nulo' por defecto)
+class CacheMemoria(BackendCache):
+    def __init__(self, max_entradas=1024, ttl=300):
+        self.max_entradas = max_entradas # Cuando se supera, se saca la entrada usada hace más tiempo
+        self.ttl = ttl # Tiempo de vida por defecto en segundos
+        self._datos = OrderedDict() # clave -> (expiracion, valor)
+        self._contadores = {} # Los contadores de versión no expiran ni se sacan por LRU
+        self._candado = threading.Lock()
+
+    def get(self, clave):
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            expiracion, valor = entrada
+            if expiracion is not None and expiracion < time.monotonic(): # La entrada ya expiró
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave) # Se marca como la más recientemente usada
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expiracion = time.monotonic() + ttl if ttl else None
+        with self._candado:
+            self._datos[clave] = (expiracion, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas: # Se saca la menos usada
+                self._datos.popitem(last=False)
+
+    def delete(self, *claves):
+        with self._candado:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def incr(self, clave):
+        with self._candado:
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+            return self._contadores[clave]
+
+    def contador(self, clave):
+        return self._contadores.get(clave, 0)
+
+    def clear(self):
+        with self._candado:
+            self._datos.clear()
+            self._contadores.clear()
+
+
+# Backends que se pueden elegir por nombre en la configuración CACHE_BACKEND
+BACKENDS = {
+    'memoria': CacheMemoria,
+    'nulo': CacheNulo,
+}
+
+
+### Extensión de la app
+
+# Se usa igual que db: se instancia una vez y se registra con init_app(app)
+class Cache:
+    def __init__(self):
+        self.backend = CacheNulo()
+        self.aciertos = 0 # Contadores de hits y misses
+        self.fallos = 0
+        self._candado = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memoria') # 'memoria', 'nulo', una ruta 'modulo.Clase' o una instancia de BackendCache
+        app.config.setdefault('CACHE_TTL', 300)
+        app.config.setdefault('CACHE_MAX_ENTRADAS', 1024)
+        backend = app.config['CACHE_BACKEND']
+        if isinstance(backend, str):
+            clase = BACKENDS.get(backend) or import_string(backend)
+            backend = clase(max_entradas=app.config['CACHE_MAX_ENTRADAS'], ttl=app.config['CACHE_TTL']) if clase is CacheMemoria else clase()
+        self.backend = backend
+        app.extensions['cache'] = self
+
+    # Claves: 'cancion:5' para un recurso, 'lista:cancion:v3:limit=10' para una lista
+    # Las listas llevan la versión del tipo de recurso, al cambiar la versión todas las listas viejas quedan inalcanzables y expiran solas
+    def clave_recurso(self, tipo, id):
+        return '{}:{}'.format(tipo, id)
+
+    def clave_lista(self, tipo, consulta):
+        version = self.backend.contador('version:' + tipo)
+        return 'lista:{}:v{}:{}'.format(tipo, version, consulta)
+
+    def obtener(self, clave):
+        valor = self.backend.get(clave)
+        with self._candado:
+            if valor is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+        return valor
+
+    def guardar(self, clave, valor):
+        self.backend.set(clave, valor)
+
+    def invalidar(self, tipo, *ids): # Borra los recursos indicados y todas las listas de ese tipo
+        if ids:
+            self.backend.delete(*[self.clave_recurso(tipo, id) for id in ids])
+        self.backend.incr('version:' + tipo)
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {'aciertos': self.aciertos, 'fallos': self.fallos, 'tasa_aciertos': self.aciertos / total if total else 0.0}
+
+
+# Instancia del cache
+cache = Cache()
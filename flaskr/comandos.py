@@ -0,0 +1,212 @@
+# Comandos de consola de la app, se ejecutan con 'flask --app flaskr.app <comando>'
+
+# Se importa click, con el que flask define los comandos
+import click
+
+# Se importan with_appcontext para que los comandos tengan acceso a la db y current_app para leer la configuración
+from flask import current_app
+from flask.cli import with_appcontext
+
+# Se importan inspect, CreateColumn, CreateIndex y CreateTable de sqlalchemy para agregar las columnas, los índices nuevos y las cascadas a una db que ya existe
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+# Se importa os para reconocer el formato por la extensión del archivo
+import os
+
+# Se importan la base de datos, los modelos, el esquema de Album y la purga del borrado diferido
+from .models import db, Cancion, Usuario, Album, Medio, AlbumSchema, purgar
+
+# Se importan la importación y exportación masiva
+from .vistas.importacion import importar, exportar, leer_filas, RECURSOS, TAMANO_LOTE
+
+# Se importan los filtros de las listas para revisar que usen sus índices
+from .vistas.consultas import FILTROS
+
+
+# Crea todas las tablas que se definieron como clases, las que ya existen no se tocan
+# A las tablas que ya existían se les agregan las columnas y los índices nuevos, se reconstruyen las que no tienen ON DELETE CASCADE,
+# y se crean los índices de búsqueda de texto y los triggers de los totales de los albumes
+@click.command('init-db')
+@with_appcontext
+def init_db():
+    with db.engine.begin() as conexion:
+        _agregar_columnas(conexion)
+    if db.engine.dialect.name == 'sqlite':
+        _agregar_cascadas()
+    db.create_all(bind_key=None) # Solo la db principal, el bind de lectura abre el mismo archivo
+    with db.engine.begin() as conexion:
+        for tabla in db.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                conexion.execute(CreateIndex(indice, if_not_exists=True)) # CREATE INDEX IF NOT EXISTS, checkfirst no reconoce el índice de expresión
+    click.echo('Base de datos inicializada')
+
+
+def _agregar_columnas(conexion): # ALTER TABLE ... ADD COLUMN para las columnas de los modelos que una db vieja no tiene
+    inspector = inspect(conexion)
+    for tabla in db.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            continue # Las tablas nuevas las crea create_all completas
+        existentes = {columna['name'] for columna in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in existentes:
+                continue
+            definicion = CreateColumn(columna).compile(dialect=conexion.dialect)
+            conexion.exec_driver_sql('ALTER TABLE {} ADD COLUMN {}'.format(tabla.name, definicion))
+            click.echo('Columna agregada: {}.{}'.format(tabla.name, columna.name))
+
+
+def _sin_cascada(inspector, tabla): # True si alguna llave foránea de la tabla en la db no tiene el ON DELETE del modelo
+    en_db = {tuple(llave['constrained_columns']): (llave.get('options') or {}).get('ondelete') for llave in inspector.get_foreign_keys(tabla.name)}
+    return any((en_db.get((llave.parent.name,)) or '').upper() != (llave.ondelete or '').upper() for llave in tabla.foreign_keys)
+
+
+def _copia(tabla): # SELECT con el que se copian las filas a la tabla nueva
+    # SQLite no revisaba las llaves foráneas: las que apuntan a filas que ya no existen quedan en NULL, o se descarta la fila si la columna no acepta NULL
+    expresiones, condiciones = [], []
+    for columna in tabla.columns:
+        llave = next(iter(columna.foreign_keys), None)
+        if llave is None:
+            expresiones.append(columna.name)
+            continue
+        existe = '{} IN (SELECT {} FROM {})'.format(columna.name, llave.column.name, llave.column.table.name)
+        if columna.nullable:
+            expresiones.append('CASE WHEN {} THEN {} END'.format(existe, columna.name))
+        else:
+            expresiones.append(columna.name)
+            condiciones.append(existe)
+    return 'SELECT {} FROM {}{}'.format(', '.join(expresiones), tabla.name, ' WHERE ' + ' AND '.join(condiciones) if condiciones else '')
+
+
+def _agregar_cascadas(): # SQLite no cambia las llaves foráneas con ALTER TABLE: la tabla se copia a una nueva con el esquema actual y se reemplaza
+    with db.engine.connect() as conexion:
+        inspector = inspect(conexion)
+        tablas = [tabla for tabla in db.metadata.sorted_tables if inspector.has_table(tabla.name) and _sin_cascada(inspector, tabla)]
+        if not tablas:
+            return
+        # Fuera de una transacción (si no SQLite lo ignora): así borrar la tabla vieja no dispara las cascadas sobre las que apuntan a ella
+        conexion.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        # El RENAME no revisa los triggers de las otras tablas, que mencionan la tabla mientras no existe (se vuelve a llamar igual)
+        conexion.exec_driver_sql('PRAGMA legacy_alter_table=ON')
+        try:
+            conexion.exec_driver_sql('BEGIN') # Todas las tablas se reconstruyen en una sola transacción
+            for tabla in tablas: # En orden de dependencias, las filas de album_cancion se revisan contra el album ya copiado
+                nueva = tabla.name + '_nueva'
+                columnas = ', '.join(columna.name for columna in tabla.columns)
+                crear = str(CreateTable(tabla).compile(dialect=conexion.dialect)).replace('TABLE {} ('.format(tabla.name), 'TABLE {} ('.format(nueva), 1)
+                conexion.exec_driver_sql(crear)
+                copiadas = conexion.exec_driver_sql('INSERT INTO {} ({}) {}'.format(nueva, columnas, _copia(tabla))).rowcount
+                total = conexion.exec_driver_sql('SELECT count(*) FROM {}'.format(tabla.name)).scalar()
+                conexion.exec_driver_sql('DROP TABLE {}'.format(tabla.name)) # Se lleva sus índices y triggers, init-db los vuelve a crear
+                conexion.exec_driver_sql('ALTER TABLE {} RENAME TO {}'.format(nueva, tabla.name))
+                click.echo('Tabla reconstruida con ON DELETE CASCADE: {}{}'.format(
+                    tabla.name, ' ({} filas huerfanas descartadas)'.format(total - copiadas) if total != copiadas else ''))
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            conexion.exec_driver_sql('PRAGMA legacy_alter_table=OFF')
+            conexion.exec_driver_sql('PRAGMA foreign_keys=ON')
+
+
+# Prueba el estado de la base de datos y de las clases, todo se hace dentro de una transacción que al final se deshace
+# así que no deja filas de prueba en la db
+@click.command('selftest')
+@with_appcontext
+def selftest():
+    try:
+        # Para verificar que SQLite revisa las llaves foráneas, sin esto no se borran en cascada los albumes ni las filas de album_cancion
+        if db.engine.dialect.name == 'sqlite':
+            _verificar(db.session.execute(db.text('PRAGMA foreign_keys')).scalar() == 1, 'SQLite revisa las llaves foraneas (PRAGMA foreign_keys=ON)')
+            # El filtro por duración solo usa el índice de expresión si la fórmula es idéntica, con los mismos parámetros que manda la vista
+            plan = _plan(db.select(Cancion.id).where(FILTROS[Cancion]['duracion_min'][1](180)))
+            _verificar('ix_cancion_duracion' in plan, 'El filtro duracion_min usa ix_cancion_duracion ({})'.format(plan))
+
+        # Para probar la clase Cancion, se crea el objeto prueba_cancion y se consulta de nuevo
+        prueba_cancion = Cancion(titulo='Titulo de prueba', minutos=2, segundos=35, interprete='Santiago Felipe')
+        db.session.add(prueba_cancion)
+        db.session.flush() # Se manda a la db sin hacer commit
+        _verificar(db.session.get(Cancion, prueba_cancion.id) is prueba_cancion, 'Cancion se guarda y se consulta')
+        prueba_cancion.minutos = 3
+        db.session.flush() # El UPDATE del ORM revisa y sube la versión
+        _verificar(prueba_cancion.version == 2, 'Cancion sube de versión al cambiar')
+
+        # Para probar la clase Usuario, la clase Album y la asociacion del album con el usuario
+        prueba_usuario = Usuario(nombre_usuario='Usuario de prueba')
+        prueba_usuario.cifrar_contrasena('12345')
+        _verificar(prueba_usuario.contrasena != '12345' and prueba_usuario.verificar_contrasena('12345') and not prueba_usuario.verificar_contrasena('54321'),
+                   'La contraseña se guarda cifrada y se verifica')
+        prueba_album = Album(titulo='Album de prueba', anio=1998, descripcion='Descripcion de prueba', medio=Medio.CD)
+        prueba_usuario.albums.append(prueba_album)
+        db.session.add(prueba_usuario)
+        db.session.flush()
+        _verificar(prueba_album.usuario_id == prueba_usuario.id, 'Album queda asociado a su usuario')
+
+        # Para probar la serialización de la clase Album
+        serializado = AlbumSchema().dump(prueba_album)
+        _verificar(serializado['medio'] == {'llave': 'CD', 'valor': 3} and serializado['usuario'] == prueba_usuario.id, 'AlbumSchema serializa el album')
+
+        # Para verificar la composición del album con su usuario, al borrar el usuario se borra el album
+        id_album = prueba_album.id
+        db.session.delete(prueba_usuario)
+        db.session.flush()
+        db.session.expire_all()
+        _verificar(db.session.get(Album, id_album) is None, 'Al borrar el usuario se borran sus albumes')
+    finally:
+        db.session.rollback() # No se guarda nada de la prueba
+    click.echo('Selftest completado')
+
+
+def _plan(consulta): # EXPLAIN QUERY PLAN de la consulta de SQLite con sus parámetros tal como los manda sqlalchemy
+    compilada = consulta.compile(db.engine)
+    parametros = tuple(compilada.params[nombre] for nombre in compilada.positiontup)
+    filas = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compilada), parametros)
+    return '; '.join(str(fila[-1]) for fila in filas)
+
+
+def _verificar(condicion, descripcion): # Muestra el resultado de una verificación, si falla termina el comando con error
+    if not condicion:
+        raise click.ClickException('FALLO: ' + descripcion)
+    click.echo('OK: ' + descripcion)
+
+
+# Importa canciones o albumes desde un archivo JSON (arreglo), NDJSON o CSV, '-' lee de la entrada estandar
+@click.command('import')
+@click.argument('recurso', type=click.Choice(list(RECURSOS)))
+@click.argument('archivo', type=click.File('rb'))
+@click.option('--formato', type=click.Choice(['json', 'ndjson', 'csv']), help='Por defecto se toma de la extensión del archivo')
+@click.option('--lote', default=TAMANO_LOTE, show_default=True, help='Filas por transacción')
+@with_appcontext
+def importar_comando(recurso, archivo, formato, lote):
+    formato = formato or os.path.splitext(archivo.name)[1].lstrip('.').lower()
+    if formato not in ('json', 'ndjson', 'csv'):
+        raise click.UsageError('No se reconoce el formato del archivo, use --formato')
+    reporte = importar(recurso, leer_filas(archivo, formato), tamano_lote=lote)
+    for error in reporte['errores']:
+        click.echo('Fila {}: {}'.format(error['fila'], error['errores']), err=True)
+    click.echo('{} {} importados, {} filas con errores'.format(reporte['insertados'], recurso, len(reporte['errores'])))
+
+
+# Exporta todas las canciones o albumes en NDJSON o CSV, en el formato que acepta 'flask import'
+@click.command('export')
+@click.argument('recurso', type=click.Choice(list(RECURSOS)))
+@click.argument('archivo', type=click.File('w'), default='-')
+@click.option('--formato', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@with_appcontext
+def exportar_comando(recurso, archivo, formato):
+    for bloque in exportar(recurso, formato):
+        archivo.write(bloque)
+
+
+# Borra las filas que el borrado diferido (BORRADO_DIFERIDO) dejó marcadas, por ejemplo si el proceso terminó antes de purgarlas
+@click.command('purgar')
+@click.option('--lote', type=int, help='Filas por transacción, por defecto PURGA_LOTE')
+@with_appcontext
+def purgar_comando(lote):
+    borradas = purgar(lote or current_app.config['PURGA_LOTE'])
+    click.echo(', '.join('{} {}'.format(cantidad, tabla) for tabla, cantidad in borradas.items()) + ' purgados')
+
+
+# Comandos que create_app registra en la app
+comandos = [init_db, selftest, importar_comando, exportar_comando, purgar_comando]
@@ -0,0 +1,125 @@
+# Perfiles de configuración de la app, create_app(config_name) elige uno de estos por nombre
+
+# Se importa os para leer variables de entorno
+import os
+
+# Se importa json para leer el costo del cifrado de las contraseñas desde el entorno
+import json
+
+
+def solo_lectura(url): # Convierte 'sqlite:///canciones.db' en la URI del mismo archivo abierto en modo solo lectura
+    if not url.startswith('sqlite:///') or url.endswith(':memory:') or '?' in url:
+        return None
+    return 'sqlite:///file:{}?mode=ro&uri=true'.format(url[len('sqlite:///'):])
+
+
+# Configuración base, la comparten todos los perfiles
+class Config:
+    # Indicar que se va a usar una base de datos SQLite, se puede cambiar con la variable de entorno DATABASE_URL
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///canciones.db')
+
+    # Desactivar momentaneamente ciertos warnings que se presentarían en la base de datos
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # PRAGMAs que se ejecutan en cada conexión nueva de SQLite
+    # foreign_keys va en todos los perfiles: SQLite no revisa las llaves foráneas ni borra en cascada (ON DELETE CASCADE) sin él
+    SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+
+    # Serializa las listas y los GET con funciones generadas a partir de los esquemas, sobre filas de core en lugar de objetos del ORM
+    # La salida es idéntica a la de marshmallow, False usa marshmallow directamente
+    SERIALIZACION_COMPILADA = True
+
+    # Tamaño de página de las listas JSON que no traen ?limit= (no más de 1000), con Link y X-Next-Cursor a la siguiente
+    # None regresa la tabla completa; ?formato=ndjson y ?formato=csv no se paginan si no se pide, sirven para exportar todo
+    LIMITE_POR_DEFECTO = 100
+
+    # Base de datos de solo lectura a la que se mandan las consultas de los GET, None hace que todo vaya a la principal
+    SQLALCHEMY_DATABASE_READ_URI = None
+
+    # Sin SQLALCHEMY_DATABASE_READ_URI, True hace que create_app abra SQLALCHEMY_DATABASE_URI (la final, con lo que se sobreescriba) en modo solo lectura
+    LECTURA_MISMO_ARCHIVO = False
+
+    # URL del motor asíncrono del modo ASGI (flaskr/asgi.py), None usa la misma db SQLite con el driver aiosqlite
+    # El modo ASGI no da más throughput que el WSGI (unas 200 contra 270 req/s en benchmarks/carga.py), solo evita un hilo por request
+    SQLALCHEMY_ASYNC_DATABASE_URI = os.environ.get('DATABASE_ASYNC_URL')
+
+    # Backend del cache de respuestas: 'memoria', 'nulo' (sin cache) o una ruta 'modulo.Clase'
+    # 'memoria' es del proceso: solo sirve con un proceso, con varios un cambio en uno no invalida el cache de los demás
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memoria')
+
+    # Mide cada request (db, serialización, json), agrega la cabecera Server-Timing y expone /metrics
+    METRICAS = True
+
+    # Milisegundos a partir de los cuales una consulta se registra en el log con su EXPLAIN QUERY PLAN, None no registra ninguna
+    METRICAS_CONSULTA_LENTA = None
+
+    # Los DELETE solo marcan la fila como eliminada y responden de inmediato, un hilo la borra después junto con lo que depende de ella
+    # Antes de desactivarlo se corre 'flask purgar', las filas marcadas que queden vuelven a aparecer
+    BORRADO_DIFERIDO = os.environ.get('BORRADO_DIFERIDO', '').lower() in ('1', 'true', 'si')
+
+    # Filas que la purga borra por transacción, entre lotes otras escrituras pueden tomar el candado de la db
+    PURGA_LOTE = 500
+
+    # Cifrado de las contraseñas, 'scrypt' o 'pbkdf2', y su costo como dict (None usa contrasenas.COSTOS), por ejemplo {"n": 32768}
+    # Al cambiarlos las contraseñas guardadas se vuelven a cifrar con los nuevos la siguiente vez que cada usuario inicia sesión
+    CONTRASENA_ALGORITMO = os.environ.get('CONTRASENA_ALGORITMO', 'scrypt')
+    CONTRASENA_COSTO = json.loads(os.environ['CONTRASENA_COSTO']) if os.environ.get('CONTRASENA_COSTO') else None
+
+    # Procesos del pool que cifra las contraseñas, None usa uno por CPU y 0 cifra en el hilo de la request
+    CONTRASENA_PROCESOS = int(os.environ['CONTRASENA_PROCESOS']) if os.environ.get('CONTRASENA_PROCESOS') else None
+
+    # Contraseñas que pueden estar en el pool a la vez, con más se responde 503, None permite 4 por proceso
+    CONTRASENA_PENDIENTES = int(os.environ['CONTRASENA_PENDIENTES']) if os.environ.get('CONTRASENA_PENDIENTES') else None
+
+
+# Configuración para desarrollo, se comporta como la app original
+class DevelopmentConfig(Config):
+    pass
+
+
+# Configuración para pruebas y benchmarks, una db en memoria que desaparece al terminar
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite:///:memory:')
+
+
+# Configuración para producción con varios workers de gunicorn
+class ProductionConfig(Config):
+    SQLITE_PRAGMAS = {
+        'foreign_keys': 'ON', # Llaves foráneas y borrado en cascada, igual que en los otros perfiles
+        'journal_mode': 'WAL', # Los lectores no bloquean al escritor ni el escritor a los lectores
+        'synchronous': 'NORMAL', # Con WAL es seguro ante caídas de la app, solo hace fsync en los checkpoints
+        'busy_timeout': 5000, # Espera hasta 5 s por el candado de escritura en lugar de fallar con "database is locked"
+        'cache_size': -64000, # 64 MB de cache de páginas por conexión (negativo = KiB)
+        'mmap_size': 268435456, # Lee la db con memoria mapeada, hasta 256 MB
+        'temp_store': 'MEMORY', # Tablas temporales y ordenamientos en memoria
+    }
+
+    # Pool de conexiones, cada conexión mantiene su cache de páginas entre requests
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': 30,
+        'pool_recycle': 3600,
+    }
+
+    # Cada worker de gunicorn tendría su propio cache en memoria y respondería versiones viejas (y 412 con If-Match) de lo que cambió otro
+    # worker, por eso producción no usa cache de respuestas salvo que CACHE_BACKEND indique un backend compartido ('modulo.Clase')
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'nulo')
+
+    # Las consultas de más de 250 ms (o METRICAS_CONSULTA_LENTA del entorno) se registran con su plan
+    METRICAS_CONSULTA_LENTA = float(os.environ.get('METRICAS_CONSULTA_LENTA', 250))
+
+    # Por defecto las lecturas usan el mismo archivo abierto en modo solo lectura, con WAL nunca esperan al escritor
+    # DATABASE_READ_URL manda las lecturas a otra db
+    SQLALCHEMY_DATABASE_READ_URI = os.environ.get('DATABASE_READ_URL')
+    LECTURA_MISMO_ARCHIVO = True
+
+
+# Perfiles por nombre
+config = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+    'default': DevelopmentConfig,
+}
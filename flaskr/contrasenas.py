@@ -0,0 +1,172 @@
+# Cifrado de las contraseñas de los usuarios con scrypt o pbkdf2 (hashlib)
+# Cifrar o verificar una contraseña ocupa decenas de milisegundos de CPU, por eso se hace en un pool acotado de procesos:
+# el hilo de la request (o el event loop del modo ASGI) solo espera el resultado y no retiene el GIL mientras tanto
+# El formato guardado lleva el algoritmo y su costo, 'scrypt$16384$8$1$sal$hash', así se sabe cuándo hay que volver a cifrar
+# Los procesos del pool se crean con spawn: un script que use la app y cifre contraseñas necesita el if __name__ == '__main__'
+
+# Se importan hashlib para los algoritmos, hmac para comparar en tiempo constante, os para la sal y base64 para guardarla como texto
+import hashlib
+import hmac
+import os
+import base64
+
+# Se importan asyncio y threading para esperar el pool desde el modo ASGI y para crearlo una sola vez
+import asyncio
+import threading
+
+# Se importan el pool de procesos y multiprocessing para elegir cómo se crean sus procesos
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Se importa ServiceUnavailable de werkzeug, flask_restful lo responde como un 503 en json
+from werkzeug.exceptions import ServiceUnavailable
+
+# Se importan in_greenlet y await_only de sqlalchemy: las vistas del modo ASGI corren en el greenlet de su AsyncSession y desde ahí esperan al pool
+from sqlalchemy.util.concurrency import in_greenlet, await_only
+
+
+# Costos por defecto de cada algoritmo, se cambian con CONTRASENA_COSTO
+COSTOS = {
+    'scrypt': {'n': 2 ** 14, 'r': 8, 'p': 1}, # 16 MB de memoria por contraseña
+    'pbkdf2': {'iteraciones': 600000}, # pbkdf2 con sha256
+}
+
+
+# Cuando el pool ya tiene CONTRASENA_PENDIENTES contraseñas esperando se responde 503 en lugar de encolar sin límite
+class PoolSaturado(ServiceUnavailable):
+    description = 'Hay demasiadas contraseñas pendientes de cifrar, intente de nuevo en un momento'
+
+
+### Funciones que corren en los procesos del pool, no usan la app
+
+def _b64(datos):
+    return base64.b64encode(datos).decode('ascii').rstrip('=')
+
+
+def _desde_b64(texto):
+    return base64.b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _derivar(texto, sal, algoritmo, costo): # La llave derivada de la contraseña, 32 bytes
+    if algoritmo == 'scrypt':
+        n, r, p = costo['n'], costo['r'], costo['p']
+        return hashlib.scrypt(texto.encode('utf-8'), salt=sal, n=n, r=r, p=p, maxmem=256 * r * (n + p + 2), dklen=32)
+    return hashlib.pbkdf2_hmac('sha256', texto.encode('utf-8'), sal, costo['iteraciones'], dklen=32)
+
+
+def _formato(algoritmo, costo): # Valores del costo en el orden en que se guardan
+    return [costo['n'], costo['r'], costo['p']] if algoritmo == 'scrypt' else [costo['iteraciones']]
+
+
+def cifrar(texto, algoritmo, costo): # 'algoritmo$costo...$sal$hash' de la contraseña con una sal nueva
+    sal = os.urandom(16)
+    partes = [algoritmo] + [str(valor) for valor in _formato(algoritmo, costo)] + [_b64(sal), _b64(_derivar(texto, sal, algoritmo, costo))]
+    return '$'.join(partes)
+
+
+def parametros(cifrada): # (algoritmo, costo) con los que se cifró la contraseña guardada, None si no está cifrada
+    partes = (cifrada or '').split('$')
+    try:
+        if partes[0] == 'scrypt' and len(partes) == 6:
+            return 'scrypt', {'n': int(partes[1]), 'r': int(partes[2]), 'p': int(partes[3])}
+        if partes[0] == 'pbkdf2' and len(partes) == 4:
+            return 'pbkdf2', {'iteraciones': int(partes[1])}
+    except ValueError:
+        pass
+    return None
+
+
+def verificar(texto, cifrada): # True si texto es la contraseña guardada, con cualquier algoritmo o costo
+    if not cifrada:
+        return False
+    actuales = parametros(cifrada)
+    if actuales is None: # Las contraseñas de antes del cifrado se guardaban en texto plano, se vuelven a cifrar al iniciar sesión
+        return hmac.compare_digest(texto.encode('utf-8'), cifrada.encode('utf-8'))
+    partes = cifrada.split('$')
+    derivada = _derivar(texto, _desde_b64(partes[-2]), *actuales)
+    return hmac.compare_digest(derivada, _desde_b64(partes[-1]))
+
+
+### Extensión de la app
+
+# Se usa igual que db, cache y metricas: se instancia una vez y se registra con init_app(app)
+class Contrasenas:
+    def __init__(self):
+        self.algoritmo = 'scrypt'
+        self.costo = COSTOS['scrypt']
+        self.procesos = 0 # 0 cifra en el mismo hilo de la request, sin pool
+        self._pool = None
+        self._pid = None # El pool no sirve en un proceso hijo (por ejemplo un worker de gunicorn con --preload), ahí se crea otro
+        self._cupo = None # Contraseñas que pueden estar en el pool al mismo tiempo, cifrándose o esperando
+        self._candado = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('CONTRASENA_ALGORITMO', 'scrypt') # 'scrypt' o 'pbkdf2'
+        app.config.setdefault('CONTRASENA_COSTO', None) # Dict con el costo del algoritmo, None usa COSTOS
+        app.config.setdefault('CONTRASENA_PROCESOS', None) # Procesos del pool, None usa uno por CPU, 0 cifra sin pool
+        app.config.setdefault('CONTRASENA_PENDIENTES', None) # None permite 4 pendientes por proceso
+        self.algoritmo = app.config['CONTRASENA_ALGORITMO']
+        if self.algoritmo not in COSTOS:
+            raise ValueError('CONTRASENA_ALGORITMO debe ser uno de: {}'.format(', '.join(COSTOS)))
+        self.costo = dict(COSTOS[self.algoritmo], **(app.config['CONTRASENA_COSTO'] or {}))
+        procesos = app.config['CONTRASENA_PROCESOS']
+        self.procesos = (os.cpu_count() or 1) if procesos is None else procesos
+        self._cupo = threading.BoundedSemaphore(app.config['CONTRASENA_PENDIENTES'] or 4 * max(self.procesos, 1))
+        self.cerrar() # Si se registra otra app con otro número de procesos, el pool se vuelve a crear con el primer uso
+        app.extensions['contrasenas'] = self
+
+    def _obtener_pool(self): # El pool se crea con la primera contraseña, no al importar la app ni antes del fork de gunicorn
+        with self._candado:
+            if self._pool is None or self._pid != os.getpid():
+                # spawn: los procesos del pool no heredan los hilos ni las conexiones a la db de la app
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._pool
+
+    def _enviar(self, funcion, *args): # Manda la función al pool, regresa el Future
+        cupo = self._cupo # El mismo semáforo que se tomó, aunque init_app lo reemplace antes de que termine
+        if not cupo.acquire(blocking=False):
+            raise PoolSaturado(retry_after=1)
+        try:
+            try:
+                futuro = self._obtener_pool().submit(funcion, *args)
+            except BrokenProcessPool: # Murió un proceso del pool (por ejemplo por falta de memoria), se crea un pool nuevo
+                self.cerrar()
+                futuro = self._obtener_pool().submit(funcion, *args)
+        except BaseException:
+            cupo.release()
+            raise
+        futuro.add_done_callback(lambda _: cupo.release())
+        return futuro
+
+    def _ejecutar(self, funcion, *args): # Resultado de la función, el hilo espera al pool sin retener el GIL
+        if in_greenlet(): # Vista del modo ASGI: se espera en el event loop, que mientras tanto atiende otras requests
+            return await_only(self._ejecutar_async(funcion, *args))
+        if not self.procesos:
+            return funcion(*args)
+        return self._enviar(funcion, *args).result()
+
+    async def _ejecutar_async(self, funcion, *args): # Igual que _ejecutar, sin pool la función corre en un hilo para no detener el event loop
+        if not self.procesos:
+            return await asyncio.to_thread(funcion, *args)
+        return await asyncio.wrap_future(self._enviar(funcion, *args))
+
+    def cifrar(self, texto): # La contraseña cifrada con el algoritmo y el costo actuales
+        return self._ejecutar(cifrar, texto, self.algoritmo, self.costo)
+
+    def verificar(self, texto, cifrada):
+        return self._ejecutar(verificar, texto, cifrada)
+
+    def necesita_cifrarse(self, cifrada): # True si la contraseña guardada no usa el algoritmo y el costo actuales (o está en texto plano)
+        return parametros(cifrada) != (self.algoritmo, self.costo)
+
+    def cerrar(self): # Termina los procesos del pool, se vuelven a crear si se cifra otra contraseña
+        with self._candado:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Instancia del cifrado de contraseñas
+contrasenas = Contrasenas()
@@ -0,0 +1,225 @@
+# Instrumentación de las requests: tiempo en la db, número de consultas, tiempo de serialización y de json, y tamaño de la respuesta
+# Cada request agrega una cabecera Server-Timing y los histogramas por endpoint se exponen en /metrics en formato de Prometheus
+
+# Se importan time y threading para medir y proteger los histogramas entre hilos
+import time
+import threading
+
+# Se importa logging para registrar las consultas lentas
+import logging
+
+# Se importa ContextVar, la medición de cada request vive en el contexto del hilo o de la tarea asíncrona que la atiende
+from contextvars import ContextVar
+
+# Se importa contextmanager para medir las fases con un bloque with
+from contextlib import contextmanager
+
+# Se importa bisect para encontrar el bucket de cada observación
+from bisect import bisect_left
+
+# Se importa request de flask
+from flask import request
+
+# Se importa event de sqlalchemy para medir cada consulta
+from sqlalchemy import event
+
+# Se importa la base de datos
+from .models import db
+
+# Logger de las consultas lentas
+logger = logging.getLogger(__name__)
+
+# Límites de los buckets de cada histograma
+BUCKETS_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Medición de la request en curso, None fuera de una request
+_medicion = ContextVar('medicion', default=None)
+
+
+class Medicion: # Lo que se acumula durante una request
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.db = 0.0 # Segundos dentro del cursor de la db
+        self.consultas = 0
+        self.fases = {} # Segundos de cada fase medida con Metricas.fase(), sin contar el tiempo de db que ocurre dentro
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, limites):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = limites
+        self.series = {} # etiquetas -> [conteos por bucket (el último es +Inf), suma, cuenta]
+
+    def observar(self, etiquetas, valor): # Se llama con el candado de Metricas tomado
+        serie = self.series.get(etiquetas)
+        if serie is None:
+            serie = self.series[etiquetas] = [[0] * (len(self.limites) + 1), 0.0, 0]
+        serie[0][bisect_left(self.limites, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exponer(self, nombres_etiquetas): # Líneas en formato de texto de Prometheus, los buckets son acumulados
+        lineas = ['# HELP {} {}'.format(self.nombre, self.ayuda), '# TYPE {} histogram'.format(self.nombre)]
+        for etiquetas, (conteos, suma, cuenta) in sorted(self.series.items()):
+            base = ','.join('{}="{}"'.format(nombre, _escapar(valor)) for nombre, valor in zip(nombres_etiquetas, etiquetas))
+            acumulado = 0
+            for limite, conteo in zip(self.limites + ('+Inf',), conteos):
+                acumulado += conteo
+                lineas.append('{}_bucket{{{},le="{}"}} {}'.format(self.nombre, base, limite, acumulado))
+            lineas.append('{}_sum{{{}}} {}'.format(self.nombre, base, repr(suma)))
+            lineas.append('{}_count{{{}}} {}'.format(self.nombre, base, cuenta))
+        return lineas
+
+
+def _escapar(valor): # Escapa un valor de etiqueta de Prometheus
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+### Extensión de la app
+
+# Se usa igual que db y cache: se instancia una vez y se registra con init_app(app)
+class Metricas:
+    ETIQUETAS = ('endpoint', 'metodo')
+
+    def __init__(self):
+        self.activas = False
+        self.consulta_lenta = None # Segundos, las consultas más lentas se registran con su plan
+        self._candado = threading.Lock()
+        self.requests = {} # (endpoint, metodo, codigo) -> cuenta
+        self.histogramas = {
+            'total': Histograma('musica_request_segundos', 'Duracion de la request', BUCKETS_SEGUNDOS),
+            'db': Histograma('musica_db_segundos', 'Tiempo en la db por request', BUCKETS_SEGUNDOS),
+            'consultas': Histograma('musica_db_consultas', 'Consultas SQL por request', BUCKETS_CONSULTAS),
+            'serializacion': Histograma('musica_serializacion_segundos', 'Tiempo de serializacion (esquemas) por request, sin la db', BUCKETS_SEGUNDOS),
+            'json': Histograma('musica_json_segundos', 'Tiempo de codificar el json por request', BUCKETS_SEGUNDOS),
+            'bytes': Histograma('musica_respuesta_bytes', 'Tamano de la respuesta', BUCKETS_BYTES),
+        }
+
+    def init_app(self, app):
+        app.config.setdefault('METRICAS', True)
+        app.config.setdefault('METRICAS_CONSULTA_LENTA', None) # Milisegundos, None no registra las consultas lentas
+        self.activas = app.config['METRICAS']
+        lenta = app.config['METRICAS_CONSULTA_LENTA']
+        self.consulta_lenta = lenta / 1000 if lenta is not None else None
+        app.extensions['metricas'] = self
+        if not self.activas:
+            return
+        app.before_request(self.iniciar)
+        app.after_request(self.terminar)
+        with app.app_context():
+            for motor in db.engines.values():
+                self.instrumentar(motor)
+
+    def instrumentar(self, motor): # Registra los eventos de las consultas en un motor (para uno asíncrono se pasa motor.sync_engine)
+        if self.activas and not event.contains(motor, 'before_cursor_execute', _antes_de_ejecutar):
+            event.listen(motor, 'before_cursor_execute', _antes_de_ejecutar)
+            event.listen(motor, 'after_cursor_execute', self._despues_de_ejecutar)
+
+    ### Mediciones
+
+    def iniciar(self): # before_request, empieza la medición de la request
+        _medicion.set(Medicion())
+
+    @contextmanager
+    def fase(self, nombre): # Suma la duración del bloque a la fase, sin el tiempo de db que ocurra dentro (por ejemplo las relaciones del serializador compilado)
+        medicion = _medicion.get()
+        if medicion is None:
+            yield
+            return
+        inicio, db_inicio = time.perf_counter(), medicion.db
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio - (medicion.db - db_inicio)
+            medicion.fases[nombre] = medicion.fases.get(nombre, 0.0) + duracion
+
+    def medido(self, nombre, funcion): # Envuelve una función para que su duración cuente en la fase
+        def envoltura(*args, **kwargs):
+            with self.fase(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+
+    def _despues_de_ejecutar(self, conexion, cursor, sentencia, parametros, contexto, executemany):
+        inicio = getattr(contexto, 'metricas_inicio', None)
+        if inicio is None: # La consulta empezó antes de registrar los eventos
+            return
+        duracion = time.perf_counter() - inicio
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion.db += duracion
+            medicion.consultas += 1
+        if self.consulta_lenta is not None and duracion >= self.consulta_lenta:
+            logger.warning('Consulta lenta (%.1f ms): %s %r\nPlan: %s', duracion * 1000, sentencia, parametros,
+                           _plan(conexion, sentencia, parametros, executemany))
+
+    def terminar(self, respuesta): # after_request, registra la request en los histogramas y agrega Server-Timing
+        medicion = _medicion.get()
+        if medicion is None:
+            return respuesta
+        etiquetas = (request.url_rule.rule if request.url_rule else 'sin_ruta', request.method)
+        codigo = respuesta.status_code
+        if respuesta.is_streamed: # El cuerpo se genera después (y se sigue midiendo), la request se registra cuando el servidor termina de mandarlo
+            def al_cerrar():
+                _medicion.set(None)
+                self._registrar(medicion, etiquetas, codigo, None)
+            respuesta.call_on_close(al_cerrar)
+            return respuesta
+        _medicion.set(None)
+        self._registrar(medicion, etiquetas, codigo, respuesta.content_length)
+        respuesta.headers['Server-Timing'] = self._server_timing(medicion)
+        return respuesta
+
+    def _registrar(self, medicion, etiquetas, codigo, tamano):
+        total = time.perf_counter() - medicion.inicio
+        with self._candado:
+            clave = etiquetas + (str(codigo),)
+            self.requests[clave] = self.requests.get(clave, 0) + 1
+            self.histogramas['total'].observar(etiquetas, total)
+            self.histogramas['db'].observar(etiquetas, medicion.db)
+            self.histogramas['consultas'].observar(etiquetas, medicion.consultas)
+            self.histogramas['serializacion'].observar(etiquetas, medicion.fases.get('serializacion', 0.0))
+            self.histogramas['json'].observar(etiquetas, medicion.fases.get('json', 0.0))
+            if tamano is not None:
+                self.histogramas['bytes'].observar(etiquetas, tamano)
+
+    def _server_timing(self, medicion): # db;dur=1.20;desc="3 consultas", serializacion;dur=0.40, json;dur=0.10, total;dur=2.50 (milisegundos)
+        partes = ['db;dur={:.2f};desc="{} consultas"'.format(medicion.db * 1000, medicion.consultas)]
+        partes += ['{};dur={:.2f}'.format(nombre, duracion * 1000) for nombre, duracion in sorted(medicion.fases.items())]
+        partes.append('total;dur={:.2f}'.format((time.perf_counter() - medicion.inicio) * 1000))
+        return ', '.join(partes)
+
+    def exponer(self): # Todas las métricas en formato de texto de Prometheus
+        with self._candado:
+            lineas = ['# HELP musica_requests_total Requests atendidas', '# TYPE musica_requests_total counter']
+            for (endpoint, metodo, codigo), cuenta in sorted(self.requests.items()):
+                lineas.append('musica_requests_total{{endpoint="{}",metodo="{}",codigo="{}"}} {}'.format(_escapar(endpoint), metodo, codigo, cuenta))
+            for histograma in self.histogramas.values():
+                lineas += histograma.exponer(self.ETIQUETAS)
+        return '\n'.join(lineas) + '\n'
+
+
+# El inicio se guarda en el contexto de ejecución de la sentencia y no en la conexión: si la sentencia falla no hay
+# after_cursor_execute, y el contexto se descarta con ella en lugar de dejar un inicio huérfano en una conexión del pool
+def _antes_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    if contexto is not None:
+        contexto.metricas_inicio = time.perf_counter()
+
+
+def _plan(conexion, sentencia, parametros, executemany): # EXPLAIN QUERY PLAN de la consulta, con un cursor aparte para no disparar los eventos otra vez
+    if conexion.dialect.name != 'sqlite' or executemany or not sentencia.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+        return 'no disponible'
+    cursor = conexion.connection.cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sentencia, parametros)
+        return '; '.join(str(fila[-1]) for fila in cursor.fetchall())
+    except Exception as error: # El plan es solo informativo, nunca debe romper la request
+        return 'no disponible ({})'.format(error)
+    finally:
+        cursor.close()
+
+
+# Instancia de las métricas
+metricas = Metricas()
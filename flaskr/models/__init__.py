@@ -1,2 +1,13 @@
 # Para importar todos los modelos en el modulo
-from .models import *
\ No newline at end of file
+from .models import *
+# Para importar la configuración de las conexiones SQLite
+from .sqlite import configurar_sqlite, sentencias_pragmas, ejecutar_pragmas
+
+# Para importar la búsqueda de texto completo, al importarla se registra la creación de los índices FTS5 en db.create_all()
+from .busqueda import buscar
+
+# Para importar los totales precalculados de los albumes, al importarlos se registra la creación de sus triggers en db.create_all()
+from .agregados import crear_agregados
+
+# Para importar el borrado con sentencias sobre conjuntos y el borrado diferido
+from .eliminados import ocultar_eliminados, diferido, visibles, relacionados_visibles, sentencias_borrado, purgar
@@ -0,0 +1,49 @@
+# Totales precalculados de cada album (número de canciones y duración total), mantenidos por triggers de SQLite
+
+# Se importan event y text de sqlalchemy
+from sqlalchemy import event, text
+
+# Se importa la base de datos
+from .models import db
+
+# Duración en segundos de una canción, 0 si no existe o no tiene minutos/segundos
+DURACION = "coalesce((SELECT coalesce(minutos, 0) * 60 + coalesce(segundos, 0) FROM cancion WHERE id = {}), 0)"
+
+# Los triggers actualizan solo los albumes afectados sumando o restando la diferencia, nunca recorren todas las canciones
+TRIGGERS = {
+    # Una canción entra a un album
+    'album_cancion_ai': "CREATE TRIGGER IF NOT EXISTS album_cancion_ai AFTER INSERT ON album_cancion BEGIN "
+                        "UPDATE album SET num_canciones = num_canciones + 1, duracion_total = duracion_total + " + DURACION.format('new.cancion_id') + " "
+                        "WHERE id = new.album_id; END",
+    # Una canción sale de un album
+    'album_cancion_ad': "CREATE TRIGGER IF NOT EXISTS album_cancion_ad AFTER DELETE ON album_cancion BEGIN "
+                        "UPDATE album SET num_canciones = num_canciones - 1, duracion_total = duracion_total - " + DURACION.format('old.cancion_id') + " "
+                        "WHERE id = old.album_id; END",
+    # Cambia la duración de una canción, se corrige en todos sus albumes
+    'cancion_duracion_au': "CREATE TRIGGER IF NOT EXISTS cancion_duracion_au AFTER UPDATE OF minutos, segundos ON cancion BEGIN "
+                           "UPDATE album SET duracion_total = duracion_total "
+                           "+ (coalesce(new.minutos, 0) * 60 + coalesce(new.segundos, 0)) - (coalesce(old.minutos, 0) * 60 + coalesce(old.segundos, 0)) "
+                           "WHERE id IN (SELECT album_id FROM album_cancion WHERE cancion_id = new.id); END",
+    # Se borra una canción que todavía está en albumes (por ejemplo si album_cancion se borra en cascada después de la canción):
+    # se resta su duración antes de que desaparezca, album_cancion_ad ya no la va a encontrar y solo resta la cuenta
+    'cancion_duracion_bd': "CREATE TRIGGER IF NOT EXISTS cancion_duracion_bd BEFORE DELETE ON cancion BEGIN "
+                           "UPDATE album SET duracion_total = duracion_total - (coalesce(old.minutos, 0) * 60 + coalesce(old.segundos, 0)) "
+                           "WHERE id IN (SELECT album_id FROM album_cancion WHERE cancion_id = old.id); END",
+}
+
+# Recalcula los totales de todos los albumes, solo se usa la primera vez que se crean los triggers
+RECALCULAR = "UPDATE album SET " \
+             "num_canciones = (SELECT count(*) FROM album_cancion WHERE album_id = album.id), " \
+             "duracion_total = (SELECT coalesce(sum(coalesce(cancion.minutos, 0) * 60 + coalesce(cancion.segundos, 0)), 0) " \
+             "FROM album_cancion JOIN cancion ON cancion.id = album_cancion.cancion_id WHERE album_cancion.album_id = album.id)"
+
+
+@event.listens_for(db.metadata, 'after_create')
+def crear_agregados(metadata, conexion, **kwargs): # Se ejecuta después de db.create_all(), crea los triggers que falten
+    if conexion.dialect.name != 'sqlite':
+        return
+    existe = conexion.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'album_cancion_ai'")).first()
+    for sentencia in TRIGGERS.values():
+        conexion.exec_driver_sql(sentencia)
+    if not existe: # Los albumes que ya existían se calculan una vez, de ahí en adelante los mantienen los triggers
+        conexion.exec_driver_sql(RECALCULAR)
@@ -0,0 +1,63 @@
+# Búsqueda de texto completo sobre canciones y albumes con tablas virtuales FTS5 de SQLite
+
+# Se importa re para separar el texto de búsqueda en palabras
+import re
+
+# Se importan event y las construcciones de sqlalchemy para tablas que no son modelos
+from sqlalchemy import event, table, column, literal_column, text
+
+# Se importa la base de datos
+from .models import db
+
+# Índices FTS5 de "contenido externo": no guardan una copia del texto, lo leen de la tabla original por el id
+# Los triggers los mantienen sincronizados en cada INSERT, UPDATE y DELETE, también los de la importación masiva
+INDICES = {
+    'cancion_fts': {'tabla': 'cancion', 'columnas': ('titulo', 'interprete')},
+    'album_fts': {'tabla': 'album', 'columnas': ('titulo', 'descripcion')},
+}
+
+
+def _sentencias(nombre, tabla, columnas): # DDL de la tabla virtual y sus triggers
+    lista = ', '.join(columnas)
+    nuevos = ', '.join('new.' + columna for columna in columnas)
+    viejos = ', '.join('old.' + columna for columna in columnas)
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {n} USING fts5({c}, content='{t}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')".format(n=nombre, c=lista, t=tabla),
+        "CREATE TRIGGER IF NOT EXISTS {n}_ai AFTER INSERT ON {t} BEGIN "
+        "INSERT INTO {n}(rowid, {c}) VALUES (new.id, {nv}); END".format(n=nombre, t=tabla, c=lista, nv=nuevos),
+        "CREATE TRIGGER IF NOT EXISTS {n}_ad AFTER DELETE ON {t} BEGIN "
+        "INSERT INTO {n}({n}, rowid, {c}) VALUES ('delete', old.id, {vv}); END".format(n=nombre, t=tabla, c=lista, vv=viejos),
+        "CREATE TRIGGER IF NOT EXISTS {n}_au AFTER UPDATE OF {c} ON {t} BEGIN " # Solo cuando cambian las columnas indexadas
+        "INSERT INTO {n}({n}, rowid, {c}) VALUES ('delete', old.id, {vv}); "
+        "INSERT INTO {n}(rowid, {c}) VALUES (new.id, {nv}); END".format(n=nombre, t=tabla, c=lista, vv=viejos, nv=nuevos),
+    ]
+
+
+@event.listens_for(db.metadata, 'after_create')
+def crear_busqueda(metadata, conexion, **kwargs): # Se ejecuta después de db.create_all(), crea los índices que falten e indexa las filas que ya existían
+    if conexion.dialect.name != 'sqlite':
+        return
+    for nombre, definicion in INDICES.items():
+        existe = conexion.execute(text("SELECT 1 FROM sqlite_master WHERE name = :nombre"), {'nombre': nombre}).first()
+        for sentencia in _sentencias(nombre, definicion['tabla'], definicion['columnas']):
+            conexion.exec_driver_sql(sentencia)
+        if not existe:
+            conexion.exec_driver_sql("INSERT INTO {n}({n}) VALUES ('rebuild')".format(n=nombre))
+
+
+def _expresion(texto): # Convierte el texto del usuario en una consulta FTS5 segura: cada palabra entre comillas y como prefijo
+    palabras = re.findall(r'\w+', texto)
+    return ' '.join('"{}"*'.format(palabra) for palabra in palabras)
+
+
+def buscar(modelo, texto, limite): # SELECT de los objetos de modelo que coinciden con el texto, ordenados por relevancia (bm25)
+    expresion = _expresion(texto)
+    if not expresion:
+        return None
+    nombre = modelo.__tablename__ + '_fts'
+    indice = table(nombre, column('rowid'), column('rank'))
+    return db.select(modelo) \
+        .join(indice, indice.c.rowid == modelo.id) \
+        .where(literal_column(nombre).op('MATCH')(expresion)) \
+        .order_by(indice.c.rank) \
+        .limit(limite)
@@ -0,0 +1,76 @@
+# Borrado de usuarios, albumes y canciones con sentencias sobre conjuntos de filas
+# Por defecto un DELETE ... WHERE id = ? y la db borra en cascada (ON DELETE CASCADE) los albumes del usuario y las filas de album_cancion
+# Con BORRADO_DIFERIDO la fila solo se marca como eliminada, deja de aparecer en las consultas y purgar() la borra después por lotes
+
+# Se importan current_app y has_app_context para leer BORRADO_DIFERIDO de la app actual
+from flask import current_app, has_app_context
+
+# Se importan event, la sesión y with_loader_criteria de sqlalchemy para ocultar las filas marcadas en todas las consultas del ORM
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+# Se importan la base de datos, la tabla intermediaria y los modelos
+from .models import db, album_cancion, Eliminable, Usuario, Album, Cancion
+
+
+def diferido(): # True si la app actual borra de forma diferida
+    return has_app_context() and current_app.config.get('BORRADO_DIFERIDO', False)
+
+
+def ocultar_eliminados(): # Registra el filtro de las filas marcadas en todas las sesiones, lo llama init_app de la purga si la app usa BORRADO_DIFERIDO
+    # Sin borrado diferido no se registra: cualquier listener de do_orm_execute hace más lenta cada consulta del ORM
+    if not event.contains(Session, 'do_orm_execute', _ocultar_eliminados):
+        event.listen(Session, 'do_orm_execute', _ocultar_eliminados)
+
+
+def _ocultar_eliminados(estado): # Los SELECT del ORM (listas, GET, búsqueda y las relaciones que cargan) omiten las filas marcadas
+    if estado.is_relationship_load:
+        # Con un listener sqlalchemy pasa dos veces por las opciones de la carga de relaciones y en la segunda hereda el yield_per
+        # de la consulta principal (el streaming de las listas), que no se puede usar en la carga por lotes de selectinload
+        if 'yield_per' in estado.local_execution_options:
+            estado.local_execution_options = {clave: valor for clave, valor in estado.local_execution_options.items() if clave != 'yield_per'}
+        return
+    # La condición se propaga a las cargas de relaciones de los objetos que trae la consulta, también en las AsyncSession
+    if estado.is_select and not estado.is_column_load and diferido():
+        estado.statement = estado.statement.options(with_loader_criteria(Eliminable, lambda cls: cls.eliminado == db.false(), include_aliases=True))
+
+
+def _marcadas(tabla): # eliminado = 1 literal (no un parámetro), SQLite solo usa el índice parcial si la condición es la misma del índice
+    return tabla.c.eliminado == db.true()
+
+
+def visibles(tabla): # Condiciones para un SELECT de core sobre la tabla de un modelo (el ORM no las agrega): solo las filas sin marcar
+    return [tabla.c.eliminado == db.false()] if diferido() else []
+
+
+def relacionados_visibles(columna, modelo): # Condiciones para una columna con ids de modelo (por ejemplo album_cancion.album_id): que no estén marcados
+    if not diferido():
+        return []
+    tabla = modelo.__table__
+    return [columna.not_in(db.select(tabla.c.id).where(_marcadas(tabla)))] # Recorre el índice parcial, que solo tiene las filas marcadas
+
+
+def sentencias_borrado(modelo, id): # Sentencias que borran la fila id de modelo, si la primera no afecta ninguna fila es que no existía
+    if not diferido():
+        return [db.delete(modelo).where(modelo.id == id).execution_options(synchronize_session=False)]
+    sentencias = [db.update(modelo).where(modelo.id == id, modelo.eliminado == db.false()).values(eliminado=True).execution_options(synchronize_session=False)]
+    if modelo is Cancion: # La canción sale de sus albumes de inmediato (son pocas filas), así los totales de los albumes quedan al día
+        sentencias.append(db.delete(album_cancion).where(album_cancion.c.cancion_id == id))
+    elif modelo is Usuario: # Sus albumes se ocultan con él, sus filas de album_cancion se borran en la purga
+        sentencias.append(db.update(Album).where(Album.usuario_id == id).values(eliminado=True).execution_options(synchronize_session=False))
+    return sentencias
+
+
+def purgar(lote=500): # Borra las filas marcadas en lotes, cada lote en su propia transacción para no retener el candado de escritura; regresa {tabla: filas borradas}
+    borradas = {}
+    for modelo in (Cancion, Album, Usuario): # Los albumes antes que los usuarios, así borrar un usuario ya no arrastra miles de albumes en una sola sentencia
+        tabla = modelo.__table__
+        borradas[tabla.name] = 0
+        while True:
+            marcadas = db.select(tabla.c.id).where(_marcadas(tabla)).limit(lote)
+            cantidad = db.session.execute(db.delete(tabla).where(tabla.c.id.in_(marcadas))).rowcount
+            db.session.commit()
+            borradas[tabla.name] += cantidad
+            if cantidad < lote:
+                break
+    return borradas
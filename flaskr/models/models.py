@@ -1,17 +1,37 @@
 # Se importa el módulo que se va a usar para crear los modelos
 from flask_sqlalchemy import SQLAlchemy
 
+# Se importa la sesión de flask_sqlalchemy para enrutar las lecturas a la db de solo lectura
+from flask_sqlalchemy.session import Session
+
+# Se importan request y has_request_context para saber si la consulta viene de un GET
+from flask import request, has_request_context
+
 # Se importa enum para la enumeración
 import enum
 
 # Se importa la libreria para crear las clases autoschema, que heredan de sqlaclhemy
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 
+# Se importa declared_attr para que las clases hereden la configuración de la columna de versión
+from sqlalchemy.orm import declared_attr
+
 # Se importa fields de marshmallow para serializar las enumeraciones
 from marshmallow import fields
 
+# Se importa el cifrado de contraseñas, que corre en un pool de procesos
+from ..contrasenas import contrasenas
+
+# Sesión que manda las consultas de los GET al bind 'lectura' (si está configurado), las escrituras siempre van a la db principal
+class SesionEnrutada(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and 'lectura' in self._db.engines \
+                and has_request_context() and request.method in ('GET', 'HEAD'):
+            return self._db.engines['lectura']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Instancia de la base de datos
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})
 
 ### Se declaran las clases
 
@@ -19,23 +39,63 @@ db = SQLAlchemy()
 # Esto se hace porque la relación de Album con Cancion es muchos a muchos
 album_cancion = db.Table(
     "album_cancion", # Lo que relaciona la tabla
-    db.Column('album_id', db.Integer, db.ForeignKey('album.id'), primary_key=True), # Apunta al id de los albumes, que son un entero, como llave foranea y llave primaria
-    db.Column('cancion_id', db.Integer, db.ForeignKey('cancion.id'), primary_key=True) # Apunta al id de las canciones, que son un entero, como llave foranea y llave primaria
+    # ON DELETE CASCADE: al borrar un album o una canción la db borra sus filas de album_cancion en la misma sentencia
+    db.Column('album_id', db.Integer, db.ForeignKey('album.id', ondelete='CASCADE'), primary_key=True), # Apunta al id de los albumes, que son un entero, como llave foranea y llave primaria
+    db.Column('cancion_id', db.Integer, db.ForeignKey('cancion.id', ondelete='CASCADE'), primary_key=True), # Apunta al id de las canciones, que son un entero, como llave foranea y llave primaria
+    db.Index('ix_album_cancion_cancion', 'cancion_id') # La llave primaria empieza por album_id, este índice sirve para buscar los albumes de una canción
 )
 
+# Las clases que se pueden borrar de forma diferida (BORRADO_DIFERIDO) heredan la marca de eliminado
+# Una fila marcada ya no aparece en ninguna consulta (ver eliminados.py) y la purga la borra después
+class Eliminable:
+    eliminado = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+
+
+# Las clases que se editan con PUT o PATCH llevan un número de versión que aumenta con cada UPDATE
+# El ETag de cada recurso empieza con su versión, con If-Match el UPDATE solo se aplica si nadie lo cambió antes (ver consultas.actualizar)
+class Versionada:
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    @declared_attr.directive
+    def __mapper_args__(cls): # Cuando el ORM guarda cambios de un objeto también revisa e incrementa la versión, y falla si otro la cambió
+        return {'version_id_col': cls.__table__.c.version}
+
+
+def _indice_eliminados(tabla): # Índice parcial con solo las filas marcadas, la purga y los filtros de las relaciones lo recorren sin leer la tabla
+    return db.Index('ix_{}_eliminado'.format(tabla), 'id', sqlite_where=db.text('eliminado = 1'))
+
+
 # Para implementar la clase Usuario, las clases heredan de un modelo SQLAlchemy, de db.Model
-class Usuario(db.Model):
+class Usuario(Versionada, Eliminable, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nombre_usuario = db.Column(db.String(128)) # Máximo 128 caracteres para el nombre del usuario
-    contrasena = db.Column(db.String(128)) # Máximo 128 caracteres para la contraseña del usuario
+    contrasena = db.Column(db.String(128)) # Máximo 128 caracteres para la contraseña del usuario, se guarda cifrada ('scrypt$16384$8$1$sal$hash')
+
+    __table_args__ = (
+        db.Index('ix_usuario_nombre', 'nombre_usuario'), # Para buscar al usuario por su nombre al iniciar sesión
+        _indice_eliminados('usuario'),
+    )
 
     # Para la relación de composición de Usuario y Album, de uno a muchos. 
     albums = db.relationship(
         'Album', # La relación es con la clase Album
         back_populates='usuario', # Asegura la relación con el atributo usuario de la clase Album, esto NO estuvo en la guía
-        cascade='all, delete, delete-orphan' # Elimina a los albumes si se elimina el usuario porque la relaciónn es composición
+        order_by='Album.id', # Los albumes siempre se serializan en el mismo orden
+        cascade='all, delete-orphan', # Elimina a los albumes si se elimina el usuario porque la relaciónn es composición
+        passive_deletes=True # Los borra la db con ON DELETE CASCADE, el ORM no carga los albumes para borrarlos uno por uno
     )
 
+    # El cifrado y la verificación corren en el pool de contrasenas, el hilo de la request solo espera el resultado
+    def cifrar_contrasena(self, texto): # Guarda la contraseña cifrada con el algoritmo y el costo actuales
+        self.contrasena = contrasenas.cifrar(texto)
+
+    def verificar_contrasena(self, texto): # True si texto es la contraseña del usuario
+        if not contrasenas.verificar(texto, self.contrasena):
+            return False
+        if contrasenas.necesita_cifrarse(self.contrasena): # Cambió el algoritmo o el costo, o estaba en texto plano: se cifra con los actuales
+            self.cifrar_contrasena(texto)
+        return True
+
     def save(): # Implementación suplementaria de save()
         check_safe = True
         return check_safe
@@ -45,7 +105,7 @@ class Usuario(db.Model):
         return check_delete
 
 # La clase canción hereda de un modelo de SQLAlchemy, de db.Model
-class Cancion(db.Model):
+class Cancion(Versionada, Eliminable, db.Model):
     # Para los atributos de la clase Cancion se toma en cuenta el diagrama de clases de la wiki del repositorio
     # Para cada atributo se asigna el tipo de variable que le corresponde
     # El atributo id es la llave primaria de la clase Cancion
@@ -55,11 +115,19 @@ class Cancion(db.Model):
     segundos = db.Column(db.Integer)
     interprete = db.Column(db.String(128)) # Magnitud máxima de 128
 
+    __table_args__ = (
+        db.Index('ix_cancion_interprete_titulo', 'interprete', 'titulo'), # Para filtrar por interprete, y por interprete y prefijo del titulo
+        db.Index('ix_cancion_titulo', 'titulo'), # Para filtrar por prefijo del titulo
+        _indice_eliminados('cancion'),
+    )
+
     # Para la relación muchos a muchos de Cancion con Album
     albums = db.relationship(
         'Album', # La relación es con la clase Album
         secondary=album_cancion, # Usa la tabla intermediaria para la relación
-        back_populates='canciones' # Asegura la relación con el atributo canciones de la clase Album
+        back_populates='canciones', # Asegura la relación con el atributo canciones de la clase Album
+        order_by='Album.id', # Los albumes siempre se serializan en el mismo orden
+        passive_deletes=True # Las filas de album_cancion las borra la db, el ORM no carga la colección para borrarlas
         ) 
 
     # Para la prueba se usa y redefine __repr__() para ver los atributos de la clase en la aplicación. 
@@ -69,6 +137,12 @@ class Cancion(db.Model):
         # Se espera recibir los atributos de la clase, para comprobar que todo esté funcionando bien
         return "{}-{}-{}-{}".format(self.titulo, self.minutos, self.segundos, self.interprete)
     
+# Duración en segundos, el 60 va como literal: con un parámetro ('minutos * ? + segundos') SQLite no reconoce la expresión del índice
+DURACION_CANCION = Cancion.minutos * db.literal_column('60') + Cancion.segundos
+
+# Índice de expresión para filtrar por duración en segundos, las consultas tienen que usar DURACION_CANCION para que SQLite lo use
+db.Index('ix_cancion_duracion', DURACION_CANCION)
+
 # Para implementar la clase de enumeración Medio
 class Medio(enum.Enum):
     DISCO = 1
@@ -76,7 +150,7 @@ class Medio(enum.Enum):
     CD = 3
 
 # Para implementar la clase Album, hereda de un modelo SQLAlchemy, de db.Model
-class Album(db.Model):
+class Album(Versionada, Eliminable, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(256)) # Máximo 256 caracteres para el nombre del album
     anio = db.Column(db.Integer)
@@ -84,9 +158,19 @@ class Album(db.Model):
     medio = db.Column(db.Enum(Medio)) # Se define la enumeración del medio con la clase Medio
 
     # Para la relación uno a muchos de composición de Usuario y Album, 
-    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id')) # Puntero de la relación entre Album con usuario, esto establece y permite en si la relación, ESTO ES OBLIGATORIO PARA LA RELACION
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE')) # Puntero de la relación entre Album con usuario, esto establece y permite en si la relación, ESTO ES OBLIGATORIO PARA LA RELACION
+
+    # Totales de las canciones del album, los mantienen los triggers de agregados.py cada vez que cambia album_cancion o la duración de una canción
+    num_canciones = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    duracion_total = db.Column(db.Integer, nullable=False, default=0, server_default='0') # En segundos
     
-    __table_args__ = (db.UniqueConstraint('usuario_id', 'titulo', name='titulo_unico_album'),) # Pone la restricción al usuario de que no pueda tener más de un album con el mismo titulo, se llama a la columna de la relacion, usuario_id, no al usuario.id como tal ni al objeto usuario
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'titulo', name='titulo_unico_album'), # También sirve como índice para filtrar por usuario_id
+        db.Index('ix_album_anio', 'anio'), # Para filtrar por rango de años
+        db.Index('ix_album_medio_anio', 'medio', 'anio'), # Para filtrar por medio, y por medio y rango de años
+        db.Index('ix_album_titulo', 'titulo'), # Para filtrar por prefijo del titulo
+        _indice_eliminados('album'),
+    ) # Pone la restricción al usuario de que no pueda tener más de un album con el mismo titulo, se llama a la columna de la relacion, usuario_id, no al usuario.id como tal ni al objeto usuario
     
     usuario = db.relationship( # Hace la relación a nivel de objetos, permite acceder al usuario del album, ES OPCIONAL
         'Usuario',  # La relación es con la clase Usuario
@@ -97,7 +181,9 @@ class Album(db.Model):
     canciones = db.relationship(
         'Cancion', # La relación es con la clase Cancion
         secondary=album_cancion, # Usa la tabla intermediaria para la relación
-        back_populates='albums' # Asegura la relación con el atributo albums de Cancion y permite aceder a la cancion del album, sin mas queries
+        back_populates='albums', # Asegura la relación con el atributo albums de Cancion y permite aceder a la cancion del album, sin mas queries
+        order_by='Cancion.id', # Las canciones siempre se serializan en el mismo orden
+        passive_deletes=True # Las filas de album_cancion las borra la db, el ORM no carga la colección para borrarlas
     )
 
     def save(): # Implementación suplementaria de save()
@@ -142,6 +228,8 @@ class AlbumSchema(SQLAlchemyAutoSchema): # Hereda de SQLAlchemyAutoSchema
         model = Album # El modelo que se está serializando
         include_relationships = True # Incluye todas las relaciones de la clase
         load_instance = True # Se carga la instancia de la clase cuando se accede al esquema (autoschema)
+        dump_only = ('num_canciones', 'duracion_total', 'version') # Los totales se calculan en la db y la versión la incrementa cada UPDATE, no se reciben
+        exclude = ('eliminado',) # La marca del borrado diferido es interna, nunca se muestra ni se recibe
 
 ### Para la serialización de las otras clases
 
@@ -151,10 +239,15 @@ class UsuarioSchema(SQLAlchemyAutoSchema):
         model = Usuario
         include_relationships = True
         load_instance = True
+        load_only = ('contrasena',) # La contraseña cifrada nunca sale en las respuestas, el serializador compilado tampoco la consulta
+        dump_only = ('version',)
+        exclude = ('eliminado',)
 
 # Serialización de Cancion
 class CancionSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = Cancion
         include_relationships = True
-        load_instance = True
\ No newline at end of file
+        load_instance = True
+        dump_only = ('version',)
+        exclude = ('eliminado',)
\ No newline at end of file
@@ -0,0 +1,38 @@
+# Configuración de las conexiones SQLite según el perfil de la app
+
+# Se importa event de sqlalchemy para ejecutar los PRAGMA en cada conexión nueva
+from sqlalchemy import event
+
+# Se importa la instancia de la base de datos
+from .models import db
+
+# PRAGMAs que no aplican a una conexión de solo lectura, ahí solo se usan los de lectura
+PRAGMAS_ESCRITURA = ('journal_mode', 'synchronous')
+
+
+def configurar_sqlite(app): # Registra los PRAGMA de SQLITE_PRAGMAS en todos los motores SQLite de la app, se llama después de db.init_app(app)
+    pragmas = app.config.get('SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with app.app_context():
+        for clave, motor in db.engines.items():
+            if motor.dialect.name != 'sqlite':
+                continue
+            event.listen(motor, 'connect', ejecutar_pragmas(sentencias_pragmas(pragmas, clave)))
+
+
+def sentencias_pragmas(pragmas, clave=None): # Sentencias PRAGMA del motor clave (None es la db principal)
+    if clave == 'lectura': # La db de solo lectura no puede cambiar el journal y además se marca como query_only
+        sentencias = ['PRAGMA {}={}'.format(nombre, valor) for nombre, valor in pragmas.items() if nombre not in PRAGMAS_ESCRITURA]
+        sentencias.append('PRAGMA query_only=ON')
+        return sentencias
+    return ['PRAGMA {}={}'.format(nombre, valor) for nombre, valor in pragmas.items()]
+
+
+def ejecutar_pragmas(sentencias): # Listener del evento 'connect', corre una sola vez por conexión física del pool
+    def al_conectar(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        for sentencia in sentencias:
+            cursor.execute(sentencia)
+        cursor.close()
+    return al_conectar
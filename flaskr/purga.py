@@ -0,0 +1,60 @@
+# Purga en segundo plano del borrado diferido (BORRADO_DIFERIDO)
+# Los DELETE solo marcan la fila y responden de inmediato, un hilo de la app borra después las filas marcadas por lotes
+# Si el proceso termina antes de purgar, las filas siguen ocultas y las borra el siguiente borrado o 'flask purgar'
+
+# Se importan threading para el hilo de la purga y logging para registrar sus errores
+import threading
+import logging
+
+# Se importa current_app para saber de qué app son las filas que hay que purgar
+from flask import current_app
+
+# Se importan la base de datos, el filtro de las filas marcadas y la purga por lotes
+from .models import db, ocultar_eliminados, purgar
+
+# Logger de la purga
+logger = logging.getLogger(__name__)
+
+
+# Se usa igual que db, cache y metricas: se instancia una vez y se registra con init_app(app)
+class Purga:
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._pendiente = threading.Event()
+        self._apps = set() # Apps con filas marcadas desde la última purga, en un proceso puede haber varias (por ejemplo en los benchmarks)
+        self._hilo = None
+
+    def init_app(self, app):
+        app.config.setdefault('BORRADO_DIFERIDO', False)
+        app.config.setdefault('PURGA_LOTE', 500)
+        app.extensions['purga'] = self
+        if app.config['BORRADO_DIFERIDO']:
+            ocultar_eliminados() # Desde aquí las consultas del ORM de esta app omiten las filas marcadas
+
+    def programar(self): # Se llama después del commit de un borrado diferido, despierta al hilo de la purga (lo crea la primera vez)
+        with self._candado:
+            self._apps.add(current_app._get_current_object())
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._trabajar, name='purga', daemon=True)
+                self._hilo.start()
+        self._pendiente.set()
+
+    def _trabajar(self):
+        while True:
+            self._pendiente.wait()
+            with self._candado:
+                self._pendiente.clear()
+                apps, self._apps = self._apps, set()
+            for app in apps:
+                with app.app_context():
+                    try:
+                        borradas = purgar(app.config['PURGA_LOTE'])
+                        logger.info('Purga del borrado diferido: %s', borradas)
+                    except Exception: # Las filas siguen marcadas, se reintenta con el siguiente borrado
+                        logger.exception('Falló la purga del borrado diferido')
+                    finally:
+                        db.session.remove()
+
+
+# Instancia de la purga
+purga = Purga()
@@ -0,0 +1,333 @@
+# Funciones auxiliares para construir las consultas de las vistas de listas (canciones, albumes y usuarios)
+
+# Se importan json y csv para los modos de streaming NDJSON y CSV
+import json
+import csv
+
+# Se importa io para escribir cada fila del CSV en memoria antes de mandarla
+import io
+
+# Se importa urlencode para armar el enlace a la siguiente página
+from urllib.parse import urlencode
+
+# Se importan lru_cache para no reconstruir los esquemas de proyección en cada request y partial para ligar la sesión al serializador
+from functools import lru_cache, partial
+
+# Se importan request, Response, stream_with_context, current_app y abort de flask
+from flask import request, Response, stream_with_context, current_app, abort as abort_flask
+
+# Se importa abort de flask_restful para responder errores 400 en formato json
+from flask_restful import abort
+
+# Se importan las estrategias de carga de relaciones y la inspección de modelos de sqlalchemy
+from sqlalchemy import inspect
+from sqlalchemy.orm import selectinload, joinedload
+
+# Se importan la base de datos, los modelos que tienen filtros y el borrado con sentencias sobre conjuntos
+from ..models import db, Cancion, Album, Medio, DURACION_CANCION, diferido, visibles, sentencias_borrado
+
+# Se importa el serializador compilado
+from .serializacion import serializador_compilado
+
+# Se importan las métricas para medir la serialización
+from ..metricas import metricas
+
+# Se importa la purga del borrado diferido
+from ..purga import purga
+
+# Tamaño máximo de página que se permite pedir con ?limit=
+LIMITE_MAXIMO = 1000
+
+# Cantidad de filas que se traen de la db por lote en el modo streaming
+TAMANO_LOTE = 500
+
+# Formatos de streaming y su tipo de contenido
+FORMATOS_STREAMING = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _entero(nombre, minimo=None, maximo=None): # Lee un parámetro entero del query string, si no viene se regresa None
+    valor = request.args.get(nombre)
+    if valor is None:
+        return None
+    try:
+        valor = int(valor)
+    except ValueError:
+        abort(400, message="El parametro '{}' debe ser un entero".format(nombre))
+    if (minimo is not None and valor < minimo) or (maximo is not None and valor > maximo):
+        abort(400, message="El parametro '{}' debe estar entre {} y {}".format(nombre, minimo, maximo))
+    return valor
+
+
+def _campos(modelo, esquema): # Lee ?fields=a,b,c y valida que sean columnas del modelo que el esquema serializa
+    valor = request.args.get('fields')
+    if not valor:
+        return None
+    campos = tuple(campo.strip() for campo in valor.split(',') if campo.strip())
+    columnas = modelo.__table__.columns
+    validos = [nombre for nombre in esquema.dump_fields if nombre in columnas] # Solo se proyectan columnas, las relaciones no
+    invalidos = [campo for campo in campos if campo not in validos]
+    if invalidos:
+        abort(400, message="Campos no validos: {}. Campos permitidos: {}".format(', '.join(invalidos), ', '.join(validos)))
+    return campos
+
+
+def _prefijo(columna, prefijo): # titulo >= 'abc' AND titulo < 'abd', a diferencia de LIKE 'abc%' siempre puede usar el índice de la columna
+    return db.and_(columna >= prefijo, columna < prefijo[:-1] + chr(ord(prefijo[-1]) + 1))
+
+
+def _medio(nombre): # Convierte ?medio=CD en Medio.CD
+    if nombre not in Medio.__members__:
+        abort(400, message="Medio no valido, debe ser uno de: {}".format(', '.join(Medio.__members__)))
+    return Medio[nombre]
+
+
+# Filtros de las listas: parametro -> (tipo del valor, función que arma la condición)
+# Cada uno está respaldado por un índice de la tabla, ver __table_args__ en los modelos
+FILTROS = {
+    Cancion: {
+        'interprete': (str, lambda valor: Cancion.interprete == valor),
+        'titulo_prefijo': (str, lambda valor: _prefijo(Cancion.titulo, valor)),
+        'duracion_min': (int, lambda valor: DURACION_CANCION >= valor), # Segundos, usa ix_cancion_duracion
+        'duracion_max': (int, lambda valor: DURACION_CANCION <= valor),
+    },
+    Album: {
+        'titulo_prefijo': (str, lambda valor: _prefijo(Album.titulo, valor)),
+        'anio_min': (int, lambda valor: Album.anio >= valor),
+        'anio_max': (int, lambda valor: Album.anio <= valor),
+        'medio': (_medio, lambda valor: Album.medio == valor),
+        'usuario_id': (int, lambda valor: Album.usuario_id == valor),
+    },
+}
+
+
+def _filtros(modelo): # Condiciones de los filtros que vienen en el query string
+    condiciones = []
+    for parametro, (tipo, condicion) in FILTROS.get(modelo, {}).items():
+        valor = request.args.get(parametro)
+        if not valor:
+            continue
+        if tipo is int:
+            valor = _entero(parametro)
+        elif tipo is not str:
+            valor = tipo(valor)
+        condiciones.append(condicion(valor))
+    return condiciones
+
+
+@lru_cache(maxsize=None)
+def _esquema_proyeccion(clase_esquema, campos): # Esquema con only=campos, se construye una sola vez por combinación de campos
+    return clase_esquema(only=campos)
+
+
+@lru_cache(maxsize=None)
+def _opciones_carga(modelo, clase_esquema, campos): # Estrategias de carga según las relaciones que el esquema va a serializar
+    opciones = []
+    relaciones = inspect(modelo).relationships
+    for nombre in campos:
+        if nombre not in relaciones:
+            continue
+        relacion = getattr(modelo, nombre)
+        if relaciones[nombre].uselist: # Colecciones (albums, canciones): un solo SELECT ... WHERE id IN (...) para toda la página
+            opciones.append(selectinload(relacion))
+        else: # Muchos a uno (usuario del album): se trae en el mismo SELECT con un JOIN
+            opciones.append(joinedload(relacion))
+    return tuple(opciones)
+
+
+def opciones_carga(modelo, esquema): # Evita el problema N+1: sin esto cada objeto serializado dispara sus propias consultas de relaciones
+    esquema = getattr(esquema, 'instancia', esquema)
+    return _opciones_carga(modelo, type(esquema), tuple(esquema.dump_fields))
+
+
+# Esquema que se construye la primera vez que se usa, así importar las vistas no instancia los esquemas de marshmallow
+class EsquemaPerezoso:
+    def __init__(self, clase_esquema):
+        self.clase_esquema = clase_esquema
+        self._instancia = None
+
+    @property
+    def instancia(self): # El esquema real, se crea una sola vez
+        if self._instancia is None:
+            self._instancia = self.clase_esquema()
+        return self._instancia
+
+    def dump(self, *args, **kwargs): # Se mide como tiempo de serialización
+        with metricas.fase('serializacion'):
+            return self.instancia.dump(*args, **kwargs)
+
+    def __getattr__(self, nombre): # dumps, load, dump_fields, etc. se delegan al esquema real
+        return getattr(self.instancia, nombre)
+
+
+# Todas las funciones que consultan la db reciben la sesión de la request: db.session en el modo WSGI, y en el modo ASGI
+# la sesión síncrona de la AsyncSession, cuyas consultas asgi.py espera en el event loop (ver vistas.Recurso)
+
+def listar(sesion, modelo, esquema): # Regresa la lista de objetos de modelo serializados con esquema, con paginación por cursor, proyección y streaming
+    consulta, volcar, escalares, nombres, limite, formato = consulta_lista(sesion, modelo, esquema)
+    if formato in FORMATOS_STREAMING:
+        return Response(stream_with_context(generar(sesion, consulta, volcar, escalares, nombres, formato)), mimetype=FORMATOS_STREAMING[formato])
+
+    resultado = sesion.execute(consulta)
+    filas = resultado.scalars().all() if escalares else resultado.all()
+    return volcar(filas), 200, cabeceras_pagina(filas, limite)
+
+
+def consulta_lista(sesion, modelo, esquema): # Lee los parámetros de la lista y arma el SELECT, regresa (consulta, volcar, escalares, nombres, limite, formato)
+    esquema = getattr(esquema, 'instancia', esquema) # Si es un EsquemaPerezoso se usa el esquema real
+    limite = _entero('limit', 1, LIMITE_MAXIMO) # Tamaño de página
+    cursor = _entero('cursor', 0) # Último id visto en la página anterior
+    campos = _campos(modelo, esquema) # Columnas pedidas con ?fields=
+    formato = request.args.get('formato', 'json') # 'json' (lista), 'ndjson' (streaming, un objeto por línea) o 'csv' (streaming)
+    if formato != 'json' and formato not in FORMATOS_STREAMING:
+        abort(400, message="El parametro 'formato' debe ser 'json', 'ndjson' o 'csv'")
+    if limite is None and formato == 'json': # La lista JSON se arma completa en memoria, sin ?limit= se regresa una página con Link a la siguiente
+        limite = current_app.config.get('LIMITE_POR_DEFECTO') # El streaming sigue regresando todo, su memoria no crece con la tabla
+
+    consulta, volcar, escalares, nombres = preparar(sesion, modelo, esquema, campos)
+    consulta = consulta.where(*_filtros(modelo)) # ?interprete=, ?titulo_prefijo=, ?anio_min=, etc.
+    consulta = consulta.order_by(modelo.id) # El orden por la llave primaria es lo que hace posible la paginación por cursor (keyset)
+    if cursor is not None:
+        consulta = consulta.where(modelo.id > cursor) # id > ultimo_id usa el indice de la llave primaria, no hay OFFSET
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    return consulta, volcar, escalares, nombres, limite, formato
+
+
+def cabeceras_pagina(filas, limite): # X-Next-Cursor y Link de la siguiente página, solo si la página está llena
+    cabeceras = {}
+    if limite is not None and len(filas) == limite: # Si la página está llena puede haber más resultados
+        siguiente = filas[-1].id
+        cabeceras['X-Next-Cursor'] = str(siguiente)
+        argumentos = request.args.to_dict()
+        argumentos['cursor'] = siguiente
+        cabeceras['Link'] = '<{}?{}>; rel="next"'.format(request.base_url, urlencode(argumentos))
+    return cabeceras
+
+
+def esquema_compilado(modelo, esquema, campos=None): # Regresa (esquema real con la proyección, serializador compilado o None si no aplica)
+    esquema = getattr(esquema, 'instancia', esquema) # Si es un EsquemaPerezoso se usa el esquema real
+    if campos:
+        esquema = _esquema_proyeccion(type(esquema), campos)
+    if not current_app.config.get('SERIALIZACION_COMPILADA'):
+        return esquema, None
+    return esquema, serializador_compilado(modelo, esquema, campos)
+
+
+def preparar(sesion, modelo, esquema, campos=None): # Regresa (SELECT, función filas -> lista de dicts, si las filas son objetos del ORM, nombres de los campos)
+    esquema, compilado = esquema_compilado(modelo, esquema, campos)
+    if compilado is not None: # Filas de core convertidas con una función generada, sin ORM ni marshmallow
+        consulta = db.select(*compilado.columnas).where(*visibles(modelo.__table__)) # Es un SELECT de core, el ORM no le agrega el filtro de las filas marcadas
+        return consulta, metricas.medido('serializacion', partial(compilado.serializar, sesion)), False, list(esquema.dump_fields)
+    volcar = metricas.medido('serializacion', lambda filas: esquema.dump(filas, many=True))
+    if campos: # Con proyección solo se hace SELECT de las columnas pedidas, siempre se incluye el id para el cursor
+        columnas = [modelo.id] + [getattr(modelo, campo) for campo in campos if campo != 'id']
+        return db.select(*columnas), volcar, False, list(esquema.dump_fields)
+    return db.select(modelo).options(*opciones_carga(modelo, esquema)), volcar, True, list(esquema.dump_fields) # Las relaciones se cargan por lotes, no objeto por objeto
+
+
+def obtener(sesion, modelo, esquema, id): # Un objeto serializado por su id, 404 si no existe
+    consulta, volcar, escalares, _ = preparar(sesion, modelo, esquema)
+    resultado = sesion.execute(consulta.where(modelo.id == id))
+    fila = resultado.scalars().first() if escalares else resultado.first()
+    if fila is None:
+        abort_flask(404)
+    return volcar([fila])[0]
+
+
+def sentencia_actualizacion(modelo, id, valores, versiones=None, columnas=None): # UPDATE ... SET columnas, version = version + 1 WHERE id = ? [AND version IN (...)] RETURNING columnas (la versión si no se indican)
+    columnas = columnas or [modelo.version]
+    condiciones = [modelo.id == id, *visibles(modelo.__table__)]
+    if versiones is not None: # If-Match: solo se aplica si la fila sigue en alguna de las versiones que tiene el cliente
+        condiciones.append(modelo.version.in_(versiones))
+    if not valores: # Sin columnas que cambiar no se escribe nada, solo se revisa que exista y su versión
+        return db.select(*columnas).where(*condiciones)
+    return db.update(modelo).where(*condiciones).values(version=modelo.version + 1, **valores) \
+        .returning(*columnas).execution_options(synchronize_session=False)
+
+
+def sentencia_existe(modelo, id): # SELECT del id, para saber si una actualización que no encontró la fila fue un 404 o un 412
+    return db.select(modelo.id).where(modelo.id == id, *visibles(modelo.__table__))
+
+
+def objeto_o_404(sesion, modelo, id): # Igual que get_or_404(), pero en la sesión de la vista
+    objeto = sesion.get(modelo, id)
+    if objeto is None:
+        abort_flask(404)
+    return objeto
+
+
+def existe_o_404(sesion, modelo, id): # Igual que get_or_404() pero sin cargar el objeto, solo revisa que el id exista
+    if sesion.scalar(sentencia_existe(modelo, id)) is None:
+        abort_flask(404)
+
+
+def fallo_actualizacion(existe): # La fila existe pero su versión no es la de If-Match: 412, si no existe: 404
+    if existe:
+        abort(412, message='El recurso cambió desde la versión de If-Match, consúltelo de nuevo')
+    abort_flask(404)
+
+
+def actualizar(sesion, modelo, esquema, id, valores, versiones=None): # Cambia solo las columnas de valores con una sola sentencia y hace commit, regresa el objeto serializado con su nueva versión
+    _, compilado = esquema_compilado(modelo, esquema) # El RETURNING trae la fila completa, con las listas de ids de sus relaciones
+    columnas = compilado.columnas_fila(modelo.__table__) if compilado is not None else None
+    fila = sesion.execute(sentencia_actualizacion(modelo, id, valores, versiones, columnas)).first()
+    if fila is None:
+        sesion.rollback()
+        fallo_actualizacion(versiones is not None and sesion.scalar(sentencia_existe(modelo, id)) is not None)
+    sesion.commit()
+    if compilado is None: # Sin SERIALIZACION_COMPILADA, o si el esquema no se sabe compilar, se consulta de nuevo la fila y se vuelca con marshmallow
+        return obtener(sesion, modelo, esquema, id)
+    with metricas.fase('serializacion'):
+        return compilado.serializar_fila(fila)
+
+
+def borrar(sesion, modelo, id): # Borra la fila id con sentencias sobre conjuntos (lo que depende de ella lo borra la db en cascada) y hace commit, 404 si no existe
+    sentencias = sentencias_borrado(modelo, id)
+    if sesion.execute(sentencias[0]).rowcount == 0:
+        sesion.rollback()
+        abort_flask(404)
+    for sentencia in sentencias[1:]:
+        sesion.execute(sentencia)
+    sesion.commit()
+    if diferido(): # La fila solo quedó marcada, la purga la borra en segundo plano
+        purga.programar()
+
+
+def generar(sesion, consulta, volcar, escalares, nombres, formato): # Generador del modo streaming, la memoria se mantiene constante sin importar el tamaño de la tabla
+    resultado = sesion.execute(consulta.execution_options(yield_per=TAMANO_LOTE)) # Trae las filas de la db en lotes de TAMANO_LOTE
+    lotes = (resultado.scalars() if escalares else resultado).partitions() # Cada lote se serializa junto, con una consulta por relación
+    inicio, codificar = codificador(nombres, formato)
+    if inicio:
+        yield inicio
+    for lote in lotes:
+        yield codificar(volcar(lote))
+
+
+def codificador(nombres, formato): # Regresa (texto inicial, función lista de dicts -> texto) del formato de streaming
+    if formato == 'ndjson':
+        return '', metricas.medido('json', lambda lote: ''.join(json.dumps(datos) + '\n' for datos in lote))
+    # En CSV la primera línea tiene los nombres de los campos, los medios se escriben por nombre y las listas de ids separadas por ';'
+    # que es el mismo formato que aceptan las importaciones masivas
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=nombres)
+    def vaciar(): # Regresa lo escrito en el buffer y lo deja vacío
+        texto = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return texto
+    def codificar(lote):
+        escritor.writerows({clave: _valor_csv(valor) for clave, valor in datos.items()} for datos in lote)
+        return vaciar()
+    escritor.writeheader()
+    return vaciar(), metricas.medido('json', codificar)
+
+
+def _valor_csv(valor): # Convierte un valor serializado a texto plano para el CSV
+    if isinstance(valor, list):
+        return ';'.join(str(elemento) for elemento in valor)
+    if isinstance(valor, dict): # El medio serializado por EnumADict
+        return valor['llave']
+    return valor
@@ -0,0 +1,283 @@
+# Importación y exportación masiva de canciones y albumes (JSON, NDJSON o CSV)
+
+# Se importan json y csv para leer los formatos de entrada
+import json
+import csv
+
+# Se importa codecs para leer el flujo de bytes de la request como texto, sin cargarlo completo en memoria
+import codecs
+
+# Se importa lru_cache para construir los esquemas de validación una sola vez
+from functools import lru_cache
+
+# Se importa ValidationError de marshmallow, es el error que reportan los esquemas
+from marshmallow import Schema, ValidationError
+
+# Se importa IntegrityError para detectar las filas que la db rechaza (por ejemplo un album repetido para el mismo usuario)
+from sqlalchemy.exc import IntegrityError
+
+# Se importa el insert de SQLite, que permite INSERT ... ON CONFLICT DO NOTHING
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+
+# Se importan la base de datos, la tabla intermediaria, los modelos y sus esquemas
+from ..models import db, album_cancion, Cancion, CancionSchema, Album, AlbumSchema, Medio
+
+# Se importa el cache para invalidarlo después de importar
+from ..cache import cache
+
+# Se importan la consulta y el generador de las exportaciones, son los mismos del streaming de las listas
+from .consultas import preparar, generar
+
+# Filas por transacción, cada lote se inserta con un solo executemany y un solo commit
+TAMANO_LOTE = 1000
+
+# Tamaño de los bloques que se leen del flujo JSON
+TAMANO_BLOQUE = 65536
+
+# Tipos de contenido que se aceptan en los endpoints y el formato que les corresponde
+FORMATOS = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'text/csv': 'csv',
+}
+
+# Configuración de cada recurso que se puede importar
+# enlaces: campo de la fila con los ids del otro lado de album_cancion, se reciben como lista (o separados por ';' en CSV)
+RECURSOS = {
+    'canciones': {
+        'modelo': Cancion,
+        'esquema': CancionSchema,
+        'tipo': 'cancion',
+        'obligatorios': ('titulo', 'minutos', 'segundos', 'interprete'), # Los mismos que exige POST /canciones
+        'enlaces': 'albums',
+    },
+    'albumes': {
+        'modelo': Album,
+        'esquema': AlbumSchema,
+        'tipo': 'album',
+        'obligatorios': ('titulo', 'anio', 'descripcion', 'medio'), # Los mismos que exige POST /albumes
+        'enlaces': 'canciones',
+    },
+}
+
+
+### Lectura de los formatos de entrada
+
+class FilaMalformada: # Línea de NDJSON que no es JSON válido, importar() la reporta como error de esa fila y sigue con las siguientes
+    def __init__(self, mensaje):
+        self.mensaje = mensaje
+
+
+def leer_filas(flujo, formato): # Generador de diccionarios a partir de un flujo de bytes en el formato indicado
+    texto = codecs.getreader('utf-8')(flujo)
+    if formato == 'json':
+        return _leer_json(texto)
+    if formato == 'ndjson':
+        return _leer_ndjson(texto)
+    if formato == 'csv':
+        return ({clave: valor for clave, valor in fila.items() if valor != ''} for fila in csv.DictReader(texto)) # Las celdas vacías se toman como campos que no vienen
+    raise ValueError("Formato no soportado: '{}'".format(formato))
+
+
+def _leer_ndjson(texto): # Un objeto por línea, cada línea se decodifica por separado así una mal formada no corta las demás
+    for linea in texto:
+        if not linea.strip():
+            continue
+        try:
+            yield json.loads(linea.strip())
+        except ValueError as error:
+            yield FilaMalformada('JSON no valido: {}'.format(error))
+
+
+def _leer_json(texto): # Lee un arreglo JSON elemento por elemento, sin cargar el arreglo completo en memoria
+    decodificador = json.JSONDecoder()
+    buffer, posicion, abierto = '', 0, False
+    anterior = '[' # Lo último que se leyó: '[', ',' o un elemento (None), para rechazar las comas de más igual que json.loads
+    while True:
+        while posicion < len(buffer) and buffer[posicion] in ' \t\r\n':
+            posicion += 1
+        if posicion == len(buffer): # Se acabó lo que hay en el buffer, se lee otro bloque
+            bloque = texto.read(TAMANO_BLOQUE)
+            if not bloque:
+                raise ValueError('El arreglo JSON está incompleto')
+            buffer, posicion = buffer[posicion:] + bloque, 0
+            continue
+        caracter = buffer[posicion]
+        if not abierto:
+            if caracter != '[':
+                raise ValueError('Se esperaba un arreglo JSON')
+            abierto, posicion = True, posicion + 1
+        elif caracter == ']':
+            if anterior == ',':
+                raise ValueError('Sobra una coma antes del final del arreglo JSON')
+            return
+        elif caracter == ',':
+            if anterior is not None:
+                raise ValueError('Se esperaba un elemento antes de la coma en el arreglo JSON')
+            anterior, posicion = ',', posicion + 1
+        elif anterior is None:
+            raise ValueError('Falta una coma entre los elementos del arreglo JSON')
+        else:
+            try:
+                elemento, fin = decodificador.raw_decode(buffer, posicion)
+            except json.JSONDecodeError:
+                elemento, fin = None, len(buffer)
+            if fin == len(buffer): # El elemento puede estar cortado entre dos bloques, se lee otro bloque y se intenta de nuevo
+                bloque = texto.read(TAMANO_BLOQUE)
+                if not bloque:
+                    raise ValueError('El arreglo JSON está incompleto')
+                buffer, posicion = buffer[posicion:] + bloque, 0
+                continue
+            yield elemento
+            anterior, posicion = None, fin
+
+
+### Validación
+
+@lru_cache(maxsize=None)
+def _esquema_validacion(recurso): # Esquema que valida y convierte los campos, sin crear instancias del ORM y sin las relaciones
+    # Se usa un Schema de marshmallow simple con los mismos campos del autoschema: el load() de marshmallow_sqlalchemy
+    # consulta la versión instalada de marshmallow en cada llamada y eso cuesta más que validar la fila
+    configuracion = RECURSOS[recurso]
+    excluidos = ('id', 'medio', configuracion['enlaces'], 'usuario')
+    campos = configuracion['esquema'](exclude=[campo for campo in excluidos if campo in configuracion['esquema']._declared_fields]).load_fields
+    return Schema.from_dict(dict(campos), name='Validacion' + configuracion['esquema'].__name__)()
+
+
+@lru_cache(maxsize=None)
+def _solo_salida(recurso): # Campos que el esquema solo serializa (la versión y los totales de los albumes), vienen en las exportaciones
+    return tuple(nombre for nombre, campo in RECURSOS[recurso]['esquema']().fields.items() if campo.dump_only)
+
+
+@lru_cache(maxsize=None)
+def _columnas(recurso): # Columnas que se insertan, todas las filas de un lote llevan las mismas para que el executemany sea uno solo
+    columnas = list(_esquema_validacion(recurso).load_fields)
+    if recurso == 'albumes':
+        columnas += ['medio', 'usuario_id']
+    return columnas
+
+
+def _ids(valor): # Lista de ids de una fila, en CSV vienen como '1;2;3'
+    if valor is None:
+        return []
+    if isinstance(valor, str):
+        valor = [parte for parte in valor.split(';') if parte.strip()]
+    if not isinstance(valor, list):
+        raise ValidationError('Debe ser una lista de ids')
+    try:
+        return [int(id) for id in valor]
+    except (TypeError, ValueError):
+        raise ValidationError('Debe ser una lista de ids')
+
+
+def _validar(recurso, fila): # Regresa (valores de las columnas, ids enlazados) o lanza ValidationError con los errores de la fila
+    configuracion = RECURSOS[recurso]
+    if isinstance(fila, FilaMalformada):
+        raise ValidationError({'_formato': [fila.mensaje]})
+    if not isinstance(fila, dict):
+        raise ValidationError({'_fila': ['Cada fila debe ser un objeto']})
+    fila = dict(fila)
+    for campo in ('id',) + _solo_salida(recurso): # Los ids los asigna la db y los campos de solo salida se calculan, así una exportación se puede importar de nuevo
+        fila.pop(campo, None)
+    errores = {campo: ['Campo obligatorio'] for campo in configuracion['obligatorios'] if fila.get(campo) is None}
+    try:
+        enlaces = _ids(fila.pop(configuracion['enlaces'], None))
+    except ValidationError as error:
+        errores[configuracion['enlaces']] = error.messages
+        enlaces = []
+    usuario = fila.pop('usuario', None)
+    medio = fila.pop('medio', None)
+    try:
+        valores = _esquema_validacion(recurso).load(fila)
+    except ValidationError as error:
+        errores.update(error.messages)
+        valores = {}
+    if recurso == 'albumes':
+        if isinstance(medio, dict): # El medio como lo serializa EnumADict, {'llave': 'CD', 'valor': 3}
+            medio = medio.get('llave')
+        try:
+            valores['medio'] = Medio[medio] if medio is not None else None # El medio se recibe por nombre, como en POST /albumes
+        except (KeyError, TypeError):
+            errores['medio'] = ['Medio no valido, debe ser uno de: {}'.format(', '.join(medio.name for medio in Medio))]
+        try:
+            valores['usuario_id'] = int(usuario) if usuario is not None else None
+        except (TypeError, ValueError):
+            errores['usuario'] = ['Debe ser el id de un usuario']
+    if errores:
+        raise ValidationError(errores)
+    return {columna: valores.get(columna) for columna in _columnas(recurso)}, enlaces
+
+
+### Inserción
+
+def _insertar(recurso, lote, afectados): # Inserta un lote de filas ya validadas y sus enlaces en album_cancion, sin hacer commit
+    configuracion = RECURSOS[recurso]
+    modelo = configuracion['modelo']
+    filas = [valores for _, valores, _ in lote]
+    if not any(enlaces for _, _, enlaces in lote):
+        db.session.execute(db.insert(modelo.__table__), filas) # executemany de core, sin objetos del ORM
+    else:
+        ids = db.session.scalars(db.insert(modelo).returning(modelo.id, sort_by_parameter_order=True), filas).all() # Los ids nuevos en el mismo orden de las filas
+        if recurso == 'canciones':
+            pares = [{'album_id': id_album, 'cancion_id': id} for id, (_, _, enlaces) in zip(ids, lote) for id_album in enlaces]
+            afectados['album'].update(par['album_id'] for par in pares)
+        else:
+            pares = [{'album_id': id, 'cancion_id': id_cancion} for id, (_, _, enlaces) in zip(ids, lote) for id_cancion in enlaces]
+            afectados['cancion'].update(par['cancion_id'] for par in pares)
+        db.session.execute(insert_sqlite(album_cancion).on_conflict_do_nothing(), pares) # Todos los enlaces del lote en un solo executemany
+    if recurso == 'albumes':
+        afectados['usuario'].update(valores['usuario_id'] for valores in filas if valores['usuario_id'] is not None)
+
+
+def _insertar_lote(recurso, lote, reporte, afectados): # Un lote por transacción, si la db rechaza alguna fila se reintenta fila por fila para reportarla
+    try:
+        _insertar(recurso, lote, afectados)
+        db.session.commit()
+        reporte['insertados'] += len(lote)
+        return
+    except IntegrityError:
+        db.session.rollback()
+    for fila in lote:
+        try:
+            _insertar(recurso, [fila], afectados)
+            db.session.commit()
+            reporte['insertados'] += 1
+        except IntegrityError as error:
+            db.session.rollback()
+            reporte['errores'].append({'fila': fila[0], 'errores': {'_db': [str(error.orig)]}})
+
+
+def importar(recurso, filas, tamano_lote=TAMANO_LOTE): # Valida e inserta las filas por lotes, regresa cuántas se insertaron y los errores por fila
+    reporte = {'insertados': 0, 'errores': []}
+    afectados = {'cancion': set(), 'album': set(), 'usuario': set()} # Recursos relacionados que hay que sacar del cache
+    lote = []
+    numero = 0
+    try:
+        for numero, fila in enumerate(filas, start=1):
+            try:
+                valores, enlaces = _validar(recurso, fila)
+            except ValidationError as error:
+                reporte['errores'].append({'fila': numero, 'errores': error.messages})
+                continue
+            lote.append((numero, valores, enlaces))
+            if len(lote) >= tamano_lote:
+                _insertar_lote(recurso, lote, reporte, afectados)
+                lote = []
+    except ValueError as error: # El arreglo JSON o el CSV está mal formado (o no es UTF-8), se guarda lo que ya se validó y se reporta dónde se cortó
+        reporte['errores'].append({'fila': numero + 1, 'errores': {'_formato': [str(error)]}})
+    if lote:
+        _insertar_lote(recurso, lote, reporte, afectados)
+
+    cache.invalidar(RECURSOS[recurso]['tipo']) # Las listas del tipo importado ya no están al día
+    for tipo, ids in afectados.items():
+        if ids:
+            cache.invalidar(tipo, *ids)
+    return reporte
+
+
+### Exportación
+
+def exportar(recurso, formato): # Generador con todas las filas del recurso en NDJSON o CSV, en el mismo formato que acepta importar
+    configuracion = RECURSOS[recurso]
+    consulta, volcar, escalares, nombres = preparar(db.session, configuracion['modelo'], configuracion['esquema']())
+    return generar(db.session, consulta.order_by(configuracion['modelo'].id), volcar, escalares, nombres, formato)
@@ -0,0 +1,121 @@
+# Funciones auxiliares para responder desde el cache y para invalidarlo cuando cambian los datos
+
+# Se importa json para serializar los payloads que se guardan en el cache
+import json
+
+# Se importa hashlib para calcular el ETag de cada payload
+import hashlib
+
+# Se importan request y Response de flask
+from flask import request, Response
+
+# Se importan la base de datos, la tabla intermediaria y los modelos
+from ..models import db, album_cancion, Album
+
+# Se importa el cache
+from ..cache import cache
+
+# Se importan las métricas para medir la codificación del json
+from ..metricas import metricas
+
+
+def _respuesta(cuerpo, etag, cabeceras=None): # Arma la respuesta json, o un 304 si el cliente ya tiene esa versión (If-None-Match)
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = Response(cuerpo, mimetype='application/json')
+    respuesta.set_etag(etag)
+    respuesta.headers.extend(cabeceras or {})
+    return respuesta
+
+
+def _entrada(datos): # Serializa igual que flask_restful (json + salto de línea) y calcula el ETag
+    with metricas.fase('json'):
+        cuerpo = json.dumps(datos) + '\n'
+    etag = hashlib.sha1(cuerpo.encode()).hexdigest()
+    if isinstance(datos, dict) and 'version' in datos: # Un recurso: el ETag empieza con su versión, '3-<sha1>', así If-Match se compara con la de la db
+        etag = '{}-{}'.format(datos['version'], etag)
+    return cuerpo, etag
+
+
+def respuesta_escrita(datos): # Respuesta de un POST, PUT o PATCH con el ETag del recurso, el cliente lo manda en If-Match en su siguiente cambio
+    cuerpo, etag = _entrada(datos)
+    respuesta = Response(cuerpo, mimetype='application/json')
+    respuesta.set_etag(etag)
+    return respuesta
+
+
+def versiones_if_match(): # Versiones que acepta el If-Match de la request, None si no viene (o es *) y el UPDATE no revisa la versión
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    # Solo los ETags fuertes, los débiles (W/"...") nunca coinciden con If-Match; uno que no es de este servidor no coincide con ninguna versión
+    prefijos = (etag.split('-', 1)[0] for etag in request.if_match)
+    return [int(prefijo) for prefijo in prefijos if prefijo.isdigit()]
+
+
+def respuesta_cacheada(tipo, id, generar): # Regresa un recurso individual desde el cache, si no está se genera con generar() y se guarda
+    clave = cache.clave_recurso(tipo, id)
+    entrada = cache.obtener(clave)
+    if entrada is None:
+        entrada = _entrada(generar()) # generar() puede lanzar el 404, en ese caso no se guarda nada
+        cache.guardar(clave, entrada)
+    cuerpo, etag = entrada
+    return _respuesta(cuerpo, etag)
+
+
+def lista_cacheada(tipo, generar): # Regresa una lista desde el cache, la clave incluye la versión de las listas de ese tipo y el query string
+    if request.args.get('formato') in ('ndjson', 'csv'): # El streaming no se cachea, justamente es para no tener todo en memoria
+        return generar()
+    clave = cache.clave_lista(tipo, request.query_string.decode())
+    entrada = cache.obtener(clave)
+    if entrada is None:
+        datos, codigo, cabeceras = generar()
+        entrada = _entrada(datos) + (cabeceras,)
+        cache.guardar(clave, entrada)
+    cuerpo, etag, cabeceras = entrada
+    return _respuesta(cuerpo, etag, cabeceras)
+
+
+### Invalidación
+# Cada función se llama ANTES del commit (o con los ids relacionados que regresó la misma sentencia), mientras todavía existen las filas de album_cancion que relacionan los recursos,
+# y regresa una función que se llama después del commit para hacer la invalidación
+# Las consultas se hacen en la sesión de la vista, igual en el modo WSGI y en el ASGI
+
+def _albumes_de_canciones(ids_canciones): # SELECT de los albumes que incluyen alguna de las canciones
+    return db.select(album_cancion.c.album_id).where(album_cancion.c.cancion_id.in_(ids_canciones)).distinct()
+
+
+def _canciones_de_albumes(ids_albumes): # SELECT de las canciones que están en alguno de los albumes, ids_albumes es una lista o un SELECT
+    return db.select(album_cancion.c.cancion_id).where(album_cancion.c.album_id.in_(ids_albumes)).distinct()
+
+
+def _albumes_de_usuario(id_usuario): # SELECT de los albumes del usuario
+    return db.select(Album.id).where(Album.usuario_id == id_usuario)
+
+
+def _invalidacion(tipo, id, relacionados): # Función que saca del cache el recurso, las listas de su tipo y los recursos relacionados {tipo: ids}
+    def invalidar():
+        cache.invalidar(tipo, *([id] if id is not None else []))
+        for tipo_relacionado, ids in relacionados.items():
+            if ids:
+                cache.invalidar(tipo_relacionado, *ids)
+    return invalidar
+
+
+def invalidar_cancion(sesion, id_cancion=None, ids_albumes=None): # Una canción cambió: se borra ella, sus listas y todos los albumes que la incluyen
+    if ids_albumes is None: # Si ya se conocen sus albumes (por ejemplo del RETURNING de actualizar()) no se consultan
+        ids_albumes = sesion.scalars(_albumes_de_canciones([id_cancion])).all() if id_cancion is not None else []
+    return _invalidacion('cancion', id_cancion, {'album': ids_albumes})
+
+
+def invalidar_album(sesion, id_album=None, usuario_id=None, con_canciones=False): # Un album cambió: se borra él, sus listas, y si se indica su usuario y sus canciones
+    ids_canciones = sesion.scalars(_canciones_de_albumes([id_album])).all() if con_canciones and id_album is not None else []
+    return _invalidacion('album', id_album, {'cancion': ids_canciones, 'usuario': [usuario_id] if usuario_id is not None else []})
+
+
+def invalidar_usuario(sesion, id_usuario=None, con_albumes=False): # Un usuario cambió: se borra él, sus listas, y si se indica sus albumes y las canciones de esos albumes
+    ids_albumes, ids_canciones = [], []
+    if con_albumes and id_usuario is not None:
+        ids_albumes = sesion.scalars(_albumes_de_usuario(id_usuario)).all()
+        ids_canciones = sesion.scalars(_canciones_de_albumes(_albumes_de_usuario(id_usuario))).all() if ids_albumes else [] # Con subconsulta, un usuario puede tener miles de albumes
+    return _invalidacion('usuario', id_usuario, {'album': ids_albumes, 'cancion': ids_canciones})
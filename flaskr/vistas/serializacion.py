@@ -0,0 +1,119 @@
+# Serialización compilada: convierte filas de core (no instancias del ORM) en el mismo dict que produce el esquema de marshmallow
+
+# Se importa lru_cache para compilar cada combinación de modelo, esquema y campos una sola vez
+from functools import lru_cache
+
+# Se importa json para leer las listas de ids que regresa el RETURNING de una actualización
+import json
+
+# Se importan los campos de marshmallow y de marshmallow_sqlalchemy que se saben compilar
+from marshmallow import fields
+from marshmallow_sqlalchemy.fields import Related, RelatedList
+
+# Se importa la inspección de modelos de sqlalchemy para encontrar las columnas de cada relación
+from sqlalchemy import inspect
+
+# Se importan la base de datos, el campo de los enums y el filtro de las filas marcadas por el borrado diferido
+from ..models import db, EnumADict, relacionados_visibles
+
+# Cantidad máxima de ids por consulta de relaciones, igual que selectinload, para no pasar el límite de parámetros de SQLite
+TAMANO_IN = 500
+
+# Campos que se copian tal cual desde la columna: en la db ya tienen el tipo que marshmallow produciría
+CAMPOS_DIRECTOS = (fields.Integer, fields.String, fields.Boolean)
+
+
+class NoCompilable(Exception): # El esquema tiene un campo que no se sabe compilar, se usa marshmallow
+    pass
+
+
+def _enum(valor): # Igual que EnumADict._serialize
+    if valor is None:
+        return None
+    return {'llave': valor.name, 'valor': valor.value}
+
+
+class SerializadorCompilado:
+    # Se construye una vez por esquema: decide de qué columna sale cada campo y genera una función fila -> dict
+    # Las listas de ids de las relaciones se traen con una consulta por relación para todo el lote de filas
+    def __init__(self, modelo, esquema):
+        tabla = modelo.__table__
+        relaciones = inspect(modelo).relationships
+        self.columnas = [tabla.c.id] # Columnas del SELECT, el id siempre va primero (para el cursor y las relaciones)
+        self.listas = [] # (columna dueña, columna del id relacionado, modelo relacionado) de cada relación uno a muchos o muchos a muchos
+        expresiones = []
+        for nombre, campo in esquema.dump_fields.items():
+            atributo = campo.attribute or nombre
+            if isinstance(campo, RelatedList):
+                relacion = relaciones[atributo]
+                if relacion.secondary is not None: # Muchos a muchos por album_cancion
+                    dueno = relacion.synchronize_pairs[0][1]
+                    relacionado = relacion.secondary_synchronize_pairs[0][1]
+                else: # Uno a muchos, la llave foránea está en la otra tabla
+                    dueno = relacion.synchronize_pairs[0][1]
+                    relacionado = relacion.mapper.primary_key[0]
+                expresiones.append('{!r}: listas[{}].get(fila[0], [])'.format(nombre, len(self.listas)))
+                self.listas.append((dueno, relacionado, relacion.mapper.class_))
+            elif isinstance(campo, Related): # Muchos a uno: el id relacionado es la llave foránea de la misma fila
+                llave = relaciones[atributo].local_remote_pairs[0][0]
+                expresiones.append('{!r}: fila[{}]'.format(nombre, self._indice(llave)))
+            elif isinstance(campo, EnumADict):
+                expresiones.append('{!r}: _enum(fila[{}])'.format(nombre, self._indice(tabla.c[atributo])))
+            elif type(campo) in CAMPOS_DIRECTOS and not getattr(campo, 'as_string', False):
+                expresiones.append('{!r}: fila[{}]'.format(nombre, self._indice(tabla.c[atributo])))
+            else:
+                raise NoCompilable(nombre)
+        codigo = 'def volcar(fila, listas):\n    return {' + ', '.join(expresiones) + '}\n'
+        espacio = {'_enum': _enum}
+        exec(compile(codigo, '<serializador {}>'.format(esquema.__class__.__name__), 'exec'), espacio)
+        self._volcar = espacio['volcar']
+
+    def _indice(self, columna): # Posición de la columna en el SELECT, se agrega si todavía no está
+        for indice, existente in enumerate(self.columnas):
+            if existente.key == columna.key and existente.table is columna.table:
+                return indice
+        self.columnas.append(columna)
+        return len(self.columnas) - 1
+
+    def consultas_listas(self, filas): # Para cada relación, los SELECT (dueño, relacionado) de los ids de las filas, en grupos de TAMANO_IN
+        ids = [fila[0] for fila in filas]
+        return [[db.select(dueno, relacionado).where(dueno.in_(ids[inicio:inicio + TAMANO_IN]), *relacionados_visibles(relacionado, destino)).order_by(dueno, relacionado)
+                 for inicio in range(0, len(ids), TAMANO_IN)]
+                for dueno, relacionado, destino in self.listas]
+
+    def armar(self, filas, resultados): # Lista de dicts a partir de las filas y de los resultados de consultas_listas
+        listas = []
+        for resultado in resultados: # Para cada relación: {id dueño: [ids relacionados ordenados]}
+            agrupados = {}
+            for id, id_relacionado in resultado:
+                agrupados.setdefault(id, []).append(id_relacionado)
+            listas.append(agrupados)
+        volcar = self._volcar
+        return [volcar(fila, listas) for fila in filas]
+
+    def serializar(self, sesion, filas): # Lista de dicts a partir de filas del SELECT de self.columnas, las listas de ids se consultan en sesion
+        resultados = [[par for consulta in consultas for par in sesion.execute(consulta)] for consultas in self.consultas_listas(filas)]
+        return self.armar(filas, resultados)
+
+    def columnas_fila(self, tabla): # self.columnas y una subconsulta por relación con los ids relacionados como arreglo JSON, para el RETURNING de un UPDATE
+        # SQLite escribe las columnas del RETURNING sin el nombre de la tabla, dentro de la subconsulta 'id' sería el de la otra tabla
+        id = db.literal_column('{}.{}'.format(tabla.name, tabla.c.id.name))
+        return self.columnas + [db.select(db.func.json_group_array(relacionado)).where(dueno == id, *relacionados_visibles(relacionado, destino)).scalar_subquery()
+                                for dueno, relacionado, destino in self.listas]
+
+    def serializar_fila(self, fila): # Dict de una fila de columnas_fila(), sin más consultas, las listas se ordenan igual que en consultas_listas
+        listas = [{fila[0]: sorted(json.loads(ids))} for ids in fila[len(self.columnas):]]
+        return self._volcar(fila, listas)
+
+
+@lru_cache(maxsize=None)
+def _compilado(modelo, clase_esquema, campos):
+    try:
+        return SerializadorCompilado(modelo, clase_esquema(only=campos) if campos else clase_esquema())
+    except NoCompilable:
+        return None
+
+
+def serializador_compilado(modelo, esquema, campos=None): # El serializador compilado del esquema, o None si no se puede compilar
+    esquema = getattr(esquema, 'instancia', esquema)
+    return _compilado(modelo, type(esquema), campos)
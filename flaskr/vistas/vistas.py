@@ -2,126 +2,291 @@
 from flask_restful import Resource
 
 # Para importar los modelos que se usaran en las resource
-from ..models import db, Cancion, CancionSchema, Album, AlbumSchema, Usuario, UsuarioSchema, Medio
+from ..models import db, Cancion, CancionSchema, Album, AlbumSchema, Usuario, UsuarioSchema, Medio, buscar, album_cancion, visibles
 
-# Para importar request, lo que va a permitir usar los request
-from flask import request
+# Para importar el insert de SQLite, que permite INSERT ... ON CONFLICT DO NOTHING
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
 
+# Para importar request, lo que va a permitir usar los request, y Response para responder texto plano
+from flask import request, Response
+
+# Para importar la función que arma las listas paginadas y las que consultan, actualizan y borran un recurso
+from .consultas import listar, obtener, existe_o_404, actualizar, borrar, EsquemaPerezoso, opciones_carga
+
+# Para importar las funciones que responden desde el cache y las que lo invalidan
+from .respuestas import respuesta_cacheada, lista_cacheada, respuesta_escrita, versiones_if_match, invalidar_cancion, invalidar_album, invalidar_usuario
+
+# Para importar la importación masiva de canciones y albumes
+from .importacion import importar, leer_filas, FORMATOS
+
+# Para importar abort, con el que se responden los errores en formato json
+from flask_restful import abort
+
+# Para importar el cache y consultar sus estadisticas
+from ..cache import cache
+
+# Para importar las métricas de las requests
+from ..metricas import metricas
+
+# Para importar el cifrado de contraseñas
+from ..contrasenas import contrasenas
+
+
+# Base de todas las vistas, self.sesion es la sesión de la db con la que la vista hace sus consultas
+# En el modo WSGI es db.session, en el modo ASGI (flaskr/asgi.py) es la sesión síncrona de una AsyncSession: la misma vista corre en el
+# greenlet de esa sesión y cada consulta se espera en el event loop, así las dos formas de servir la app usan el mismo código
+class Recurso(Resource):
+    asincrona = True # False hace que el modo ASGI atienda la vista con la app de flask en un hilo
+
+    def __init__(self, sesion=None):
+        self.sesion = db.session if sesion is None else sesion
+
+
+def _valores(campos): # Solo los campos que vienen en el cuerpo, PUT y PATCH cambian esas columnas y dejan las demás como estaban
+    return {campo: request.json[campo] for campo in campos if campo in request.json}
 
 ### Para la vista de las canciones
 
 # Se instancia el esquema de Cancion
-cancion_schema = CancionSchema()
+cancion_schema = EsquemaPerezoso(CancionSchema) # Se construye la primera vez que se usa
 
 # Se crea la clase con la vista de las canciones
-class VistaCanciones(Resource): # Hereda de un recurso
+class VistaCanciones(Recurso): # Hereda de un recurso
     def get(self): # Metodo para conseguir toda la lista de canciones
-        return [cancion_schema.dump(cancion) for cancion in Cancion.query.all()] # Regresa una lista con todas las canciones en la db, como se usó .dump() se va a obtener un dict de python
+        return lista_cacheada('cancion', lambda: listar(self.sesion, Cancion, cancion_schema)) # Regresa una lista con las canciones en la db, acepta ?limit=, ?cursor=, ?fields= y ?formato=ndjson
     
     def post(self): # Se define POST como método de la clase de la vista de las canciones, crea una nueva canción
         nueva_cancion = Cancion(titulo=request.json['titulo'], \
                                 minutos=request.json['minutos'], \
                                 segundos=request.json['segundos'], \
                                 interprete=request.json['interprete']) # Se recibe la cancion con todos sus atributos por medio de request desde json, NO se usa get porque se espera un diccionario con todos los atributos, son obligatorios
-        db.session.add(nueva_cancion) # Se agrega la canción a la db
-        db.session.commit() # Se guardan los cambios en la db
-        return cancion_schema.dump(nueva_cancion)
+        self.sesion.add(nueva_cancion) # Se agrega la canción a la db
+        self.sesion.commit() # Se guardan los cambios en la db
+        invalidar_cancion(self.sesion)() # Las listas de canciones ya no están al día
+        return respuesta_escrita(cancion_schema.dump(nueva_cancion)) # Con el ETag de la versión 1, para el If-Match del siguiente cambio
 
 # Para el metodo de editar cancion y borrar cancion es necesario crear otra vista
-class VistaCancion(Resource): # Hereda de Resource, clase asociada a una sola cancion, el recurso se crea para editar y borrar
+class VistaCancion(Recurso): # Hereda de Resource, clase asociada a una sola cancion, el recurso se crea para editar y borrar
     def get(self, id_cancion): # Metodo para regresar una cancion asociada a un id 
-        return cancion_schema.dump(Cancion.query.get_or_404(id_cancion)) # Regresa la información de la canción asociada al id, se usa get_or_404 en caso de que ese id no exista en la db
+        return respuesta_cacheada('cancion', id_cancion, lambda: obtener(self.sesion, Cancion, cancion_schema, id_cancion)) # Regresa la información de la canción asociada al id, obtener() responde 404 en caso de que ese id no exista en la db
+
+    def put(self, id_cancion): # Metodo para editar una cancion en especifico
+        valores = _valores(('titulo', 'minutos', 'segundos', 'interprete')) # Los atributos son opcionales, los que no se ingresan se quedan como estaban
+        cancion = actualizar(self.sesion, Cancion, cancion_schema, id_cancion, valores, versiones_if_match()) # UPDATE ... WHERE id = ? [AND version = ?] RETURNING la canción con sus albumes, sin leerla antes ni después, 404 si no existe, 412 si cambió desde el If-Match
+        invalidar_cancion(self.sesion, id_cancion, cancion['albums'])() # Se sacan del cache la canción y sus albumes
+        return respuesta_escrita(cancion) # Regresa la canción actualizada con el ETag de su nueva versión
 
-    def put(sel, id_cancion): # Metodo para editar una cancion en especifico
-        cancion = Cancion.query.get_or_404(id_cancion) # Se consigue el objeto Cancion que se va a editar
-        cancion.titulo = request.json.get('titulo', cancion.titulo) # Como json entrega diccionario, esto busca una clave, se usa get porque el atributo es opcional, se usa cancion.titulo como campo por defecto en caso de que la entrada no se ingrese
-        cancion.minutos = request.json.get('minutos', cancion.minutos) # Se hace el request opcional para minutos
-        cancion.segundos = request.json.get('segundos', cancion.segundos) # Se hace el request opcional para segundos
-        cancion.interprete = request.json.get('interprete', cancion.interprete) # Se hace el request opcional para interprete
-        db.session.commit() # Se guardan los cambios en la db
-        return cancion_schema.dump(cancion) # Regresa la canción actualizada
+    patch = put # PATCH cambia solo los campos que vienen, igual que PUT
 
     def delete(self, id_cancion): # Metodo para borrar una cancion en especifico
-        cancion = Cancion.query.get_or_404(id_cancion) # Se consigue el objeto Cancion que se va a borrar
-        db.session.delete(cancion) # Se borra al objeto cancion de la db
-        db.session.commit() # Se guardan los cambios en la db
+        invalidar = invalidar_cancion(self.sesion, id_cancion) # Se buscan los albumes que incluyen la canción antes de borrarla
+        borrar(self.sesion, Cancion, id_cancion) # DELETE ... WHERE id = ?, la db borra sus filas de album_cancion en cascada, 404 si no existe
+        invalidar() # Se sacan del cache la canción y sus albumes
         return 'Cancion eliminada con exito', 204 # Confirmación de la operación, el codigo 204 indica que el recurso ya no existe, para evitar solicitudes por parte del usuario sobre este
     
 
 ### Para la vista de los albumes
 
 # Instancia del esquema de Album
-album_schema = AlbumSchema()
+album_schema = EsquemaPerezoso(AlbumSchema) # Se construye la primera vez que se usa
 
 # Se crea la clase de la vista de los albumes para los metodos get (lista) y post
-class VistaAlbumes(Resource): # Como es un recurso hereda de Resource
+class VistaAlbumes(Recurso): # Como es un recurso hereda de Resource
     def get(self): # Metodo get (lista albumes)
-        return [album_schema.dump(album) for album in Album.query.all()] # Regresa una lista con todos los albumes en la db
+        return lista_cacheada('album', lambda: listar(self.sesion, Album, album_schema)) # Regresa una lista con los albumes en la db, acepta ?limit=, ?cursor=, ?fields= y ?formato=ndjson
     
     def post(self): # Metodo post (crear album)
         nuevo_album = Album(titulo=request.json['titulo'], \
                             anio=request.json['anio'], \
                             descripcion=request.json['descripcion'], \
                             medio=Medio[request.json['medio']]) # Se crea el objeto clase Album, el mapeo del medio se recibe como string, como 'CD'. Si se quiere recibir el valor numerico, como 1, 2 o 3 el medio se recibe con Medio(request.json['medio'])
-        db.session.add(nuevo_album) # Se agrega el nuevo objeto album a la db
-        db.session.commit() # Se guardan los cambios a la db
-        return album_schema.dump(nuevo_album) # Se regresa el nuevo album creado
+        self.sesion.add(nuevo_album) # Se agrega el nuevo objeto album a la db
+        self.sesion.commit() # Se guardan los cambios a la db
+        invalidar_album(self.sesion)() # Las listas de albumes ya no están al día
+        return respuesta_escrita(album_schema.dump(nuevo_album)) # Se regresa el nuevo album creado con su ETag
     
 # Se cre la clase de la vista de un album en especifico, para los metodos get (especifico), put y delete
-class VistaAlbum(Resource): # Como es un recurso hereda de Resource
+class VistaAlbum(Recurso): # Como es un recurso hereda de Resource
     def get(self, id_album): # Metodo get (un album en especifico)
-        album = Album.query.get_or_404(id_album) # Se consulta a la db por el album en especifico con id id_album
-        return album_schema.dump(album) # Se regresa el album, se podría ahorrar una línea de codigo haciendo directamente la consulta en este return
+        return respuesta_cacheada('album', id_album, lambda: obtener(self.sesion, Album, album_schema, id_album)) # Se regresa el album desde el cache, si no está se consulta a la db por el album con id id_album
     
     def put(self, id_album): # Metodo put (editar album)
-        album = Album.query.get_or_404(id_album) # Se consulta la db por el album en especifico con id id_album
-        album.titulo = request.json.get('titulo', album.titulo) # Se mapea el nuevo titulo del album y se reemplaza por el titulo del album, si no se ingresa ninguno, se deja el titulo que ya tenía
-        album.anio = request.json.get('anio', album.anio) # Se mapea el nuevo año del album y se reemplaza en el album, si no se ingresa ninguno se deja el año que ya tenía
-        album.descripcion = request.json.get('descripcion', album.descripcion) # Se mapea la nueva descripcion del album y se reemplaza en el album, si no se ingresa ninguna se deja la descripcion que ya tenía
+        valores = _valores(('titulo', 'anio', 'descripcion', 'medio')) # Se mapean los campos que se ingresan, los demás se dejan como estaban
         # ADVERTENCIA, el mapeo del medio solo se hace así si el front es confiable, en caso contrario es necesario un try/except
-        album.medio = Medio[request.json.get('medio', album.medio.name)] # Se mapea el nuevo medio, como es un enum y se recibe el str con el nombre de la enum se recibe como en el paso 9 de las indicaciones
-        db.session.commit() # Se guardan los cambios en la db
-        return album_schema.dump(album) # Se regresa el album con los cambios realizados
+        if 'medio' in valores:
+            valores['medio'] = Medio[valores['medio']] # Se mapea el nuevo medio, como es un enum y se recibe el str con el nombre de la enum se recibe como en el paso 9 de las indicaciones
+        album = actualizar(self.sesion, Album, album_schema, id_album, valores, versiones_if_match()) # Una sola sentencia UPDATE ... RETURNING, 404 si no existe, 412 si cambió desde el If-Match
+        invalidar_album(self.sesion, id_album)() # Se saca del cache el album
+        return respuesta_escrita(album) # Se regresa el album con los cambios realizados y el ETag de su nueva versión
+
+    patch = put # PATCH cambia solo los campos que vienen, igual que PUT
     
     def delete(self, id_album): # Metodo delete (borrar album)
-        album = Album.query.get_or_404(id_album) # Se consulta la db por el album en especifico con id id_album
-        db.session.delete(album) # Se borra el album de la db
-        db.session.commit() # Se guardan los cambios en la db
+        usuario_id = self.sesion.scalar(db.select(Album.usuario_id).where(Album.id == id_album)) # Solo la columna, no se carga el album
+        invalidar = invalidar_album(self.sesion, id_album, usuario_id, con_canciones=True) # Se buscan las canciones del album antes de borrarlo
+        borrar(self.sesion, Album, id_album) # DELETE ... WHERE id = ?, la db borra sus filas de album_cancion en cascada, 404 si no existe
+        invalidar() # Se sacan del cache el album, su usuario y sus canciones
         return 'Album borrado con exito', 204 # Se notifica que la operación se realizó correctamente, el codigo 204 indica que el recurso ya no existe, para evitar que el usuario evite regresar a este
     
+### Para la vista de las canciones de un album
+
+def _ids_canciones(): # Lista de ids de canciones del cuerpo {'canciones': [1, 2, 3]} o del query string ?canciones=1,2,3
+    datos = request.get_json(silent=True) or {}
+    if not isinstance(datos, dict): # Un cuerpo como [1, 2] o "1" no trae la llave 'canciones'
+        abort(400, message="Se espera una lista de ids en 'canciones'")
+    ids = datos.get('canciones', request.args.get('canciones', '').split(',') if request.args.get('canciones') else None)
+    if not isinstance(ids, list) or not ids:
+        abort(400, message="Se espera una lista de ids en 'canciones'")
+    try:
+        return sorted({int(id) for id in ids})
+    except (TypeError, ValueError):
+        abort(400, message="Los ids de 'canciones' deben ser enteros")
+
+# Se crea la clase VistaAlbumCanciones para manejar las canciones de un album con una sola sentencia por request
+class VistaAlbumCanciones(Recurso): # Como es un recurso, hereda de Resource
+    def get(self, id_album): # Metodo get (canciones del album)
+        existe_o_404(self.sesion, Album, id_album) # Se verifica que el album exista
+        consulta = db.select(Cancion).join(album_cancion, album_cancion.c.cancion_id == Cancion.id) \
+            .where(album_cancion.c.album_id == id_album).order_by(Cancion.id).options(*opciones_carga(Cancion, cancion_schema))
+        return cancion_schema.dump(self.sesion.scalars(consulta).all(), many=True) # Se regresan las canciones del album
+
+    def post(self, id_album): # Metodo post (agregar canciones al album), las que ya estaban o no existen se ignoran
+        existe_o_404(self.sesion, Album, id_album) # Se verifica que el album exista
+        ids = _ids_canciones()
+        existentes = db.select(db.literal(id_album), Cancion.id).where(Cancion.id.in_(ids), *visibles(Cancion.__table__)) # Solo las canciones que existen
+        self.sesion.execute(insert_sqlite(album_cancion).from_select(['album_id', 'cancion_id'], existentes).on_conflict_do_nothing()) # INSERT ... SELECT ... ON CONFLICT DO NOTHING, los totales los actualizan los triggers
+        self.sesion.commit() # Se guardan los cambios en la db
+        cache.invalidar('album', id_album) # Se sacan del cache el album y las canciones, que muestran sus albumes
+        cache.invalidar('cancion', *ids)
+        return respuesta_escrita(obtener(self.sesion, Album, album_schema, id_album)) # Se regresa el album con los totales actualizados y su ETag
+
+    def delete(self, id_album): # Metodo delete (quitar canciones del album), las canciones no se borran
+        existe_o_404(self.sesion, Album, id_album) # Se verifica que el album exista
+        ids = _ids_canciones()
+        self.sesion.execute(db.delete(album_cancion).where(album_cancion.c.album_id == id_album, album_cancion.c.cancion_id.in_(ids))) # DELETE ... WHERE album_id = ? AND cancion_id IN (...)
+        self.sesion.commit() # Se guardan los cambios en la db
+        cache.invalidar('album', id_album) # Se sacan del cache el album y las canciones
+        cache.invalidar('cancion', *ids)
+        return respuesta_escrita(obtener(self.sesion, Album, album_schema, id_album)) # Se regresa el album con los totales actualizados y su ETag
+
 ### Para las vistas de los usuarios
 
 # Se instancia el esquema de la clase Usuario
 
-usuario_schema = UsuarioSchema()
+usuario_schema = EsquemaPerezoso(UsuarioSchema) # Se construye la primera vez que se usa
 
 # Se crea la clase VistaUsuarios para los metodos get (lista) y post
-class VistaUsuarios(Resource): # Como es un recurso, hereda de Resource
+class VistaUsuarios(Recurso): # Como es un recurso, hereda de Resource
     def get(self): # Metodo get (lista usuarios)
-        return [usuario_schema.dump(usuario) for usuario in Usuario.query.all()] # Regresa una lista con todos los usuarios consultados en la db en formato dict
+        return lista_cacheada('usuario', lambda: listar(self.sesion, Usuario, usuario_schema)) # Regresa una lista con los usuarios en la db en formato dict, acepta ?limit=, ?cursor=, ?fields= y ?formato=ndjson
     
     def post(self): # Metodo post (crear usuario)
-        nuevo_usuario = Usuario(nombre_usuario=request.json['nombre_usuario'], \
-                                contrasena=request.json['contrasena']) # Se crea un nuevo usuario según lo mapeado
-        db.session.add(nuevo_usuario) # Se añade el nuevo usuario a la db
-        db.session.commit() # Se guardan los cambios en la db
-        return usuario_schema.dump(nuevo_usuario) # Se regresa el usuario creado con todos sus pares clave-valor
+        nuevo_usuario = Usuario(nombre_usuario=request.json['nombre_usuario']) # Se crea un nuevo usuario según lo mapeado
+        nuevo_usuario.cifrar_contrasena(request.json['contrasena']) # Se guarda la contraseña cifrada, se cifra en el pool de procesos antes de tocar la db
+        self.sesion.add(nuevo_usuario) # Se añade el nuevo usuario a la db
+        self.sesion.commit() # Se guardan los cambios en la db
+        invalidar_usuario(self.sesion)() # Las listas de usuarios ya no están al día
+        return respuesta_escrita(usuario_schema.dump(nuevo_usuario)) # Se regresa el usuario creado con todos sus pares clave-valor y su ETag
     
 # Se crea la clase VistaUsuario para los metodos get (especifico), put y delete
-class VistaUsuario(Resource): # Como es un recurso, hereda de Resource
+class VistaUsuario(Recurso): # Como es un recurso, hereda de Resource
     def get(self, id_usuario): # Metodo get (usuario especifico)
-        return usuario_schema.dump(Usuario.query.get_or_404(id_usuario)) # Se regresa el usuario en especifico con id id_usuario
+        return respuesta_cacheada('usuario', id_usuario, lambda: obtener(self.sesion, Usuario, usuario_schema, id_usuario)) # Se regresa el usuario en especifico con id id_usuario
     
     def put(self, id_usuario): # Metodo put (editar usuario)
-        usuario = Usuario.query.get_or_404(id_usuario) # Se consulta la db por el usuario en especifico que se va a editar
-        usuario.nombre_usuario = request.json.get('nombre_usuario', usuario.nombre_usuario) # Se mapea el cambio al nuevo nombre, en caso de no ingresar un valor, se mantiene el nombre que ya tiene el usuario
-        usuario.contrasena = request.json.get('contrasena', usuario.contrasena) # Se mapea la nueva contraseña del usuario, en caso de no ingresar ningun valor, se conserva la contraseña que ya tenía el usuario
-        db.session.add(usuario) # Se añaden los cambios del usuario a la db
-        db.session.commit() # Se guardan los cambios en la db
-        return usuario_schema.dump(usuario) # Se regresa el usuario con los cambios realizados
+        valores = _valores(('nombre_usuario',)) # Se mapea el cambio al nuevo nombre, en caso de no ingresar un valor, se mantiene el nombre que ya tiene el usuario
+        if 'contrasena' in request.json: # Se cifra la nueva contraseña del usuario, en caso de no ingresar ningun valor, se conserva la contraseña que ya tenía el usuario
+            valores['contrasena'] = contrasenas.cifrar(request.json['contrasena']) # En el pool de procesos, antes de tocar la db
+        usuario = actualizar(self.sesion, Usuario, usuario_schema, id_usuario, valores, versiones_if_match()) # Una sola sentencia UPDATE ... RETURNING, 404 si no existe, 412 si cambió desde el If-Match
+        invalidar_usuario(self.sesion, id_usuario)() # Se saca del cache el usuario
+        return respuesta_escrita(usuario) # Se regresa el usuario con los cambios realizados y el ETag de su nueva versión
+
+    patch = put # PATCH cambia solo los campos que vienen, igual que PUT
     
     def delete(self, id_usuario): # Metodo delete (borrar usuario)
-        usuario = Usuario.query.get_or_404(id_usuario) # Se consulta la db por el usuario en especifico con id id_usuario
-        db.session.delete(usuario) # Se borra al usuario en especifico de la db
-        db.session.commit() # Se guardan los cambios en la db
-        return 'Usuario borrado exitosamente' # Se notifica al usuario que la operación se realizó con exito
\ No newline at end of file
+        invalidar = invalidar_usuario(self.sesion, id_usuario, con_albumes=True) # Se buscan sus albumes y las canciones de estos antes de borrarlo
+        borrar(self.sesion, Usuario, id_usuario) # DELETE ... WHERE id = ?, la db borra en cascada sus albumes y las filas de album_cancion de estos, 404 si no existe
+        invalidar() # Se sacan del cache el usuario, sus albumes y las canciones de esos albumes
+        return 'Usuario borrado exitosamente' # Se notifica al usuario que la operación se realizó con exito
+
+### Para la vista del inicio de sesión
+
+def _credenciales(): # (nombre_usuario, contrasena) del cuerpo {'nombre_usuario': ..., 'contrasena': ...}
+    datos = request.get_json(silent=True) or {}
+    nombre, texto = datos.get('nombre_usuario'), datos.get('contrasena')
+    if not isinstance(nombre, str) or not isinstance(texto, str):
+        abort(400, message="Se esperan 'nombre_usuario' y 'contrasena'")
+    return nombre, texto
+
+# Se crea la clase VistaLogin para el metodo post (iniciar sesión)
+class VistaLogin(Recurso): # Como es un recurso, hereda de Resource
+    def post(self): # Metodo post, regresa el usuario si la contraseña es correcta, 401 si no
+        nombre, texto = _credenciales()
+        usuarios = self.sesion.scalars(db.select(Usuario).where(Usuario.nombre_usuario == nombre).order_by(Usuario.id)).all() # Usa ix_usuario_nombre
+        for usuario in usuarios: # El nombre no es único, se prueba la contraseña de cada usuario con ese nombre
+            if usuario.verificar_contrasena(texto):
+                if self.sesion.is_modified(usuario): # Se volvió a cifrar con el algoritmo y el costo actuales, el commit sube la versión del usuario
+                    self.sesion.commit()
+                    invalidar_usuario(self.sesion, usuario.id)() # El usuario en el cache tiene el ETag de la versión anterior, un If-Match con él daría 412
+                return usuario_schema.dump(usuario) # Se regresa el usuario, sin la contraseña
+        if not usuarios:
+            contrasenas.cifrar(texto) # Tarda lo mismo que verificar, así el tiempo de la respuesta no dice si el usuario existe
+        abort(401, message='Nombre de usuario o contraseña incorrectos')
+
+### Para la vista del cache
+
+# Se crea la clase VistaCache para consultar los contadores de aciertos y fallos del cache
+class VistaCache(Recurso): # Como es un recurso, hereda de Resource
+    def get(self): # Metodo get (estadisticas del cache)
+        return cache.estadisticas() # Se regresan los aciertos, fallos y la tasa de aciertos
+
+
+### Para la vista de las métricas
+
+# Se crea la clase VistaMetricas para exponer los histogramas de las requests a Prometheus
+class VistaMetricas(Recurso): # Como es un recurso, hereda de Resource
+    def get(self): # Metodo get (métricas en formato de texto de Prometheus)
+        return Response(metricas.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8') # Se regresa texto plano, no json
+
+
+### Para la vista de la búsqueda
+
+# Se crea la clase VistaBuscar para el metodo get (buscar canciones y albumes por texto)
+class VistaBuscar(Recurso): # Como es un recurso, hereda de Resource
+    def get(self): # Metodo get, /buscar?q=texto&limit=20, busca en titulo e interprete de las canciones y en titulo y descripcion de los albumes
+        texto = request.args.get('q', '')
+        try:
+            limite = min(int(request.args.get('limit', 20)), 100) # Máximo 100 resultados por tipo
+        except ValueError:
+            abort(400, message="El parametro 'limit' debe ser un entero")
+        resultado = {}
+        for clave, modelo, esquema in (('canciones', Cancion, cancion_schema), ('albumes', Album, album_schema)):
+            consulta = buscar(modelo, texto, limite)
+            if consulta is None: # El texto no tiene palabras para buscar
+                resultado[clave] = []
+                continue
+            consulta = consulta.options(*opciones_carga(modelo, esquema)) # Las relaciones se cargan por lotes
+            resultado[clave] = esquema.dump(self.sesion.scalars(consulta).all(), many=True) # Se regresan ordenados por relevancia
+        return resultado
+
+### Para las vistas de la importación masiva
+
+def _formato_request(): # Formato del cuerpo según el Content-Type de la request
+    formato = FORMATOS.get(request.mimetype)
+    if formato is None:
+        abort(415, message='Content-Type no soportado, debe ser uno de: {}'.format(', '.join(FORMATOS)))
+    return formato
+
+# Se crea la clase VistaCancionesBulk para el metodo post (crear muchas canciones)
+class VistaCancionesBulk(Recurso): # Como es un recurso, hereda de Resource
+    asincrona = False # La importación usa db.session, en el modo ASGI la atiende la app de flask en un hilo
+
+    def post(self): # Metodo post (importar canciones), el cuerpo es un arreglo JSON, NDJSON o CSV y se lee como flujo
+        return importar('canciones', leer_filas(request.stream, _formato_request())) # Se regresa cuántas canciones se insertaron y los errores por fila
+
+# Se crea la clase VistaAlbumesBulk para el metodo post (crear muchos albumes)
+class VistaAlbumesBulk(Recurso): # Como es un recurso, hereda de Resource
+    asincrona = False
+
+    def post(self): # Metodo post (importar albumes), el cuerpo es un arreglo JSON, NDJSON o CSV y se lee como flujo
+        return importar('albumes', leer_filas(request.stream, _formato_request())) # Se regresa cuántos albumes se insertaron y los errores por fila
@@ -0,0 +1,64 @@
+# Fixtures de las pruebas: cada prueba tiene su propia app, con una db SQLite en memoria y su propio cache
+
+# Se importa pytest para definir las fixtures
+import pytest
+
+# Se importa event de sqlalchemy para contar las sentencias que llegan a la db
+from sqlalchemy import event
+
+# Se importan la fábrica de la app y la base de datos
+from flaskr import create_app
+from flaskr.models import db, Cancion, Album
+
+
+# Cifrado sin pool de procesos y con un costo bajo, así las pruebas de usuarios no tardan
+CONFIGURACION = {'CONTRASENA_PROCESOS': 0, 'CONTRASENA_COSTO': {'n': 2 ** 10}}
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing', **CONFIGURACION) # Cada app tiene su propio cache en memoria
+    with app.app_context(): # La db en memoria vive mientras viva el motor, las requests usan la misma conexión
+        db.create_all(bind_key=None) # Solo la db principal, otra app de las pruebas pudo registrar el bind de lectura
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def sentencias(app): # Lista con el SQL de cada sentencia que se ejecuta en la db, se vacía con sentencias.clear()
+    ejecutadas = []
+    with app.app_context():
+        motor = db.engine
+    registrar = lambda conexion, cursor, sql, *args: ejecutadas.append(sql)
+    event.listen(motor, 'before_cursor_execute', registrar)
+    yield ejecutadas
+    event.remove(motor, 'before_cursor_execute', registrar)
+
+
+@pytest.fixture
+def cancion(cliente): # Crea una canción y regresa la respuesta del POST, con el ETag de su versión 1
+    return cliente.post('/canciones', json={'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+
+
+@pytest.fixture
+def canciones(cliente): # Crea cinco canciones, de 1:00 a 5:00
+    for numero in range(1, 6):
+        cliente.post('/canciones', json={'titulo': 'T{}'.format(numero), 'minutos': numero, 'segundos': 0, 'interprete': 'X'})
+
+
+@pytest.fixture
+def album(app, cliente): # Un usuario con un album que incluye la canción 1
+    cliente.post('/canciones', json={'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+    cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'p'})
+    cliente.post('/albumes', json={'titulo': 'Al', 'anio': 2000, 'descripcion': 'd', 'medio': 'CD'})
+    with app.app_context():
+        album = db.session.get(Album, 1)
+        album.usuario_id = 1
+        album.canciones.append(db.session.get(Cancion, 1))
+        db.session.commit()
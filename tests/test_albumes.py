@@ -0,0 +1,68 @@
+# Pruebas de las canciones de un album y de los totales que mantienen los triggers
+
+# Se importan la fábrica de la app, la base de datos y los triggers de los totales
+from flaskr import create_app
+from flaskr.models import db
+from flaskr.models.agregados import TRIGGERS
+
+
+def _totales(cliente, id_album=1):
+    album = cliente.get('/album/{}'.format(id_album)).json
+    return album['num_canciones'], album['duracion_total']
+
+
+def test_agregar_y_quitar_canciones(cliente, canciones):
+    cliente.post('/albumes', json={'titulo': 'Al', 'anio': 2000, 'descripcion': 'd', 'medio': 'CD'})
+    respuesta = cliente.post('/album/1/canciones', json={'canciones': [1, 2, 2, 99]}) # Los repetidos y los que no existen se ignoran
+    assert respuesta.status_code == 200
+    assert respuesta.json['canciones'] == [1, 2]
+    cliente.post('/album/1/canciones?canciones=2,3') # La 2 ya estaba
+    assert [cancion['id'] for cancion in cliente.get('/album/1/canciones').json] == [1, 2, 3]
+    assert cliente.get('/cancion/3').json['albums'] == [1] # Se sacó del cache
+    respuesta = cliente.delete('/album/1/canciones', json={'canciones': [1, 3]})
+    assert respuesta.json['canciones'] == [2]
+    assert cliente.get('/cancion/1').json['albums'] == []
+
+
+def test_ids_invalidos(cliente, canciones):
+    cliente.post('/albumes', json={'titulo': 'Al', 'anio': 2000, 'descripcion': 'd', 'medio': 'CD'})
+    assert cliente.post('/album/1/canciones', json={}).status_code == 400
+    assert cliente.post('/album/1/canciones', json={'canciones': ['x']}).status_code == 400
+    for cuerpo in ([1, 2], '1', 3): # Cuerpos JSON que no son un objeto
+        respuesta = cliente.delete('/album/1/canciones', json=cuerpo)
+        assert respuesta.status_code == 400
+        assert respuesta.json['message'] == "Se espera una lista de ids en 'canciones'"
+    assert cliente.post('/album/2/canciones', json={'canciones': [1]}).status_code == 404
+
+
+def test_triggers_mantienen_los_totales(cliente, canciones):
+    cliente.post('/albumes', json={'titulo': 'Al', 'anio': 2000, 'descripcion': 'd', 'medio': 'CD'})
+    assert _totales(cliente) == (0, 0)
+    cliente.post('/album/1/canciones', json={'canciones': [1, 2, 3]})
+    assert _totales(cliente) == (3, 60 + 120 + 180)
+    cliente.delete('/album/1/canciones', json={'canciones': [2]})
+    assert _totales(cliente) == (2, 60 + 180)
+    cliente.put('/cancion/3', json={'minutos': 10, 'segundos': 5}) # Cambia la duración de una canción del album
+    assert _totales(cliente) == (2, 60 + 605)
+    cliente.delete('/cancion/1') # Se borra una canción que está en el album
+    assert _totales(cliente) == (1, 605)
+
+
+def test_init_db_agrega_las_columnas_y_calcula_los_totales(tmp_path):
+    app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'musica.db'))
+    with app.app_context():
+        db.create_all(bind_key=None)
+        with db.engine.begin() as conexion: # Una db de antes de los totales: sin las columnas ni los triggers
+            for nombre in TRIGGERS:
+                conexion.exec_driver_sql('DROP TRIGGER {}'.format(nombre))
+            conexion.exec_driver_sql('ALTER TABLE album DROP COLUMN num_canciones')
+            conexion.exec_driver_sql('ALTER TABLE album DROP COLUMN duracion_total')
+            conexion.exec_driver_sql("INSERT INTO cancion (titulo, minutos, segundos, interprete) VALUES ('a', 1, 30, 'x'), ('b', 2, 0, 'x')")
+            conexion.exec_driver_sql("INSERT INTO album (titulo, anio, descripcion, medio) VALUES ('Al', 2000, 'd', 'CD')")
+            conexion.exec_driver_sql('INSERT INTO album_cancion (album_id, cancion_id) VALUES (1, 1), (1, 2)')
+    resultado = app.test_cli_runner().invoke(args=['init-db'])
+    assert resultado.exit_code == 0, resultado.output
+    assert 'Columna agregada: album.num_canciones' in resultado.output
+    assert _totales(app.test_client()) == (2, 210)
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,110 @@
+# Pruebas del modo ASGI: las mismas vistas corren en el greenlet de la AsyncSession y responden igual que en el modo WSGI
+
+# Se importan asyncio y json para llamar a la aplicación ASGI y leer sus respuestas
+import asyncio
+import json
+
+# Se importa pytest para saltar las pruebas si no están las dependencias del modo ASGI
+import pytest
+
+pytest.importorskip('aiosqlite')
+
+# Se importan la aplicación ASGI, la base de datos y la configuración de las pruebas
+from flaskr.asgi import create_app_asgi
+from flaskr.models import db
+from conftest import CONFIGURACION
+
+
+async def _request(app, metodo, ruta, cuerpo=None, cabeceras=None): # Llama a la aplicación ASGI como lo haría uvicorn, regresa (código, cabeceras, cuerpo)
+    ruta, _, query = ruta.partition('?')
+    if isinstance(cuerpo, str): # Texto tal cual, por ejemplo NDJSON, si no el cuerpo se manda como json
+        datos = cuerpo.encode()
+    else:
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else b''
+    cabeceras = dict({'content-type': 'application/json', 'host': 'localhost'}, **(cabeceras or {}))
+    scope = {'type': 'http', 'method': metodo, 'path': ruta, 'query_string': query.encode(), 'headers': [(nombre.encode(), valor.encode()) for nombre, valor in cabeceras.items()]}
+    mensajes = iter([{'type': 'http.request', 'body': datos, 'more_body': False}])
+    enviados = []
+
+    async def recibir():
+        return next(mensajes)
+
+    async def enviar(mensaje):
+        enviados.append(mensaje)
+
+    await app(scope, recibir, enviar)
+    inicio = enviados[0]
+    return inicio['status'], {nombre.decode(): valor.decode() for nombre, valor in inicio['headers']}, b''.join(mensaje.get('body', b'') for mensaje in enviados[1:])
+
+
+@pytest.fixture
+def asgi(tmp_path): # Una db en archivo: el motor síncrono crea las tablas y el asíncrono (aiosqlite) abre el mismo archivo
+    app = create_app_asgi('testing', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'musica.db'), **CONFIGURACION)
+    with app.flask.app_context():
+        db.create_all(bind_key=None) # Solo la db principal, otra app de las pruebas pudo registrar el bind de lectura
+    yield app
+    for motor in app.motores.values():
+        asyncio.run(motor.dispose())
+
+
+def test_misma_respuesta_que_wsgi(asgi):
+    async def pruebas():
+        codigo, cabeceras, cuerpo = await _request(asgi, 'POST', '/canciones', {'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+        assert codigo == 200
+        with asgi.flask.app_context():
+            get = asgi.flask.test_client().get('/cancion/1')
+        assert cuerpo == get.data
+        codigo, cabeceras, cuerpo = await _request(asgi, 'GET', '/cancion/1')
+        assert (cuerpo, cabeceras['etag']) == (get.data, get.headers['ETag'])
+        assert 'db;dur=' in cabeceras['server-timing'] # Los after_request de la app también corren en el modo ASGI
+        codigo, cabeceras, _ = await _request(asgi, 'GET', '/cancion/1', cabeceras={'if-none-match': cabeceras['etag']})
+        assert codigo == 304
+        assert (await _request(asgi, 'GET', '/cancion/9'))[0] == 404
+    asyncio.run(pruebas())
+
+
+def test_escrituras_en_la_sesion_de_la_vista(asgi): # PUT, DELETE y el album con sus canciones, todo en la sesión síncrona de la AsyncSession
+    async def pruebas():
+        await _request(asgi, 'POST', '/canciones', {'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+        codigo, _, cuerpo = await _request(asgi, 'PUT', '/cancion/1', {'minutos': 5})
+        assert (codigo, json.loads(cuerpo)['minutos']) == (200, 5)
+        assert json.loads((await _request(asgi, 'GET', '/cancion/1'))[2])['minutos'] == 5 # El cache se invalidó después del commit
+        await _request(asgi, 'POST', '/albumes', {'titulo': 'A', 'anio': 2000, 'descripcion': 'd', 'medio': 'CD'})
+        codigo, _, cuerpo = await _request(asgi, 'POST', '/album/1/canciones', {'canciones': [1]})
+        assert codigo == 200
+        assert json.loads((await _request(asgi, 'GET', '/album/1'))[2])['duracion_total'] == 304
+        assert (await _request(asgi, 'DELETE', '/cancion/1'))[0] == 204
+        assert (await _request(asgi, 'GET', '/cancion/1'))[0] == 404
+        assert json.loads((await _request(asgi, 'GET', '/album/1'))[2])['num_canciones'] == 0
+    asyncio.run(pruebas())
+
+
+def test_if_match_viejo_responde_412(asgi):
+    async def pruebas():
+        _, cabeceras, _ = await _request(asgi, 'POST', '/canciones', {'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+        codigo, nuevas, cuerpo = await _request(asgi, 'PATCH', '/cancion/1', {'minutos': 5}, {'if-match': cabeceras['etag']})
+        assert codigo == 200
+        assert nuevas['etag'].startswith('"2-')
+        assert (await _request(asgi, 'PATCH', '/cancion/1', {'minutos': 6}, {'if-match': cabeceras['etag']}))[0] == 412
+        assert json.loads((await _request(asgi, 'GET', '/cancion/1'))[2])['minutos'] == 5
+    asyncio.run(pruebas())
+
+
+def test_streaming_e_importacion(asgi): # La importación la atiende la app de flask en un hilo, el NDJSON se genera en el greenlet de la sesión
+    async def pruebas():
+        filas = '\n'.join(json.dumps({'titulo': str(numero), 'minutos': 1, 'segundos': 2, 'interprete': 'x'}) for numero in range(3))
+        codigo, _, cuerpo = await _request(asgi, 'POST', '/canciones/bulk', filas, {'content-type': 'application/x-ndjson'})
+        assert codigo == 200
+        assert json.loads(cuerpo)['insertados'] == 3
+        codigo, cabeceras, cuerpo = await _request(asgi, 'GET', '/canciones?formato=ndjson')
+        assert cabeceras['content-type'].startswith('application/x-ndjson')
+        assert [json.loads(linea)['titulo'] for linea in cuerpo.decode().splitlines()] == ['0', '1', '2']
+    asyncio.run(pruebas())
+
+
+def test_login_cifra_en_el_greenlet(asgi):
+    async def pruebas():
+        assert (await _request(asgi, 'POST', '/usuarios', {'nombre_usuario': 'u', 'contrasena': 'p'}))[0] == 200
+        assert (await _request(asgi, 'POST', '/login', {'nombre_usuario': 'u', 'contrasena': 'p'}))[0] == 200
+        assert (await _request(asgi, 'POST', '/login', {'nombre_usuario': 'u', 'contrasena': 'q'}))[0] == 401
+    asyncio.run(pruebas())
@@ -0,0 +1,37 @@
+# Pruebas de los benchmarks: el catálogo sintético es determinista y la comparación contra la base solo marca regresiones reales
+
+# Se importan la fábrica de la app, la base de datos y los modelos
+from flaskr import create_app
+from flaskr.models import db, Cancion, Album, album_cancion
+
+# Se importan el generador del catálogo y la comparación de la suite de la API
+from benchmarks.catalogo import poblar, proporcional
+from benchmarks.api import comparar
+
+
+def _catalogo(semilla): # Todas las filas de un catálogo chico generado con la semilla
+    app = create_app('testing', CACHE_BACKEND='nulo')
+    with app.app_context():
+        db.create_all(bind_key=None)
+        conteo = poblar(semilla=semilla, **proporcional(400))
+        filas = [db.session.execute(db.select(*tabla.c).order_by(*tabla.c)).all() for tabla in (Cancion.__table__, Album.__table__, album_cancion)]
+        db.session.remove()
+    with app.app_context():
+        db.engine.dispose()
+    return conteo, filas
+
+
+def test_catalogo_determinista():
+    conteo, filas = _catalogo(1)
+    assert conteo == {'usuarios': 2, 'albumes': 40, 'canciones': 400}
+    assert [len(tabla) for tabla in filas[:2]] == [400, 40]
+    assert _catalogo(1) == (conteo, filas)
+    assert _catalogo(2)[1] != filas
+
+
+def test_comparar_con_tolerancia_y_minimo():
+    base = {'resultados': {'chico': {'operaciones': {'GET /canciones': {'p50_ms': 10.0}, 'GET /cancion/<id>': {'p50_ms': 0.2}}}}}
+    resultados = {'chico': {'operaciones': {'GET /canciones': {'p50_ms': 13.0}, 'GET /cancion/<id>': {'p50_ms': 0.4}}}}
+    regresiones = comparar(resultados, base, 0.2, 0.5) # +30% en la lista, +100% pero solo 0.2 ms en el detalle
+    assert len(regresiones) == 1 and regresiones[0].startswith('chico GET /canciones')
+    assert comparar(resultados, base, 0.5, 0.5) == []
@@ -0,0 +1,115 @@
+# Pruebas del borrado: cascadas de la db, borrado diferido con su purga, y la reconstrucción de las tablas viejas en init-db
+
+# Se importa sqlite3 para crear una db con el esquema anterior, sin ON DELETE CASCADE
+import sqlite3
+
+# Se importa pytest para las fixtures de las apps con borrado diferido
+import pytest
+
+# Se importan la fábrica de la app, la base de datos, los modelos y la purga
+from flaskr import create_app
+from flaskr.models import db, Cancion, Album, Usuario, album_cancion, purgar
+from conftest import CONFIGURACION
+
+# Esquema de las tablas antes de las cascadas, las llaves foráneas no tenían ON DELETE
+ESQUEMA_VIEJO = """
+CREATE TABLE usuario (id INTEGER PRIMARY KEY, nombre_usuario VARCHAR(128), contrasena VARCHAR(128));
+CREATE TABLE cancion (id INTEGER PRIMARY KEY, titulo VARCHAR(128), minutos INTEGER, segundos INTEGER, interprete VARCHAR(128));
+CREATE TABLE album (id INTEGER PRIMARY KEY, titulo VARCHAR(256), anio INTEGER, descripcion VARCHAR(256), medio VARCHAR(8), usuario_id INTEGER REFERENCES usuario (id));
+CREATE TABLE album_cancion (album_id INTEGER REFERENCES album (id), cancion_id INTEGER REFERENCES cancion (id), PRIMARY KEY (album_id, cancion_id));
+INSERT INTO usuario VALUES (1, 'u', 'p');
+INSERT INTO cancion VALUES (1, 'Hola', 3, 4, 'X'), (2, 'Adios', 1, 0, 'Y');
+INSERT INTO album VALUES (1, 'A', 2000, 'd', 'CD', 1), (2, 'Huerfano', 2001, 'd', 'CD', 9);
+INSERT INTO album_cancion VALUES (1, 1), (1, 2), (1, 7), (5, 1);
+"""
+
+
+def _filas(app, tabla): # Filas de la tabla, incluidas las marcadas por el borrado diferido
+    with app.app_context():
+        return db.session.execute(db.select(tabla).order_by(*tabla.primary_key)).all()
+
+
+def test_borrar_usuario_borra_sus_albumes_en_cascada(app, cliente, album):
+    assert cliente.delete('/usuario/1').status_code == 200
+    assert cliente.get('/album/1').status_code == 404
+    assert _filas(app, album_cancion) == []
+    assert cliente.get('/cancion/1').json['albums'] == [] # La canción no se borra, solo sale del album
+
+
+def test_borrar_cancion_actualiza_los_totales(cliente, album):
+    assert cliente.delete('/cancion/1').status_code == 204
+    assert cliente.get('/album/1').json['num_canciones'] == 0
+    assert cliente.get('/album/1').json['duracion_total'] == 0
+    assert cliente.delete('/cancion/1').status_code == 404
+    assert cliente.delete('/album/9').status_code == 404
+
+
+@pytest.fixture
+def diferida(tmp_path): # Una app con borrado diferido sobre un archivo: el hilo de la purga abre su propia conexión
+    app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'musica.db'), BORRADO_DIFERIDO=True, **CONFIGURACION)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_borrado_diferido_oculta_y_la_purga_borra(diferida):
+    cliente = diferida.test_client()
+    cliente.post('/canciones', json={'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+    cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'p'})
+    cliente.post('/albumes', json={'titulo': 'A', 'anio': 2000, 'descripcion': 'd', 'medio': 'CD'})
+    with diferida.app_context():
+        db.session.get(Album, 1).usuario_id = 1
+        db.session.commit()
+    cliente.post('/album/1/canciones', json={'canciones': [1]})
+
+    with diferida.app_context(): # Se marca a mano, igual que un DELETE pero sin despertar al hilo de la purga
+        db.session.execute(db.update(Usuario).where(Usuario.id == 1).values(eliminado=True))
+        db.session.execute(db.update(Album).where(Album.usuario_id == 1).values(eliminado=True))
+        db.session.commit()
+    assert cliente.get('/usuario/1').status_code == 404
+    assert cliente.get('/album/1').status_code == 404
+    assert cliente.get('/albumes').json == []
+    assert cliente.get('/cancion/1').json['albums'] == [] # El album marcado tampoco aparece en las relaciones
+    assert len(_filas(diferida, Album.__table__)) == 1 # La fila sigue en la db hasta la purga
+
+    resultado = diferida.test_cli_runner().invoke(args=['purgar'])
+    assert resultado.exit_code == 0, resultado.output
+    assert _filas(diferida, Album.__table__) == _filas(diferida, Usuario.__table__) == _filas(diferida, album_cancion) == []
+    assert len(_filas(diferida, Cancion.__table__)) == 1
+
+
+def test_delete_diferido_responde_y_la_purga_termina(diferida):
+    cliente = diferida.test_client()
+    cliente.post('/canciones', json={'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+    assert cliente.delete('/cancion/1').status_code == 204
+    assert cliente.get('/cancion/1').status_code == 404
+    assert cliente.delete('/cancion/1').status_code == 404 # Ya marcada, no se marca dos veces
+    with diferida.app_context():
+        purgar() # Lo que el hilo no haya alcanzado a borrar
+    assert _filas(diferida, Cancion.__table__) == []
+
+
+def test_init_db_reconstruye_las_tablas_sin_cascada(tmp_path):
+    ruta = tmp_path / 'vieja.db'
+    with sqlite3.connect(ruta) as conexion:
+        conexion.executescript(ESQUEMA_VIEJO)
+    app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(ruta), **CONFIGURACION)
+    resultado = app.test_cli_runner().invoke(args=['init-db'])
+    assert resultado.exit_code == 0, resultado.output
+    assert 'Tabla reconstruida con ON DELETE CASCADE: album_cancion (2 filas huerfanas descartadas)' in resultado.output
+
+    with sqlite3.connect(ruta) as conexion:
+        for tabla in ('album', 'album_cancion'):
+            assert {fila[6] for fila in conexion.execute('PRAGMA foreign_key_list({})'.format(tabla))} == {'CASCADE'}
+    assert _filas(app, album_cancion) == [(1, 1), (1, 2)]
+    assert [fila.usuario_id for fila in _filas(app, Album.__table__)] == [1, None] # El usuario 9 no existe
+    cliente = app.test_client()
+    assert cliente.get('/album/1').json['num_canciones'] == 2 # Los triggers de los totales siguen en su lugar
+    cliente.delete('/cancion/2')
+    assert cliente.get('/album/1').json['duracion_total'] == 184
+    resultado = app.test_cli_runner().invoke(args=['selftest'])
+    assert resultado.exit_code == 0 and 'FALLO' not in resultado.output, resultado.output
+    with app.app_context():
+        db.engine.dispose()
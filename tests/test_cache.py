@@ -0,0 +1,52 @@
+# Pruebas del cache de respuestas: 304, y que cada escritura saque del cache lo que cambió
+
+
+def test_if_none_match_responde_304(cliente, album):
+    etag = cliente.get('/cancion/1').headers['ETag']
+    respuesta = cliente.get('/cancion/1', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 304
+    assert respuesta.headers['ETag'] == etag
+    lista = cliente.get('/canciones?limit=1')
+    assert cliente.get('/canciones?limit=1', headers={'If-None-Match': lista.headers['ETag']}).status_code == 304
+
+
+def test_estadisticas(cliente, album):
+    cliente.get('/cancion/1')
+    cliente.get('/cancion/1')
+    assert cliente.get('/cache').json['aciertos'] >= 1
+
+
+def test_post_invalida_las_listas(cliente, album):
+    assert len(cliente.get('/canciones').json) == 1
+    cliente.post('/canciones', json={'titulo': 'Adios', 'minutos': 2, 'segundos': 1, 'interprete': 'Y'})
+    assert len(cliente.get('/canciones').json) == 2
+
+
+def test_put_invalida_el_recurso(cliente, album):
+    etag = cliente.get('/cancion/1').headers['ETag']
+    cliente.put('/cancion/1', json={'titulo': 'Adios'})
+    respuesta = cliente.get('/cancion/1', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 200
+    assert respuesta.json['titulo'] == 'Adios'
+
+
+def test_delete_de_cancion_invalida_sus_albumes(cliente, album):
+    assert cliente.get('/album/1').json['canciones'] == [1]
+    assert cliente.delete('/cancion/1').status_code == 204
+    assert cliente.get('/album/1').json['canciones'] == []
+    assert cliente.get('/cancion/1').status_code == 404
+
+
+def test_delete_de_album_invalida_su_usuario_y_sus_canciones(cliente, album):
+    assert cliente.get('/usuario/1').json['albums'] == [1]
+    assert cliente.get('/cancion/1').json['albums'] == [1]
+    cliente.delete('/album/1')
+    assert cliente.get('/usuario/1').json['albums'] == []
+    assert cliente.get('/cancion/1').json['albums'] == []
+
+
+def test_delete_de_usuario_invalida_sus_albumes(cliente, album):
+    cliente.get('/album/1')
+    cliente.delete('/usuario/1')
+    assert cliente.get('/album/1').status_code == 404
+    assert cliente.get('/cancion/1').json['albums'] == []
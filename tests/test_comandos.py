@@ -0,0 +1,48 @@
+# Pruebas de los comandos de consola: crear la app no toca la db, init-db crea las tablas y selftest no deja filas
+
+# Se importa inspect de sqlalchemy para ver las tablas que quedaron en la db
+from sqlalchemy import inspect
+
+# Se importan la fábrica de la app, la base de datos y los modelos
+from flaskr import create_app
+from flaskr.models import db, Cancion, Usuario, Album
+from conftest import CONFIGURACION
+
+
+def _app(tmp_path):
+    return create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'musica.db'), **CONFIGURACION)
+
+
+def test_crear_la_app_no_abre_conexiones(tmp_path):
+    app = _app(tmp_path)
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 0 and db.engine.pool.checkedout() == 0
+    assert not (tmp_path / 'musica.db').exists()
+
+
+def test_init_db_crea_las_tablas(tmp_path):
+    app = _app(tmp_path)
+    resultado = app.test_cli_runner().invoke(args=['init-db'])
+    assert resultado.exit_code == 0, resultado.output
+    assert app.test_cli_runner().invoke(args=['init-db']).exit_code == 0 # Correrlo otra vez no falla
+    with app.app_context():
+        assert {'cancion', 'album', 'usuario', 'album_cancion'} <= set(inspect(db.engine).get_table_names())
+        db.engine.dispose()
+
+
+def test_selftest_no_deja_filas(tmp_path):
+    app = _app(tmp_path)
+    app.test_cli_runner().invoke(args=['init-db'])
+    resultado = app.test_cli_runner().invoke(args=['selftest'])
+    assert resultado.exit_code == 0, resultado.output
+    assert 'FALLO' not in resultado.output and 'Selftest completado' in resultado.output
+    with app.app_context():
+        assert db.session.query(Cancion).count() == db.session.query(Usuario).count() == db.session.query(Album).count() == 0
+        db.engine.dispose()
+
+
+def test_selftest_sin_tablas_falla(tmp_path):
+    app = _app(tmp_path)
+    assert app.test_cli_runner().invoke(args=['selftest']).exit_code != 0
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,104 @@
+# Pruebas de los cambios concurrentes: PUT y PATCH con If-Match, 412, 404 y el ETag de cada versión
+
+# Se importa pytest para repetir las pruebas con PUT y con PATCH
+import pytest
+
+
+@pytest.mark.parametrize('metodo', ['put', 'patch'])
+def test_if_match_actual_aplica_el_cambio(cliente, cancion, metodo):
+    respuesta = getattr(cliente, metodo)('/cancion/1', json={'minutos': 10}, headers={'If-Match': cancion.headers['ETag']})
+    assert respuesta.status_code == 200
+    assert respuesta.json['minutos'] == 10
+    assert respuesta.json['version'] == 2
+    assert respuesta.headers['ETag'].startswith('"2-')
+
+
+def test_etag_de_la_escritura_es_el_del_get(cliente, album):
+    respuesta = cliente.put('/cancion/1', json={'titulo': 'Adios'})
+    get = cliente.get('/cancion/1')
+    assert respuesta.headers['ETag'] == get.headers['ETag']
+    assert respuesta.json == get.json == {'albums': [1], 'id': 1, 'titulo': 'Adios', 'minutos': 3, 'segundos': 4, 'interprete': 'X', 'version': 2}
+
+
+def test_etags_encadenados(cliente, cancion): # Cada escritura regresa el ETag con el que se hace la siguiente
+    etag = cancion.headers['ETag']
+    for minutos in range(5, 8):
+        respuesta = cliente.patch('/cancion/1', json={'minutos': minutos}, headers={'If-Match': etag})
+        assert respuesta.status_code == 200
+        etag = respuesta.headers['ETag']
+    assert cliente.get('/cancion/1').json['version'] == 4
+
+
+@pytest.mark.parametrize('metodo', ['put', 'patch'])
+def test_if_match_viejo_responde_412_sin_cambiar_nada(cliente, cancion, metodo):
+    cliente.put('/cancion/1', json={'minutos': 5}) # Otro cliente cambia la canción
+    respuesta = getattr(cliente, metodo)('/cancion/1', json={'minutos': 10}, headers={'If-Match': cancion.headers['ETag']})
+    assert respuesta.status_code == 412
+    actual = cliente.get('/cancion/1').json
+    assert actual['minutos'] == 5
+    assert actual['version'] == 2
+
+
+def test_if_match_con_varias_versiones(cliente, cancion):
+    respuesta = cliente.patch('/cancion/1', json={'titulo': 'y'}, headers={'If-Match': '"7-a", ' + cancion.headers['ETag']})
+    assert respuesta.status_code == 200
+
+
+@pytest.mark.parametrize('if_match', ['W/"1-a"', '"otro"'])
+def test_etag_debil_o_ajeno_no_coincide(cliente, cancion, if_match):
+    assert cliente.patch('/cancion/1', json={'titulo': 'y'}, headers={'If-Match': if_match}).status_code == 412
+
+
+@pytest.mark.parametrize('cabeceras', [{}, {'If-Match': '*'}])
+def test_sin_if_match_gana_el_ultimo_cambio(cliente, cancion, cabeceras):
+    cliente.put('/cancion/1', json={'minutos': 5})
+    respuesta = cliente.put('/cancion/1', json={'minutos': 10}, headers=cabeceras)
+    assert respuesta.status_code == 200
+    assert respuesta.json['version'] == 3
+
+
+def test_patch_sin_campos_no_sube_la_version(cliente, cancion):
+    respuesta = cliente.patch('/cancion/1', json={}, headers={'If-Match': cancion.headers['ETag']})
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] == cancion.headers['ETag']
+    assert cliente.patch('/cancion/1', json={}, headers={'If-Match': '"2-a"'}).status_code == 412
+
+
+@pytest.mark.parametrize('cabeceras', [{}, {'If-Match': '"1-a"'}])
+@pytest.mark.parametrize('ruta', ['/cancion/9', '/album/9', '/usuario/9'])
+def test_id_que_no_existe_responde_404(cliente, ruta, cabeceras):
+    assert cliente.patch(ruta, json={}, headers=cabeceras).status_code == 404
+    assert cliente.put(ruta, json={'titulo': 'y', 'nombre_usuario': 'y'}, headers=cabeceras).status_code == 404
+
+
+def test_put_es_una_sola_sentencia(cliente, album, sentencias): # UPDATE ... RETURNING, sin SELECT antes ni después
+    sentencias.clear()
+    respuesta = cliente.put('/cancion/1', json={'minutos': 10}, headers={'If-Match': '"1-a"'})
+    assert respuesta.status_code == 200
+    assert respuesta.json['albums'] == [1]
+    assert len(sentencias) == 1
+    assert sentencias[0].startswith('UPDATE cancion') and 'RETURNING' in sentencias[0]
+
+
+def test_put_regresa_lo_mismo_que_el_get(cliente, album):
+    respuesta = cliente.put('/album/1', json={'anio': 1999})
+    assert respuesta.json == cliente.get('/album/1').json
+    assert respuesta.headers['ETag'] == cliente.get('/album/1').headers['ETag']
+
+
+@pytest.mark.parametrize('metodo', ['post', 'delete'])
+def test_canciones_del_album_regresan_su_etag(cliente, album, metodo):
+    respuesta = getattr(cliente, metodo)('/album/1/canciones', json={'canciones': [1]})
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] == cliente.get('/album/1').headers['ETag']
+    assert cliente.put('/album/1', json={'anio': 1999}, headers={'If-Match': respuesta.headers['ETag']}).status_code == 200
+
+
+
+def test_usuario_con_if_match(cliente):
+    creado = cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'p'})
+    assert 'contrasena' not in creado.json
+    cambio = cliente.put('/usuario/1', json={'contrasena': 'q'}, headers={'If-Match': creado.headers['ETag']})
+    assert cambio.status_code == 200
+    assert cliente.put('/usuario/1', json={'nombre_usuario': 'v'}, headers={'If-Match': creado.headers['ETag']}).status_code == 412
+    assert cliente.post('/login', json={'nombre_usuario': 'u', 'contrasena': 'q'}).status_code == 200
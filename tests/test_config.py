@@ -0,0 +1,80 @@
+# Pruebas de los perfiles de configuración: los PRAGMA de SQLite y el bind de solo lectura de producción
+
+# Se importa text de sqlalchemy para leer los PRAGMA de cada conexión
+from sqlalchemy import text
+
+# Se importan la fábrica de la app, la base de datos y la configuración de SQLite
+from flaskr import create_app
+from flaskr.config import solo_lectura
+from flaskr.models import db
+from flaskr.cache import cache, CacheNulo
+
+
+def _app_produccion(ruta): # El perfil de producción apuntando a una db temporal, create_app abre el mismo archivo como bind de lectura
+    app = create_app('production', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(ruta))
+    with app.app_context():
+        db.create_all(bind_key=None)
+    return app
+
+
+def _pragma(motor, nombre):
+    with motor.connect() as conexion:
+        return conexion.execute(text('PRAGMA ' + nombre)).scalar()
+
+
+def test_perfil_de_pruebas_usa_una_db_en_memoria():
+    app = create_app('testing')
+    assert app.config['TESTING']
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///:memory:'
+    assert 'lectura' not in app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def test_uri_desolo_lectura():
+    assert solo_lectura('sqlite:///canciones.db') == 'sqlite:///file:canciones.db?mode=ro&uri=true'
+    assert solo_lectura('sqlite:///:memory:') is None
+    assert solo_lectura('postgresql://localhost/canciones') is None
+
+
+def test_el_bind_de_lectura_usa_la_uri_final(tmp_path):
+    app = _app_produccion(tmp_path / 'musica.db')
+    assert app.config['SQLALCHEMY_BINDS']['lectura'] == solo_lectura('sqlite:///{}'.format(tmp_path / 'musica.db'))
+    otra = create_app('production', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'otra.db'), SQLALCHEMY_DATABASE_READ_URI='sqlite:///{}'.format(tmp_path / 'replica.db'))
+    assert otra.config['SQLALCHEMY_BINDS']['lectura'].endswith('replica.db') # La explícita no se reemplaza
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_pragmas_de_produccion(tmp_path):
+    app = _app_produccion(tmp_path / 'musica.db')
+    with app.app_context():
+        assert _pragma(db.engine, 'journal_mode') == 'wal'
+        assert _pragma(db.engine, 'synchronous') == 1 # NORMAL
+        assert _pragma(db.engine, 'busy_timeout') == 5000
+        assert _pragma(db.engines['lectura'], 'query_only') == 1
+        assert _pragma(db.engines['lectura'], 'busy_timeout') == 5000
+        db.engine.dispose()
+        db.engines['lectura'].dispose()
+
+
+def test_los_get_leen_del_bind_de_lectura(tmp_path):
+    app = _app_produccion(tmp_path / 'musica.db')
+    with app.test_request_context('/canciones', method='GET'):
+        assert db.session.get_bind() is db.engines['lectura']
+    with app.test_request_context('/canciones', method='POST'):
+        assert db.session.get_bind() is db.engine
+    with app.app_context():
+        db.engine.dispose()
+        db.engines['lectura'].dispose()
+
+
+def test_produccion_no_usa_el_cache_del_proceso(tmp_path):
+    app = _app_produccion(tmp_path / 'musica.db')
+    assert isinstance(cache.backend, CacheNulo)
+    cliente = app.test_client()
+    cliente.post('/canciones', json={'titulo': 'Hola', 'minutos': 3, 'segundos': 4, 'interprete': 'X'})
+    etag = cliente.get('/cancion/1').headers['ETag']
+    assert cliente.get('/cancion/1', headers={'If-None-Match': etag}).status_code == 304 # Se calcula en cada request
+    with app.app_context():
+        db.engine.dispose()
+        db.engines['lectura'].dispose()
+    create_app('testing') # El cache es global, se deja en memoria para las demás pruebas
@@ -0,0 +1,77 @@
+# Pruebas de las listas: filtros con sus índices y la búsqueda de texto completo
+
+# Se importa pytest para repetir las pruebas con varios filtros
+import pytest
+
+# Se importan la fábrica de la app, la base de datos, los modelos y los filtros de las listas
+from flaskr import create_app
+from flaskr.models import db, Cancion, Album
+from flaskr.vistas.consultas import FILTROS
+
+
+def _plan(consulta): # EXPLAIN QUERY PLAN con los parámetros tal como los manda sqlalchemy, igual que el selftest
+    compilada = consulta.compile(db.engine)
+    parametros = tuple(compilada.params[nombre] for nombre in compilada.positiontup)
+    return ' '.join(str(fila[-1]) for fila in db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compilada), parametros))
+
+
+@pytest.mark.parametrize('modelo, filtro, valor, indice', [
+    (Cancion, 'duracion_min', 180, 'ix_cancion_duracion'),
+    (Cancion, 'duracion_max', 180, 'ix_cancion_duracion'),
+    (Cancion, 'interprete', 'X', 'ix_cancion_interprete_titulo'),
+    (Cancion, 'titulo_prefijo', 'Ho', 'ix_cancion_titulo'),
+    (Album, 'anio_min', 1990, 'ix_album_anio'),
+    (Album, 'titulo_prefijo', 'Al', 'ix_album_titulo'),
+])
+def test_filtro_usa_su_indice(app, modelo, filtro, valor, indice):
+    with app.app_context():
+        plan = _plan(db.select(modelo.id).where(FILTROS[modelo][filtro][1](valor)))
+    assert indice in plan
+
+
+def test_filtros_de_canciones(cliente):
+    for minutos in range(1, 5):
+        cliente.post('/canciones', json={'titulo': 'T{}'.format(minutos), 'minutos': minutos, 'segundos': 30, 'interprete': 'X' if minutos % 2 else 'Y'})
+    titulos = lambda ruta: [cancion['titulo'] for cancion in cliente.get(ruta).json]
+    assert titulos('/canciones?duracion_min=150') == ['T2', 'T3', 'T4']
+    assert titulos('/canciones?duracion_min=150&duracion_max=210') == ['T2', 'T3']
+    assert titulos('/canciones?interprete=X') == ['T1', 'T3']
+    assert titulos('/canciones?titulo_prefijo=T3') == ['T3']
+    assert cliente.get('/canciones?duracion_min=x').status_code == 400
+
+
+def test_filtros_de_albumes(cliente):
+    for anio, medio in ((1990, 'CD'), (2000, 'DISCO'), (2010, 'CD')):
+        cliente.post('/albumes', json={'titulo': 'A{}'.format(anio), 'anio': anio, 'descripcion': 'd', 'medio': medio})
+    titulos = lambda ruta: [album['titulo'] for album in cliente.get(ruta).json]
+    assert titulos('/albumes?anio_min=2000') == ['A2000', 'A2010']
+    assert titulos('/albumes?medio=CD&anio_max=2000') == ['A1990']
+    assert cliente.get('/albumes?medio=VINILO').status_code == 400
+
+
+def test_buscar(cliente):
+    cliente.post('/canciones', json={'titulo': 'Canción del mar', 'minutos': 3, 'segundos': 0, 'interprete': 'Ana'})
+    cliente.post('/canciones', json={'titulo': 'Otra', 'minutos': 3, 'segundos': 0, 'interprete': 'Marisol'})
+    cliente.post('/albumes', json={'titulo': 'Mares', 'anio': 2000, 'descripcion': 'd', 'medio': 'CD'})
+    resultado = cliente.get('/buscar?q=mar').json
+    assert sorted(cancion['titulo'] for cancion in resultado['canciones']) == ['Canción del mar', 'Otra']
+    assert [album['titulo'] for album in resultado['albumes']] == ['Mares']
+    assert cliente.get('/buscar?q=cancion').json['canciones'][0]['titulo'] == 'Canción del mar' # Sin acentos también coincide
+    cliente.put('/cancion/1', json={'titulo': 'Sin agua'})
+    assert cliente.get('/buscar?q=sin').json['canciones'][0]['id'] == 1 # Los triggers mantienen el índice al día
+    assert cliente.get('/buscar?q=!!').json == {'canciones': [], 'albumes': []}
+
+
+def test_init_db_agrega_los_indices_a_una_db_existente(tmp_path):
+    app = create_app('testing', SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'musica.db'))
+    with app.app_context():
+        db.create_all(bind_key=None)
+        with db.engine.begin() as conexion:
+            conexion.exec_driver_sql('DROP INDEX ix_cancion_duracion')
+    for _ in range(2): # Se puede correr varias veces
+        resultado = app.test_cli_runner().invoke(args=['init-db'])
+        assert resultado.exit_code == 0, resultado.output
+    with app.app_context():
+        indices = db.session.scalars(db.text("SELECT name FROM sqlite_master WHERE type = 'index'")).all() # inspect no reporta los índices de expresión
+        assert 'ix_cancion_duracion' in indices
+        db.engine.dispose()
@@ -0,0 +1,11 @@
+# Pruebas del número de consultas de las listas: no crece con el número de filas (sin N+1)
+
+# Se importa la medición del benchmark, la prueba y el benchmark cuentan igual
+from benchmarks.conteo_consultas import ENDPOINTS, TAMANOS, consultas_por_endpoint
+
+
+def test_listas_hacen_un_numero_constante_de_consultas():
+    chico, grande = (consultas_por_endpoint(n) for n in TAMANOS)
+    for endpoint in ENDPOINTS:
+        assert chico[endpoint] == grande[endpoint], endpoint
+        assert grande[endpoint] <= 3, endpoint # El SELECT de la lista y uno por relación, cargadas por lotes
@@ -0,0 +1,84 @@
+# Pruebas de las contraseñas: se guardan cifradas, /login, se vuelven a cifrar al cambiar el costo y el pool saturado responde 503
+
+# Se importan la fábrica de la app, la base de datos, el modelo y el cifrado
+from flaskr import create_app
+from flaskr.models import db, Usuario
+from flaskr.contrasenas import contrasenas
+from conftest import CONFIGURACION
+
+
+def _guardada(app, id=1): # La contraseña tal como quedó en la db
+    with app.app_context():
+        return db.session.scalar(db.select(Usuario.contrasena).where(Usuario.id == id))
+
+
+def test_se_guarda_cifrada_y_no_se_regresa(app, cliente):
+    respuesta = cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'p'})
+    assert 'contrasena' not in respuesta.json
+    assert 'contrasena' not in cliente.get('/usuario/1').json
+    assert _guardada(app).startswith('scrypt$1024$8$1$')
+    cliente.put('/usuario/1', json={'nombre_usuario': 'v'}) # Sin contraseña se conserva la que tenía
+    assert cliente.post('/login', json={'nombre_usuario': 'v', 'contrasena': 'p'}).status_code == 200
+
+
+def test_login(cliente):
+    cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'uno'})
+    cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'dos'}) # El nombre no es único
+    assert cliente.post('/login', json={'nombre_usuario': 'u', 'contrasena': 'dos'}).json['id'] == 2
+    assert cliente.post('/login', json={'nombre_usuario': 'u', 'contrasena': 'tres'}).status_code == 401
+    assert cliente.post('/login', json={'nombre_usuario': 'nadie', 'contrasena': 'uno'}).status_code == 401
+    assert cliente.post('/login', json={'nombre_usuario': 'u'}).status_code == 400
+
+
+def test_texto_plano_y_costo_viejo_se_vuelven_a_cifrar(app, cliente, monkeypatch):
+    with app.app_context(): # Un usuario de antes del cifrado
+        db.session.add(Usuario(nombre_usuario='viejo', contrasena='clave'))
+        db.session.commit()
+    assert cliente.post('/login', json={'nombre_usuario': 'viejo', 'contrasena': 'clave'}).status_code == 200
+    assert _guardada(app).startswith('scrypt$1024$')
+    monkeypatch.setattr(contrasenas, 'costo', {'n': 2 ** 11, 'r': 8, 'p': 1})
+    assert cliente.post('/login', json={'nombre_usuario': 'viejo', 'contrasena': 'clave'}).status_code == 200
+    assert _guardada(app).startswith('scrypt$2048$')
+
+
+def test_pool_saturado_responde_503():
+    app = create_app('testing', **dict(CONFIGURACION, CONTRASENA_PROCESOS=1, CONTRASENA_PENDIENTES=1))
+    with app.app_context():
+        db.create_all(bind_key=None)
+    cupo = contrasenas._cupo
+    cupo.acquire() # Otra request ocupa el único lugar del pool
+    try:
+        respuesta = app.test_client().post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'p'})
+    finally:
+        cupo.release()
+    assert respuesta.status_code == 503
+    assert respuesta.headers['Retry-After'] == '1'
+    assert app.test_client().get('/usuarios').json == [] # No se tocó la db
+    contrasenas.cerrar()
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_cifra_en_el_pool_de_procesos():
+    app = create_app('testing', **dict(CONFIGURACION, CONTRASENA_PROCESOS=1))
+    with app.app_context():
+        db.create_all(bind_key=None)
+    cliente = app.test_client()
+    try:
+        assert cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'p'}).status_code == 200
+        assert cliente.post('/login', json={'nombre_usuario': 'u', 'contrasena': 'p'}).status_code == 200
+        assert contrasenas._pool is not None
+    finally:
+        contrasenas.cerrar()
+        with app.app_context():
+            db.engine.dispose()
+
+
+def test_login_que_vuelve_a_cifrar_invalida_el_cache(cliente, monkeypatch):
+    cliente.post('/usuarios', json={'nombre_usuario': 'u', 'contrasena': 'p'})
+    viejo = cliente.get('/usuario/1').headers['ETag'] # Queda en el cache
+    monkeypatch.setattr(contrasenas, 'costo', {'n': 2 ** 11, 'r': 8, 'p': 1})
+    assert cliente.post('/login', json={'nombre_usuario': 'u', 'contrasena': 'p'}).status_code == 200
+    nuevo = cliente.get('/usuario/1').headers['ETag']
+    assert nuevo != viejo
+    assert cliente.put('/usuario/1', json={'nombre_usuario': 'v'}, headers={'If-Match': nuevo}).status_code == 200
@@ -0,0 +1,49 @@
+# Pruebas de las listas: paginación por cursor, proyección con ?fields= y streaming NDJSON
+
+# Se importa json para leer las líneas del NDJSON
+import json
+
+
+def test_sin_limit_regresa_la_pagina_por_defecto(cliente, canciones, app):
+    respuesta = cliente.get('/canciones')
+    assert [cancion['id'] for cancion in respuesta.json] == [1, 2, 3, 4, 5]
+    assert 'Link' not in respuesta.headers # Caben en una página
+    app.config['LIMITE_POR_DEFECTO'] = 2
+    pagina = cliente.get('/canciones?interprete=X')
+    assert [cancion['id'] for cancion in pagina.json] == [1, 2]
+    assert pagina.headers['X-Next-Cursor'] == '2'
+    siguiente = cliente.get(pagina.headers['Link'][1:pagina.headers['Link'].index('>')]) # La siguiente página tampoco trae ?limit=
+    assert [cancion['id'] for cancion in siguiente.json] == [3, 4]
+    assert len(cliente.get('/canciones?formato=ndjson').data.splitlines()) == 5 # El streaming regresa todo
+    app.config['LIMITE_POR_DEFECTO'] = None
+    assert len(cliente.get('/canciones?interprete=X&fields=id').json) == 5
+
+
+def test_paginacion_por_cursor(cliente, canciones):
+    pagina = cliente.get('/canciones?limit=2')
+    assert [cancion['id'] for cancion in pagina.json] == [1, 2]
+    assert pagina.headers['X-Next-Cursor'] == '2'
+    assert 'cursor=2' in pagina.headers['Link'] and 'rel="next"' in pagina.headers['Link']
+    siguiente = cliente.get('/canciones?limit=2&cursor=2')
+    assert [cancion['id'] for cancion in siguiente.json] == [3, 4]
+    ultima = cliente.get('/canciones?limit=2&cursor=4')
+    assert [cancion['id'] for cancion in ultima.json] == [5]
+    assert 'X-Next-Cursor' not in ultima.headers # La página no está llena, no hay más
+
+
+def test_parametros_invalidos_responden_400(cliente):
+    for consulta in ('limit=abc', 'limit=0', 'limit=100000', 'cursor=-1', 'fields=no_existe', 'formato=xml'):
+        assert cliente.get('/canciones?' + consulta).status_code == 400, consulta
+
+
+def test_proyeccion_con_fields(cliente, canciones):
+    respuesta = cliente.get('/canciones?fields=titulo,minutos&limit=1')
+    assert respuesta.json == [{'titulo': 'T1', 'minutos': 1}]
+
+
+def test_streaming_ndjson(cliente, canciones):
+    respuesta = cliente.get('/canciones?formato=ndjson&fields=id,titulo')
+    assert respuesta.mimetype == 'application/x-ndjson'
+    assert respuesta.is_streamed
+    lineas = [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+    assert lineas == [{'id': numero, 'titulo': 'T{}'.format(numero)} for numero in range(1, 6)]
@@ -0,0 +1,76 @@
+# Pruebas de las métricas: cabecera Server-Timing, /metrics en formato de Prometheus y registro de las consultas lentas
+
+# Se importa logging para capturar el registro de las consultas lentas
+import logging
+
+# Se importan pytest y el error de sqlalchemy de una sentencia que falla
+import pytest
+from sqlalchemy.exc import OperationalError
+
+# Se importan la fábrica de la app y la base de datos
+from flaskr import create_app
+from flaskr.models import db
+from conftest import CONFIGURACION
+
+
+def _app(**configuracion): # Igual que la fixture app, con otra configuración de las métricas
+    app = create_app('testing', **CONFIGURACION, **configuracion)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    return app
+
+
+def _cerrar(app):
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_server_timing(cliente, canciones):
+    respuesta = cliente.get('/canciones?limit=2')
+    fases = dict(parte.split(';', 1) for parte in respuesta.headers['Server-Timing'].split(', '))
+    assert {'db', 'serializacion', 'json', 'total'} <= set(fases)
+    assert 'consultas"' in fases['db'] and 'desc="0 consultas"' not in fases['db']
+
+
+def test_metrics_por_endpoint(cliente, canciones):
+    cliente.get('/cancion/1')
+    cliente.get('/cancion/99')
+    respuesta = cliente.get('/metrics')
+    assert respuesta.content_type.startswith('text/plain')
+    texto = respuesta.data.decode()
+    assert 'musica_requests_total{endpoint="/cancion/<int:id_cancion>",metodo="GET",codigo="200"}' in texto
+    assert 'musica_requests_total{endpoint="/cancion/<int:id_cancion>",metodo="GET",codigo="404"}' in texto
+    assert 'musica_db_consultas_bucket{endpoint="/cancion/<int:id_cancion>",metodo="GET",le="+Inf"}' in texto
+    assert '# TYPE musica_request_segundos histogram' in texto
+
+
+def test_streaming_se_registra_al_cerrar(cliente, canciones):
+    respuesta = cliente.get('/canciones?formato=ndjson')
+    assert 'Server-Timing' not in respuesta.headers # El cuerpo se genera después de las cabeceras
+    assert len(respuesta.data.splitlines()) == 5
+    respuesta.close()
+    assert 'endpoint="/canciones",metodo="GET",codigo="200"' in cliente.get('/metrics').data.decode()
+
+
+def test_sentencia_que_falla_no_deja_nada_en_la_conexion(app):
+    with app.app_context(), db.engine.connect() as conexion:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conexion.exec_driver_sql('SELECT * FROM no_existe') # Hay before_cursor_execute pero no after_cursor_execute
+        conexion.exec_driver_sql('SELECT 1')
+        assert not any(clave.startswith('metricas') for clave in conexion.info) # La conexión regresa al pool sin inicios huérfanos
+
+
+def test_consulta_lenta_con_plan(caplog):
+    app = _app(METRICAS_CONSULTA_LENTA=0)
+    with caplog.at_level(logging.WARNING, logger='flaskr.metricas'):
+        app.test_client().get('/cancion/1')
+    _cerrar(app)
+    assert any('Consulta lenta' in registro.message and 'Plan:' in registro.message for registro in caplog.records)
+
+
+def test_desactivadas():
+    app = _app(METRICAS=False)
+    assert 'Server-Timing' not in app.test_client().get('/canciones').headers
+    _cerrar(app)
+    create_app('testing', **CONFIGURACION) # Las métricas son globales, se dejan activas para las demás pruebas
@@ -0,0 +1,51 @@
+# Pruebas de la serialización compilada: cada respuesta es idéntica byte a byte a la de marshmallow
+
+# Se importa pytest para repetir la comparación con cada endpoint
+import pytest
+
+# Se importa event de sqlalchemy para ver las sentencias que llegan a la db
+from sqlalchemy import event
+
+# Se importan la fábrica de la app, la base de datos y el catálogo del benchmark
+from flaskr import create_app
+from flaskr.models import db
+from benchmarks.serializacion import ENDPOINTS
+from benchmarks.catalogo import poblar, proporcional
+
+
+@pytest.fixture(scope='module')
+def apps(tmp_path_factory): # Dos apps sobre la misma db, una con cada camino de serialización
+    uri = 'sqlite:///{}'.format(tmp_path_factory.mktemp('serializacion') / 'musica.db')
+    apps = {compilada: create_app('testing', SQLALCHEMY_DATABASE_URI=uri, CACHE_BACKEND='nulo', SERIALIZACION_COMPILADA=compilada) for compilada in (False, True)}
+    with apps[False].app_context():
+        db.create_all(bind_key=None)
+        poblar(**proporcional(300))
+    yield apps
+    for app in apps.values():
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS + ['/canciones?formato=csv', '/albumes?formato=ndjson', '/canciones?limit=7&cursor=3', '/usuarios?fields=albums', '/cancion/999'])
+def test_misma_salida_byte_a_byte(apps, endpoint):
+    respuestas = {compilada: app.test_client().get(endpoint) for compilada, app in apps.items()}
+    assert respuestas[True].status_code == respuestas[False].status_code
+    assert respuestas[True].get_data() == respuestas[False].get_data()
+    assert respuestas[True].headers.get('ETag') == respuestas[False].headers.get('ETag')
+
+
+@pytest.mark.parametrize('compilada', [False, True])
+def test_put_respeta_la_configuracion(apps, compilada):
+    ejecutadas = []
+    with apps[compilada].app_context():
+        motor = db.engine
+    registrar = lambda conexion, cursor, sql, *args: ejecutadas.append(sql)
+    event.listen(motor, 'before_cursor_execute', registrar)
+    try:
+        respuesta = apps[compilada].test_client().put('/album/1', json={'anio': 1990 + compilada})
+    finally:
+        event.remove(motor, 'before_cursor_execute', registrar)
+    assert respuesta.status_code == 200
+    assert ('json_group_array' in ejecutadas[0]) is compilada # Sin la serialización compilada el album se vuelve a leer y lo vuelca marshmallow
+    for app in apps.values():
+        assert app.test_client().get('/album/1').get_data() == respuesta.get_data()